@@ -0,0 +1,565 @@
+"""
+Bulk analysis of many profiles from a JSONL or CSV file.
+
+Rows with the same (normalized) job title share one task and skill
+decomposition; scoring then runs per profile, where the item score cache
+absorbs the repeated items. Results are appended to a JSONL file as soon as
+each row finishes, so an interrupted run can be resumed:
+
+    poetry run python batch.py profiles.csv -o results.jsonl
+    poetry run python batch.py profiles.csv -o results.jsonl --resume
+
+With --offload, item scoring goes through provider batch jobs (billed and
+rate-limited apart from interactive traffic) instead of synchronous calls:
+
+    poetry run python batch.py profiles.csv -o results.jsonl --offload openai
+"""
+import argparse
+import asyncio
+import codecs
+import csv
+import functools
+import hashlib
+import json
+import os
+import sys
+import time
+from typing import (Any, AsyncIterator, Awaitable, Callable, Dict, Iterable,
+                    List, Optional, Set, Tuple, Union)
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from pydantic import ValidationError
+from models import UserProfile, Task, Skill
+from clients import close_registry, get_registry
+from cache import normalize_text
+from history import analysis_history
+from pipeline import (ScoringFallback, ScoringMode, ScoringTier,
+                      aggregate_scores, build_analysis_summary,
+                      build_job_context, decompose,
+                      evaluate_automation_potential, generate_narratives,
+                      get_cached_item_score, item_cache_key, mark_fallbacks,
+                      score_items, stage_versions)
+from batch_api import (BATCH_API_DIR, BATCH_API_POLL_SECONDS, ScoringOffload,
+                       create_batch_api_client)
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "16"))
+# Added to the batch's priority so interactive analyses started within this
+# many seconds still win contended LLM slots.
+BATCH_PRIORITY_OFFSET = float(os.getenv("BATCH_PRIORITY_OFFSET", "3600"))
+
+# Decompositions kept for reuse by later rows of the same job title; the
+# oldest finished ones are dropped beyond this.
+BATCH_MAX_DECOMPOSITION_GROUPS = int(
+    os.getenv("BATCH_MAX_DECOMPOSITION_GROUPS", "10000"))
+
+BatchWriter = Callable[[dict], Awaitable[None]]
+
+
+async def aiter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """
+    Splits a stream of UTF-8 byte chunks (e.g. a request body) into lines.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+async def aiter_file_lines(path: str) -> AsyncIterator[str]:
+    with open(path, encoding="utf-8", newline="") as file:
+        for line in file:
+            yield line
+
+
+async def iter_rows(lines: AsyncIterator[str],
+                    fmt: str) -> AsyncIterator[dict]:
+    """
+    Parses JSONL or CSV (with a header row) into one dict per profile. CSV
+    records may span several lines inside quoted fields. A line that is not
+    valid JSON becomes a row carrying only `_parse_error`, so it is reported
+    as a failed row instead of aborting the run.
+    """
+    if fmt == "jsonl":
+        async for line in lines:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                row = {"_parse_error": str(e)}
+            if not isinstance(row, dict):
+                row = {"_parse_error": "Expected a JSON object"}
+            yield row
+        return
+
+    header: Optional[List[str]] = None
+    record = ""
+    async for line in lines:
+        record += line
+        # An odd number of quotes means a quoted field is still open.
+        if record.count('"') % 2:
+            continue
+        values = next(csv.reader([record]), [])
+        record = ""
+        if not any(value.strip() for value in values):
+            continue
+        if header is None:
+            header = [name.strip() for name in values]
+        else:
+            yield dict(zip(header, values))
+
+
+def upload_id(content: Iterable[bytes]) -> str:
+    """
+    Short hash of a batch input, which scopes the ids of its rows that have
+    no `id` column: the same input gets the same ids (so it can be resumed),
+    another input gets other ones.
+    """
+    digest = hashlib.sha256()
+    for chunk in content:
+        digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+async def iter_upload_rows(chunks: AsyncIterator[bytes],
+                           fmt: str) -> AsyncIterator[dict]:
+    """
+    iter_rows over an upload read as it arrives. A row without an id gets
+    `<hash>-<position>`, with a hash of the input up to and including the
+    row: the same input gets the same ids without waiting for the end of
+    it, and inputs get other ids from their first differing row on.
+    """
+    digest = hashlib.sha256()
+
+    async def hashed(lines: AsyncIterator[str]) -> AsyncIterator[str]:
+        async for line in lines:
+            digest.update(line.encode("utf-8"))
+            yield line
+
+    number = 0
+    # iter_rows reads no further than the row it yields.
+    async for row in iter_rows(hashed(aiter_lines(chunks)), fmt):
+        number += 1
+        if not row.get("id"):
+            row["id"] = f"{digest.hexdigest()[:12]}-{number}"
+        yield row
+
+
+def file_upload_id(path: str) -> str:
+    with open(path, "rb") as file:
+        return upload_id(iter(functools.partial(file.read, 1 << 20), b""))
+
+
+def parse_row(row: dict, number: int,
+              upload: str) -> Tuple[str, Optional[str], dict]:
+    """
+    Returns the row's id (the `id` column, else `upload`-`position`, with
+    its 1-based position in the input), department and profile fields.
+    """
+    row_id = str(
+        row.get("id") or (f"{upload}-{number}" if upload else number))
+    department = row.get("department") or None
+    fields = {
+        name: row[name]
+        for name in UserProfile.model_fields if row.get(name) is not None
+    }
+    return row_id, department, fields
+
+
+def load_completed(path: str) -> Set[str]:
+    """
+    Ids of the rows that already succeeded in an existing output file. A line
+    cut short by a crash is ignored, so that row runs again.
+    """
+    completed: Set[str] = set()
+    if not os.path.exists(path):
+        return completed
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("status") == "ok":
+                completed.add(str(record["id"]))
+    return completed
+
+
+class BatchRunner:
+    """
+    Runs the analysis pipeline over a stream of rows with a fixed pool of
+    worker coroutines. All LLM calls still go through the global scheduler,
+    at a priority below interactive requests.
+
+    With an `offload`, scoring is collected into provider batch jobs
+    instead: every row is decomposed first, the missing item scores are
+    submitted and awaited in one go, and the rows are then aggregated.
+    """
+
+    def __init__(self,
+                 concurrency: int = BATCH_CONCURRENCY,
+                 scoring_mode: ScoringMode = "per_item",
+                 include_narratives: bool = False,
+                 offload: Optional[ScoringOffload] = None,
+                 upload: str = ""):
+        self.concurrency = concurrency
+        # Upload id of the input (see upload_id), for rows without an id.
+        self.upload = upload
+        self.scoring_mode = scoring_mode
+        self.include_narratives = include_narratives
+        self.offload = offload
+        self.priority = time.monotonic() + BATCH_PRIORITY_OFFSET
+        # Normalized job title -> decomposition of the group's first profile.
+        self._decompositions: Dict[str, asyncio.Future] = {}
+        # Rows waiting for offloaded scores:
+        # (record, profile, job context, tasks, skills).
+        self._deferred: List[tuple] = []
+
+    async def _decompose_group(
+        self, profile: UserProfile, job_context: str
+    ) -> Tuple[List[Union[Task, Skill]], List[Union[Task, Skill]]]:
+        key = normalize_text(profile.job_title)
+        future = self._decompositions.get(key)
+        if future is None:
+            self._evict_decompositions()
+            future = asyncio.ensure_future(
+                asyncio.gather(
+                    decompose("task", job_context, self.priority,
+                              profile.job_title),
+                    decompose("skill", job_context, self.priority,
+                              profile.job_title)))
+            self._decompositions[key] = future
+
+            def forget_failure(done: asyncio.Future) -> None:
+                # The rows waiting on it fail; later rows of the group try
+                # again instead of inheriting a transient error.
+                if done.cancelled() or done.exception() is not None:
+                    if self._decompositions.get(key) is done:
+                        del self._decompositions[key]
+
+            future.add_done_callback(forget_failure)
+        # Shielded so one waiting row being cancelled does not cancel the
+        # decomposition for the rest of its group.
+        return await asyncio.shield(future)
+
+    def _evict_decompositions(self) -> None:
+        """
+        Drops the oldest finished decompositions beyond
+        BATCH_MAX_DECOMPOSITION_GROUPS. Running ones are kept: there are at
+        most as many as workers.
+        """
+        excess = len(self._decompositions) - BATCH_MAX_DECOMPOSITION_GROUPS + 1
+        for key in [
+                key for key, future in self._decompositions.items()
+                if future.done()
+        ][:max(excess, 0)]:
+            del self._decompositions[key]
+
+    def _cancel_decompositions(self) -> None:
+        for future in self._decompositions.values():
+            future.cancel()
+        self._decompositions.clear()
+
+    async def _collect(self, items: List[Union[Task, Skill]], item_type: str,
+                       job_context: str, job_title: str) -> None:
+        for item in items:
+            key = item_cache_key(item, item_type, job_title, "per_item")
+            if await get_cached_item_score(key) is None:
+                self.offload.add(item, job_context, item_type, job_title)
+
+    async def _offloaded_score(self, item: Union[Task, Skill], item_type: str,
+                               job_context: str, job_title: str) -> float:
+        score = self.offload.score(item, item_type, job_title)
+        if score is None:
+            # Cached before the run, or not returned by the provider batch.
+            score = await evaluate_automation_potential(
+                item, job_context, item_type, self.priority, job_title)
+        return score
+
+    async def _score(
+            self, items: List[Union[Task, Skill]], item_type: str,
+            job_context: str,
+            job_title: str
+    ) -> Tuple[List[float], List[ScoringTier],
+               List[Optional[ScoringFallback]]]:
+        if self.offload is None:
+            scores, _, tiers, fallbacks = await score_items(
+                items,
+                item_type,
+                job_context,
+                self.scoring_mode,
+                self.priority,
+                job_title=job_title)
+            return scores, tiers, fallbacks
+        # Offloaded scores all come from the high tier.
+        return list(await asyncio.gather(*[
+            self._offloaded_score(item, item_type, job_context, job_title)
+            for item in items
+        ])), ["high"] * len(items), [None] * len(items)
+
+    async def _finish(self, record: dict, profile: UserProfile,
+                      job_context: str, tasks: List[Task],
+                      skills: List[Skill]) -> dict:
+        (task_scores, task_tiers,
+         task_fallbacks), (skill_scores, skill_tiers,
+                           skill_fallbacks) = await asyncio.gather(
+            self._score(tasks, "task", job_context, profile.job_title),
+            self._score(skills, "skill", job_context, profile.job_title))
+        result = aggregate_scores(tasks, task_scores, skills, skill_scores,
+                                  task_tiers, skill_tiers)
+        degraded = (["scoring"] if mark_fallbacks(
+            result, tasks, task_fallbacks, skills, skill_fallbacks) else [])
+        if self.include_narratives:
+            scenarios, careers, skipped = await generate_narratives(
+                build_analysis_summary(job_context, result),
+                self.priority,
+                job_title=profile.job_title)
+            result["future_scenarios"] = scenarios
+            result["career_recommendations"] = careers
+            degraded += skipped
+        if degraded:
+            result["degraded"] = degraded
+        result["versions"] = stage_versions(self.scoring_mode,
+                                            self.include_narratives)
+        if analysis_history is not None:
+            await analysis_history.record(profile, self.scoring_mode, result, {
+                "id": record["id"],
+                "department": record["department"]
+            })
+        return result
+
+    async def _guard(self, record: dict,
+                     analysis: Awaitable[Optional[dict]]) -> Optional[dict]:
+        """
+        Awaits a row's analysis and turns it into its output record, or
+        None if the row was deferred to the offloaded scoring pass.
+        """
+        try:
+            result = await analysis
+            if result is None:
+                return None
+            record["result"] = result
+            record["status"] = "ok"
+        except ValidationError as e:
+            record["status"] = "error"
+            record["error"] = {
+                "status_code": 422,
+                "detail": jsonable_encoder(e.errors())
+            }
+        except HTTPException as e:
+            record["status"] = "error"
+            record["error"] = {"status_code": e.status_code, "detail": e.detail}
+        except Exception as e:
+            print(f"⚠️ Batch row {record['id']} failed. Error: {e}")
+            record["status"] = "error"
+            record["error"] = {
+                "status_code": 500,
+                "detail": "Internal Server Error"
+            }
+        return jsonable_encoder(record)
+
+    async def _process(self, number: int, row: dict) -> Optional[dict]:
+        row_id, department, fields = parse_row(row, number, self.upload)
+        record: Dict[str, Any] = {
+            "id": row_id,
+            "job_title": fields.get("job_title"),
+            "department": department
+        }
+
+        async def analysis() -> Optional[dict]:
+            if "_parse_error" in row:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Malformed row: {row['_parse_error']}")
+            profile = UserProfile(**fields)
+            job_context = build_job_context(profile)
+            tasks, skills = await self._decompose_group(profile, job_context)
+            if self.offload is None:
+                return await self._finish(record, profile, job_context,
+                                          tasks, skills)
+            await self._collect(tasks, "task", job_context, profile.job_title)
+            await self._collect(skills, "skill", job_context,
+                                profile.job_title)
+            self._deferred.append(
+                (record, profile, job_context, tasks, skills))
+            return None
+
+        return await self._guard(record, analysis())
+
+    async def _finish_deferred(self, record: dict, *prepared: Any) -> dict:
+        return await self._guard(record, self._finish(record, *prepared))
+
+    async def _pool(self, jobs: AsyncIterator[Callable[[], Awaitable[Any]]],
+                    on_record: Callable[[Optional[dict]],
+                                        Awaitable[None]]) -> None:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+
+        async def worker() -> None:
+            while True:
+                job = await queue.get()
+                if job is None:
+                    return
+                await on_record(await job())
+
+        workers = [
+            asyncio.create_task(worker()) for _ in range(self.concurrency)
+        ]
+        try:
+            async for job in jobs:
+                await queue.put(job)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+
+    async def run(self,
+                  rows: AsyncIterator[dict],
+                  write: BatchWriter,
+                  skip_ids: Iterable[str] = ()) -> dict:
+        """
+        Processes every row not in `skip_ids`, handing each finished record
+        to `write`, and returns the run summary. Rows are read lazily, at
+        most a few per worker ahead of processing.
+        """
+        skip_ids = set(skip_ids)
+        summary = {"rows": 0, "succeeded": 0, "failed": 0, "skipped": 0}
+        started_at = time.perf_counter()
+
+        async def row_jobs() -> AsyncIterator[Callable[[], Awaitable[Any]]]:
+            number = 0
+            async for row in rows:
+                number += 1
+                summary["rows"] += 1
+                if parse_row(row, number, self.upload)[0] in skip_ids:
+                    summary["skipped"] += 1
+                    continue
+                yield functools.partial(self._process, number, row)
+
+        async def deferred_jobs(
+        ) -> AsyncIterator[Callable[[], Awaitable[Any]]]:
+            for prepared in self._deferred:
+                yield functools.partial(self._finish_deferred, *prepared)
+
+        async def on_record(record: Optional[dict]) -> None:
+            if record is None:
+                return
+            summary["succeeded" if record["status"] ==
+                    "ok" else "failed"] += 1
+            await write(record)
+
+        try:
+            await self._pool(row_jobs(), on_record)
+            if self.offload is not None and self._deferred:
+                if self.offload.pending:
+                    print(f"📦 Offloading {self.offload.pending} scoring "
+                          f"requests for {len(self._deferred)} rows to the "
+                          "batch API.")
+                    await self.offload.run()
+                await self._pool(deferred_jobs(), on_record)
+                self._deferred = []
+        finally:
+            # Shielded from the rows, so a cancelled run (e.g. the client
+            # went away) has to stop them itself.
+            self._cancel_decompositions()
+
+        elapsed = time.perf_counter() - started_at
+        processed = summary["succeeded"] + summary["failed"]
+        summary["elapsed_seconds"] = round(elapsed, 3)
+        summary["rows_per_second"] = round(processed /
+                                           elapsed, 3) if elapsed else 0.0
+        return summary
+
+
+def detect_format(path: str) -> str:
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+async def run_file(args: argparse.Namespace) -> dict:
+    skip_ids = load_completed(args.output) if args.resume else set()
+    if not args.resume and os.path.exists(args.output):
+        os.remove(args.output)
+    # Terminate a line cut short by a crash before appending to it.
+    needs_newline = False
+    if os.path.exists(args.output) and os.path.getsize(args.output):
+        with open(args.output, "rb") as file:
+            file.seek(-1, os.SEEK_END)
+            needs_newline = file.read(1) != b"\n"
+
+    offload = None
+    if args.offload:
+        client = create_batch_api_client(args.offload, args.offload_dir)
+        offload = ScoringOffload(client,
+                                 work_dir=args.offload_dir,
+                                 poll_seconds=args.poll_seconds)
+    runner = BatchRunner(concurrency=args.concurrency,
+                         scoring_mode=args.scoring_mode,
+                         include_narratives=args.narratives,
+                         offload=offload,
+                         upload=file_upload_id(args.input))
+    get_registry()
+    done = 0
+    started_at = time.perf_counter()
+    with open(args.output, "a", encoding="utf-8") as output:
+        if needs_newline:
+            output.write("\n")
+
+        async def write(record: dict) -> None:
+            nonlocal done
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+            done += 1
+            if done % args.progress_every == 0:
+                rate = done / (time.perf_counter() - started_at)
+                print(f"... {done} rows ({rate:.2f} rows/s)", file=sys.stderr)
+
+        try:
+            return await runner.run(
+                iter_rows(aiter_file_lines(args.input), args.format
+                          or detect_format(args.input)), write, skip_ids)
+        finally:
+            await close_registry()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("input", help="JSONL or CSV file of profiles")
+    parser.add_argument("-o", "--output", required=True, help="JSONL results")
+    parser.add_argument("--format", choices=["jsonl", "csv"])
+    parser.add_argument("--resume",
+                        action="store_true",
+                        help="skip rows that already succeeded in --output")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--scoring-mode",
+                        default="per_item",
+                        choices=["per_item", "batched"])
+    parser.add_argument("--narratives",
+                        action="store_true",
+                        help="also generate scenarios and careers per row")
+    parser.add_argument("--offload",
+                        choices=["openai", "local"],
+                        help="score through provider batch jobs (local: "
+                        "file-based stand-in) instead of synchronous calls")
+    parser.add_argument("--offload-dir",
+                        default=BATCH_API_DIR,
+                        help="batch input files and submitted batch ids")
+    parser.add_argument("--poll-seconds",
+                        type=float,
+                        default=BATCH_API_POLL_SECONDS)
+    parser.add_argument("--progress-every", type=int, default=100)
+    args = parser.parse_args()
+
+    summary = asyncio.run(run_file(args))
+    print(json.dumps(summary), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+from typing import Dict, List, Optional, Protocol, Tuple, Union
+from langchain_core.messages import convert_to_messages
+from models import AutomationScore, Task, Skill
+from clients import LLM_MODEL, SCORING_REASONING_EFFORT, aget_registry
+from cache import item_score_key
+from metrics import span
+from pipeline import (SCORING_PROMPT_VERSIONS, build_scoring_messages,
+                      get_item_name, item_cache_key, store_item_score)
+
+BATCH_API_ENDPOINT = "/v1/chat/completions"
+# Provider limit per batch input file.
+BATCH_API_MAX_REQUESTS = int(os.getenv("BATCH_API_MAX_REQUESTS", "50000"))
+BATCH_API_POLL_SECONDS = float(os.getenv("BATCH_API_POLL_SECONDS", "60"))
+BATCH_API_DIR = os.getenv("BATCH_API_DIR", "batch_api")
+# Seconds the local stand-in pretends a batch is running before completing.
+BATCH_API_LOCAL_DELAY_SECONDS = float(
+    os.getenv("BATCH_API_LOCAL_DELAY_SECONDS", "0"))
+
+# Strict structured output requires a closed schema.
+SCORE_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "AutomationScore",
+        "strict": True,
+        "schema": {
+            **AutomationScore.model_json_schema(), "additionalProperties": False
+        }
+    }
+}
+
+_ROLES = {"system": "system", "human": "user", "ai": "assistant"}
+
+
+class BatchAPIClient(Protocol):
+    """
+    Provider batch-job operations: submit an input JSONL file, poll it, and
+    read back the output lines (OpenAI batch output format).
+    """
+
+    async def submit(self, input_path: str) -> str:
+        ...
+
+    # "pending", "completed" (possibly partial) or "failed".
+    async def status(self, batch_id: str) -> str:
+        ...
+
+    async def output_lines(self, batch_id: str) -> List[str]:
+        ...
+
+
+class OpenAIBatchClient:
+
+    def __init__(self, client=None):
+        from openai import AsyncOpenAI
+        self.client = client or AsyncOpenAI()
+
+    async def submit(self, input_path: str) -> str:
+        with open(input_path, "rb") as file:
+            uploaded = await self.client.files.create(file=file,
+                                                      purpose="batch")
+        batch = await self.client.batches.create(input_file_id=uploaded.id,
+                                                 endpoint=BATCH_API_ENDPOINT,
+                                                 completion_window="24h")
+        return batch.id
+
+    async def status(self, batch_id: str) -> str:
+        batch = await self.client.batches.retrieve(batch_id)
+        if batch.status == "failed":
+            return "failed"
+        # Expired and cancelled batches still return what did finish.
+        if batch.status in ("completed", "expired", "cancelled"):
+            return "completed"
+        return "pending"
+
+    async def output_lines(self, batch_id: str) -> List[str]:
+        batch = await self.client.batches.retrieve(batch_id)
+        lines: List[str] = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                content = await self.client.files.content(file_id)
+                lines.extend(content.text.splitlines())
+        return lines
+
+
+class LocalBatchClient:
+    """
+    File-based stand-in for the provider Batch API. Input files are copied
+    into `directory` and, once `delay_seconds` have passed, run through the
+    process's per-item scorer (the fake one with LLM_BACKEND=fake) into an
+    output file in the provider's format.
+    """
+
+    def __init__(self,
+                 directory: str,
+                 delay_seconds: float = BATCH_API_LOCAL_DELAY_SECONDS,
+                 concurrency: int = 32):
+        self.directory = directory
+        self.delay_seconds = delay_seconds
+        self.concurrency = concurrency
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, batch_id: str, kind: str) -> str:
+        return os.path.join(self.directory, f"{batch_id}.{kind}.jsonl")
+
+    async def submit(self, input_path: str) -> str:
+        batch_id = f"local_{uuid.uuid4().hex}"
+        with open(input_path, encoding="utf-8") as source, open(
+                self._path(batch_id, "input"), "w",
+                encoding="utf-8") as target:
+            target.write(source.read())
+        return batch_id
+
+    async def status(self, batch_id: str) -> str:
+        if os.path.exists(self._path(batch_id, "output")):
+            return "completed"
+        input_path = self._path(batch_id, "input")
+        if not os.path.exists(input_path):
+            return "failed"
+        if time.time() - os.path.getmtime(input_path) < self.delay_seconds:
+            return "pending"
+        await self._process(batch_id)
+        return "completed"
+
+    async def _run_request(self, request: dict,
+                           semaphore: asyncio.Semaphore) -> dict:
+        async with semaphore:
+            try:
+                registry = await aget_registry()
+                output = await registry.scorers["per_item"].ainvoke(
+                    convert_to_messages(request["body"]["messages"]))
+                if output["parsed"] is None:
+                    raise output["parsing_error"] or ValueError(
+                        "Scorer returned no parsable output")
+            except Exception as e:
+                return {
+                    "custom_id": request["custom_id"],
+                    "response": None,
+                    "error": {
+                        "message": str(e)
+                    }
+                }
+        usage = output["raw"].usage_metadata or {}
+        return {
+            "custom_id": request["custom_id"],
+            "response": {
+                "status_code": 200,
+                "body": {
+                    "choices": [{
+                        "message": {
+                            "role": "assistant",
+                            "content": output["parsed"].model_dump_json()
+                        }
+                    }],
+                    "usage": {
+                        "prompt_tokens": usage.get("input_tokens", 0),
+                        "completion_tokens": usage.get("output_tokens", 0),
+                        "prompt_tokens_details": {
+                            "cached_tokens":
+                            (usage.get("input_token_details")
+                             or {}).get("cache_read", 0)
+                        }
+                    }
+                }
+            },
+            "error": None
+        }
+
+    async def _process(self, batch_id: str) -> None:
+        with open(self._path(batch_id, "input"), encoding="utf-8") as file:
+            requests = [json.loads(line) for line in file if line.strip()]
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results = await asyncio.gather(
+            *[self._run_request(request, semaphore) for request in requests])
+        # Written under a temporary name so a crash never leaves a partial
+        # output file that status() would report as completed.
+        output_path = self._path(batch_id, "output")
+        with open(output_path + ".tmp", "w", encoding="utf-8") as file:
+            for result in results:
+                file.write(json.dumps(result) + "\n")
+        os.replace(output_path + ".tmp", output_path)
+
+    async def output_lines(self, batch_id: str) -> List[str]:
+        with open(self._path(batch_id, "output"), encoding="utf-8") as file:
+            return file.read().splitlines()
+
+
+def create_batch_api_client(backend: str,
+                            directory: str = BATCH_API_DIR
+                            ) -> BatchAPIClient:
+    if backend == "openai":
+        return OpenAIBatchClient()
+    if backend == "local":
+        return LocalBatchClient(os.path.join(directory, "local"))
+    raise ValueError(f"Unknown batch API backend: {backend}")
+
+
+def parse_output_line(line: str) -> Tuple[str, Optional[float], dict]:
+    """
+    Returns the custom id, score (None if the request failed or the output
+    does not parse) and token usage of one batch output line.
+    """
+    record = json.loads(line)
+    response = record.get("response") or {}
+    if record.get("error") or response.get("status_code") != 200:
+        return record["custom_id"], None, {}
+    body = response["body"]
+    try:
+        score = AutomationScore.model_validate_json(
+            body["choices"][0]["message"]["content"]).score
+    except (KeyError, IndexError, ValueError):
+        score = None
+    return record["custom_id"], score, body.get("usage") or {}
+
+
+class ScoringOffload:
+    """
+    Collects per-item scoring prompts into provider batch files instead of
+    calling the model synchronously. Batch jobs are billed and rate-limited
+    separately, so bulk re-scoring leaves the interactive budget alone.
+
+    Requests are deduplicated by item score key. Submitted batch ids are
+    remembered per input file hash in `work_dir`, so rerunning after a crash
+    polls the existing batches instead of paying for them twice.
+    """
+
+    def __init__(self,
+                 client: BatchAPIClient,
+                 work_dir: str = BATCH_API_DIR,
+                 max_requests_per_file: int = BATCH_API_MAX_REQUESTS,
+                 poll_seconds: float = BATCH_API_POLL_SECONDS):
+        self.client = client
+        self.work_dir = work_dir
+        self.max_requests_per_file = max_requests_per_file
+        self.poll_seconds = poll_seconds
+        # custom id -> (request line, item, item type, job title)
+        self._requests: Dict[str, Tuple[dict, Union[Task, Skill], str,
+                                        str]] = {}
+        self.scores: Dict[str, float] = {}
+        os.makedirs(work_dir, exist_ok=True)
+
+    @property
+    def pending(self) -> int:
+        return len(self._requests)
+
+    @staticmethod
+    def request_id(item: Union[Task, Skill], item_type: str,
+                   job_title: str) -> str:
+        return item_score_key(item_type, get_item_name(item), job_title,
+                              SCORING_PROMPT_VERSIONS[("per_item",
+                                                       item_type, "high")])
+
+    def add(self, item: Union[Task, Skill], job_context: str,
+            item_type: str, job_title: str) -> str:
+        custom_id = self.request_id(item, item_type, job_title)
+        if custom_id not in self._requests and custom_id not in self.scores:
+            messages = build_scoring_messages(item, job_context, item_type)
+            request = {
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": BATCH_API_ENDPOINT,
+                "body": {
+                    "model": LLM_MODEL,
+                    "reasoning_effort": SCORING_REASONING_EFFORT,
+                    "messages": [{
+                        "role": _ROLES[message.type],
+                        "content": message.content
+                    } for message in messages],
+                    "response_format": SCORE_RESPONSE_FORMAT
+                }
+            }
+            self._requests[custom_id] = (request, item, item_type, job_title)
+        return custom_id
+
+    def score(self, item: Union[Task, Skill], item_type: str,
+              job_title: str) -> Optional[float]:
+        return self.scores.get(self.request_id(item, item_type, job_title))
+
+    def _load_state(self) -> Dict[str, str]:
+        path = os.path.join(self.work_dir, "submitted.json")
+        if not os.path.exists(path):
+            return {}
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+
+    def _save_state(self, state: Dict[str, str]) -> None:
+        path = os.path.join(self.work_dir, "submitted.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as file:
+            json.dump(state, file, indent=2)
+        os.replace(path + ".tmp", path)
+
+    async def _submit_files(self) -> List[str]:
+        state = self._load_state()
+        custom_ids = sorted(self._requests)
+        batch_ids = []
+        for start in range(0, len(custom_ids), self.max_requests_per_file):
+            chunk = custom_ids[start:start + self.max_requests_per_file]
+            content = "".join(
+                json.dumps(self._requests[custom_id][0]) + "\n"
+                for custom_id in chunk)
+            digest = hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+            if digest not in state:
+                input_path = os.path.join(self.work_dir,
+                                          f"{digest}.input.jsonl")
+                with open(input_path, "w", encoding="utf-8") as file:
+                    file.write(content)
+                state[digest] = await self.client.submit(input_path)
+                self._save_state(state)
+                print(f"📤 Submitted batch {state[digest]} "
+                      f"({len(chunk)} scoring requests)")
+            batch_ids.append(state[digest])
+        return batch_ids
+
+    async def _wait(self, batch_id: str) -> str:
+        while True:
+            status = await self.client.status(batch_id)
+            if status != "pending":
+                return status
+            await asyncio.sleep(self.poll_seconds)
+
+    async def run(self) -> Dict[str, float]:
+        """
+        Submits every collected request, waits for the batches and stores
+        the scores in the item score cache. Returns custom id -> score for
+        the requests that succeeded; the caller falls back to synchronous
+        scoring for the rest.
+        """
+        if not self._requests:
+            return self.scores
+        with span("scoring",
+                  path="batch_api",
+                  items=len(self._requests)) as record:
+            record["model"] = LLM_MODEL
+            batch_ids = await self._submit_files()
+            statuses = await asyncio.gather(
+                *[self._wait(batch_id) for batch_id in batch_ids])
+            for batch_id, status in zip(batch_ids, statuses):
+                if status == "failed":
+                    print(f"⚠️ Batch {batch_id} failed.")
+                    continue
+                for line in await self.client.output_lines(batch_id):
+                    if not line.strip():
+                        continue
+                    custom_id, score, usage = parse_output_line(line)
+                    record["input_tokens"] = record.get(
+                        "input_tokens", 0) + usage.get("prompt_tokens", 0)
+                    record["output_tokens"] = record.get(
+                        "output_tokens", 0) + usage.get(
+                            "completion_tokens", 0)
+                    record["cached_tokens"] = record.get(
+                        "cached_tokens", 0) + (usage.get(
+                            "prompt_tokens_details") or {}).get(
+                                "cached_tokens", 0)
+                    if score is None or custom_id not in self._requests:
+                        continue
+                    _, item, item_type, job_title = self._requests[custom_id]
+                    self.scores[custom_id] = score
+                    await store_item_score(
+                        item_cache_key(item, item_type, job_title,
+                                       "per_item"), score, item, job_title,
+                        "batch_api")
+            missing = len(self._requests) - sum(
+                custom_id in self.scores for custom_id in self._requests)
+            record["failed_requests"] = missing
+        if missing:
+            print(f"⚠️ {missing} batch scoring request(s) returned no score.")
+        self._requests.clear()
+        return self.scores
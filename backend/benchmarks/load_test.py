@@ -0,0 +1,258 @@
+"""
+Offline load test of the /analyze pipeline against the fake LLM backend.
+
+Measures orchestration overhead only (serialization, scheduling, setup),
+with model latency and failures simulated by fake_llm.FakeLLMRegistry.
+
+In-process, through the ASGI app (reports event-loop lag and memory):
+
+    poetry run python benchmarks/load_test.py --requests 200 --concurrency 20
+
+Against real uvicorn workers:
+
+    poetry run python benchmarks/load_test.py --workers 8 --requests 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import List, Optional
+
+BACKEND_DIR = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, BACKEND_DIR)
+
+import httpx  # noqa: E402
+
+
+def benchmark_env(args: argparse.Namespace) -> dict:
+    """
+    Environment for the app under test: fake models, no caches (every
+    request must run the full pipeline) and no rate limits.
+    """
+    return {
+        "LLM_BACKEND": "fake",
+        "FAKE_LLM_AGENT_LATENCY_MS": str(args.agent_latency_ms),
+        "FAKE_LLM_SCORE_LATENCY_MS": str(args.score_latency_ms),
+        "FAKE_LLM_LATENCY_SIGMA": str(args.latency_sigma),
+        "FAKE_LLM_ERROR_RATE": str(args.error_rate),
+        "FAKE_LLM_SEED": str(args.seed),
+        "RESULT_CACHE_BACKEND": "none",
+        "ITEM_CACHE_BACKEND": "none",
+        "ANALYSIS_HISTORY_PATH": "none",
+        "LLM_MAX_QUEUED": "0",
+    }
+
+
+def make_profile(i: int) -> dict:
+    return {
+        "age": "35",
+        "gender": "female",
+        "job_title": f"Benchmark Profession {i}",
+        "job_description": "Prepares reports and talks to clients.",
+        "daily_routine": "Emails in the morning, meetings, spreadsheets.",
+        "location": "Office in Bratislava",
+        "education": "Master's degree in economics"
+    }
+
+
+def percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def send(client: httpx.AsyncClient, endpoint: str, i: int) -> bool:
+    if endpoint == "/analyze/stream":
+        async with client.stream("POST", endpoint,
+                                 json=make_profile(i)) as response:
+            body = "".join([chunk async for chunk in response.aiter_text()])
+            return response.status_code == 200 and "event: result" in body
+    response = await client.post(endpoint, json=make_profile(i))
+    return response.status_code == 200
+
+
+async def run_load(client: httpx.AsyncClient, endpoint: str, requests: int,
+                   concurrency: int) -> tuple[List[float], int, float]:
+    latencies: List[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int) -> None:
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                ok = await send(client, endpoint, i)
+            except httpx.HTTPError:
+                ok = False
+            latencies.append((time.perf_counter() - start) * 1000)
+            if not ok:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(requests)])
+    return latencies, errors, time.perf_counter() - start
+
+
+async def monitor_loop_lag(samples: List[float], interval: float = 0.01):
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append((time.perf_counter() - start - interval) * 1000)
+
+
+def report(latencies: List[float], errors: int, elapsed: float,
+           loop_lag: Optional[List[float]] = None,
+           memory_per_request: Optional[float] = None) -> dict:
+    result = {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "mean_ms": statistics.mean(latencies) if latencies else 0.0,
+    }
+    if loop_lag:
+        result["loop_lag_p99_ms"] = percentile(loop_lag, 99)
+        result["loop_lag_max_ms"] = max(loop_lag)
+    if memory_per_request is not None:
+        result["memory_per_request_kb"] = memory_per_request / 1024
+    return result
+
+
+async def benchmark_in_process(args: argparse.Namespace) -> dict:
+    os.environ.update(benchmark_env(args))
+    import main
+
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport,
+                                     base_url="http://benchmark",
+                                     timeout=None) as client:
+            # Warm-up request, not measured.
+            await send(client, args.endpoint, -1)
+
+            loop_lag: List[float] = []
+            monitor = asyncio.create_task(monitor_loop_lag(loop_lag))
+            tracemalloc.start()
+            latencies, errors, elapsed = await run_load(
+                client, args.endpoint, args.requests, args.concurrency)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            monitor.cancel()
+
+    # Peak traced memory divided by the requests that were in flight at once.
+    return report(latencies, errors, elapsed, loop_lag,
+                  peak / min(args.concurrency, args.requests))
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _rss_bytes(pid: int) -> int:
+    """
+    Resident memory of a process and its children (Linux only, else 0).
+    """
+    total = 0
+    try:
+        pids = [pid] + [
+            int(child) for child in open(
+                f"/proc/{pid}/task/{pid}/children").read().split()
+        ]
+        for p in pids:
+            for line in open(f"/proc/{p}/status"):
+                if line.startswith("VmRSS:"):
+                    total += int(line.split()[1]) * 1024
+    except OSError:
+        return 0
+    return total
+
+
+async def benchmark_workers(args: argparse.Namespace) -> dict:
+    port = _free_port()
+    env = {**os.environ, **benchmark_env(args)}
+    server = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+        "--port",
+        str(port), "--workers",
+        str(args.workers), "--log-level", "warning"
+    ],
+                              cwd=BACKEND_DIR,
+                              env=env)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}",
+                                     timeout=None) as client:
+            deadline = time.monotonic() + 60
+            while True:
+                try:
+                    if await send(client, args.endpoint, -1):
+                        break
+                except httpx.HTTPError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise RuntimeError("uvicorn did not come up in 60s")
+                await asyncio.sleep(0.5)
+
+            rss_before = _rss_bytes(server.pid)
+            latencies, errors, elapsed = await run_load(
+                client, args.endpoint, args.requests, args.concurrency)
+            rss_after = _rss_bytes(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+
+    return report(latencies, errors, elapsed,
+                  memory_per_request=max(0, rss_after - rss_before) /
+                  args.requests if rss_before else None)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--endpoint",
+                        default="/analyze",
+                        choices=["/analyze", "/analyze/stream"])
+    parser.add_argument("--workers",
+                        type=int,
+                        default=0,
+                        help="run against N uvicorn workers (0: in-process)")
+    parser.add_argument("--agent-latency-ms", type=float, default=50)
+    parser.add_argument("--score-latency-ms", type=float, default=20)
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print JSON only")
+    args = parser.parse_args()
+
+    if args.workers:
+        result = asyncio.run(benchmark_workers(args))
+    else:
+        result = asyncio.run(benchmark_in_process(args))
+
+    if args.json:
+        print(json.dumps(result))
+        return
+    print(f"{args.endpoint} x {args.requests} "
+          f"(concurrency {args.concurrency}, "
+          f"{'%d workers' % args.workers if args.workers else 'in-process'})")
+    for key, value in result.items():
+        print(f"  {key:<24} {value:10.2f}" if isinstance(value, float) else
+              f"  {key:<24} {value:10d}")
+
+
+if __name__ == "__main__":
+    main()
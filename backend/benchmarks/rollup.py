@@ -0,0 +1,142 @@
+"""
+Benchmark of the workforce rollups on a synthetic organisation.
+
+Fills a WorkforceStore with --employees analyses (20 tasks and 15 skills
+each, drawn from a shared pool per job title) and times the rollup queries
+the dashboard issues, plus the equivalent walk over the result dicts for
+comparison.
+
+    poetry run python benchmarks/rollup.py --employees 50000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from rollup import WorkforceStore, _rollup, rollup  # noqa: E402
+
+DEPARTMENTS = ["Finance", "Sales", "Engineering", "Support", "Legal", "HR",
+               "Operations", "Marketing"]
+TASKS = 20
+SKILLS = 15
+
+
+def make_result(rng: random.Random, title: int) -> dict:
+    tasks = {
+        f"Title {title} task {rng.randrange(40)}": rng.random()
+        for _ in range(TASKS)
+    }
+    skills = {
+        f"Title {title} skill {rng.randrange(30)}": rng.random()
+        for _ in range(SKILLS)
+    }
+    task_breakdown = {
+        name: {
+            "score": score,
+            "weighted_score": score / len(tasks),
+            "time_share": 1 / len(tasks)
+        }
+        for name, score in tasks.items()
+    }
+    skill_breakdown = {
+        name: {
+            "score": score,
+            "weighted_score": score / len(skills),
+            "importance": 1 / len(skills)
+        }
+        for name, score in skills.items()
+    }
+    total_task = sum(entry["weighted_score"]
+                     for entry in task_breakdown.values())
+    total_skill = sum(entry["weighted_score"]
+                      for entry in skill_breakdown.values())
+    return {
+        "task_automation_breakdown": task_breakdown,
+        "total_task_automation": total_task,
+        "skill_automation_breakdown": skill_breakdown,
+        "total_skill_automation": total_skill,
+        "weighted_final_score": total_task * 0.4 + total_skill * 0.6
+    }
+
+
+def loop_rollup(results: list) -> dict:
+    # The same department means and top tasks, walking the result dicts.
+    departments: dict = {}
+    exposure: dict = {}
+    for department, result in results:
+        entry = departments.setdefault(department, [0, 0.0])
+        entry[0] += 1
+        entry[1] += result["weighted_final_score"]
+        for name, item in result["task_automation_breakdown"].items():
+            exposure[name] = exposure.get(name, 0.0) + item["weighted_score"]
+    top = sorted(exposure.items(), key=lambda item: -item[1])[:10]
+    return {
+        "departments": {
+            name: total / count
+            for name, (count, total) in departments.items()
+        },
+        "top": top
+    }
+
+
+def timed(fn, iterations: int) -> list:
+    samples = []
+    for _ in range(iterations):
+        started_at = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started_at) * 1000)
+    return samples
+
+
+def report(label: str, samples: list) -> None:
+    print(f"{label:<34} mean {statistics.mean(samples):9.2f} ms   "
+          f"p50 {statistics.median(samples):9.2f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--employees", type=int, default=50000)
+    parser.add_argument("--titles", type=int, default=300)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    results = []
+    for _ in range(args.employees):
+        results.append((rng.choice(DEPARTMENTS),
+                        make_result(rng, rng.randrange(args.titles))))
+    store = WorkforceStore()
+    started_at = time.perf_counter()
+    for i, (department, result) in enumerate(results):
+        store.add(f"e{i}", f"Title {i % args.titles}", department, result)
+    store.columns()
+    print(f"Ingested {len(store)} analyses in "
+          f"{time.perf_counter() - started_at:.2f} s")
+
+    # _rollup computes from the columns; rollup memoizes per store version.
+    report("rollup by department",
+           timed(lambda: _rollup(store, "department", None, "task", 10),
+                 args.iterations))
+    report("rollup by job title",
+           timed(lambda: _rollup(store, "job_title", None, "task", 10),
+                 args.iterations))
+    report("rollup of one department",
+           timed(lambda: _rollup(store, "department", "Finance", "task", 10),
+                 args.iterations))
+    report("top skills",
+           timed(lambda: _rollup(store, "department", None, "skill", 10),
+                 args.iterations))
+    report("repeated query (memoized)",
+           timed(lambda: rollup(store, "department"), args.iterations))
+    report("python loop (means + top tasks)",
+           timed(lambda: loop_rollup(results), max(1,
+                                                   args.iterations // 4)))
+
+
+if __name__ == "__main__":
+    main()
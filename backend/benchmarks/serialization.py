@@ -0,0 +1,159 @@
+"""
+Micro-benchmark of the analysis payload encoding.
+
+Compares FastAPI's default response path (jsonable_encoder + json.dumps)
+with the orjson encoder from serialization.py, reports the bytes on the wire
+raw, gzip- and brotli-compressed, and the size of the analysis summary the
+scenario and career agents receive, indented vs compact (in tiktoken
+tokens when its encoding can be loaded, else the scheduler's estimate).
+
+    poetry run python benchmarks/serialization.py --iterations 500
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from models import CareerOptionInitial, FutureScenario  # noqa: E402
+from scheduler import estimate_tokens  # noqa: E402
+from serialization import brotli, compress, dumps  # noqa: E402
+
+# Worst case per profile: 20 tasks + 15 skills.
+TASKS = 20
+SKILLS = 15
+
+
+def make_result() -> dict:
+    """
+    /analyze payload of realistic size, with the narratives as the
+    Pydantic objects run_analysis returns.
+    """
+    tasks = {
+        f"Prepare the monthly financial report for client group {i}": {
+            "score": 0.37 + i / 100,
+            "weighted_score": (0.37 + i / 100) / TASKS,
+            "time_share": 1 / TASKS,
+            "tier": "high"
+        }
+        for i in range(TASKS)
+    }
+    skills = {
+        f"Regulatory knowledge of accounting standards, area {i}": {
+            "score": 0.52 - i / 100,
+            "weighted_score": (0.52 - i / 100) / SKILLS,
+            "importance": 1 / SKILLS,
+            "tier": "high"
+        }
+        for i in range(SKILLS)
+    }
+    return {
+        "task_automation_breakdown": tasks,
+        "total_task_automation": 0.47,
+        "skill_automation_breakdown": skills,
+        "total_skill_automation": 0.45,
+        "weighted_final_score": 0.46,
+        "future_scenarios": [
+            FutureScenario(
+                title=f"Scenario {i}: AI-assisted bookkeeping becomes standard",
+                description=(f"By {2027 + i}, routine reconciliation and "
+                             "reporting move to AI tools reviewed by the "
+                             "accountant, who spends more time advising "
+                             "clients on tax planning, audits and the "
+                             "interpretation of unusual transactions."),
+                likelihood="medium") for i in range(5)
+        ],
+        "career_recommendations": [
+            CareerOptionInitial(
+                job_title=f"Financial Controller {i}",
+                reason=("Builds on reporting experience and adds the "
+                        "budgeting and approval judgment that is hard to "
+                        f"automate (option {i})."),
+                transferable_skills=["Reporting", "Accounting standards",
+                                     "Client communication"],
+                new_skills_needed=["Data analysis", "AI tooling"],
+                ease_of_transition="Medium") for i in range(5)
+        ]
+    }
+
+
+def fastapi_default(result: dict) -> bytes:
+    # What JSONResponse renders after FastAPI's jsonable_encoder pass.
+    return json.dumps(jsonable_encoder(result),
+                      ensure_ascii=False,
+                      allow_nan=False,
+                      indent=None,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def measure(fn, iterations: int) -> list[float]:
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def report(label: str, samples: list[float]) -> None:
+    print(f"{label:<26} mean {statistics.mean(samples):8.3f} ms   "
+          f"p50 {statistics.median(samples):8.3f} ms")
+
+
+def count_tokens(text: str) -> tuple[int, str]:
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("o200k_base")
+        return len(encoding.encode(text)), "tiktoken o200k_base"
+    except Exception:
+        return estimate_tokens(text), "~4 chars/token estimate"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    result = make_result()
+    print(f"Encoding one /analyze payload ({TASKS} tasks, {SKILLS} skills), "
+          f"{args.iterations} iterations")
+    report("jsonable_encoder + json",
+           measure(lambda: fastapi_default(result), args.iterations))
+    report("orjson", measure(lambda: dumps(result), args.iterations))
+
+    body = dumps(result)
+    print(f"\n{'bytes on the wire':<26} {len(body):8d} raw")
+    encodings = ["gzip"] + (["br"] if brotli is not None else [])
+    for encoding in encodings:
+        samples = measure(lambda: compress(body, encoding), args.iterations)
+        compressed = compress(body, encoding)
+        print(f"{'':<26} {len(compressed):8d} {encoding} "
+              f"({len(compressed) / len(body):.0%}, "
+              f"{statistics.mean(samples):.3f} ms)")
+    if brotli is None:
+        print(f"{'':<26} (install `brotli` for br)")
+
+    summary = {
+        "job_context": "Job Title: Accountant\nJob Description: ...",
+        "tasks_analysis": result["task_automation_breakdown"],
+        "skills_analysis": result["skill_automation_breakdown"],
+        "total_automation_score": result["weighted_final_score"]
+    }
+    indented = json.dumps(summary, indent=2)
+    compact = json.dumps(summary, ensure_ascii=False, separators=(",", ":"))
+    indented_tokens, method = count_tokens(indented)
+    compact_tokens, _ = count_tokens(compact)
+    print(f"\nNarrative prompt analysis summary ({method}):")
+    print(f"{'indent=2':<26} {len(indented):8d} chars {indented_tokens:6d} "
+          f"tokens")
+    print(f"{'compact':<26} {len(compact):8d} chars {compact_tokens:6d} "
+          f"tokens ({1 - compact_tokens / indented_tokens:.0%} fewer, "
+          f"x2 agents)")
+
+
+if __name__ == "__main__":
+    main()
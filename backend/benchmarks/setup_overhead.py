@@ -0,0 +1,89 @@
+"""
+Micro-benchmark of the per-request setup cost of the /analyze pipeline.
+
+Compares constructing the clients, structured-output wrappers and agent
+graphs on every request (the old behaviour) with looking them up in the
+shared LLMRegistry. No network calls are made.
+
+    poetry run python benchmarks/setup_overhead.py --requests 50
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from langchain_openai import ChatOpenAI  # noqa: E402
+from langchain.agents import create_agent  # noqa: E402
+from langchain.agents.structured_output import ProviderStrategy  # noqa: E402
+from clients import (AGENT_SCHEMAS, LLM_MODEL, SCORING_REASONING_EFFORT,
+                     LLMRegistry)  # noqa: E402
+from models import AutomationScore  # noqa: E402
+
+# Worst case per profile: 20 tasks + 15 skills.
+ITEMS_PER_PROFILE = 35
+
+
+def per_request_setup() -> None:
+    llm = ChatOpenAI(model=LLM_MODEL)
+    for schema in AGENT_SCHEMAS.values():
+        create_agent(llm,
+                     response_format=ProviderStrategy(schema),
+                     tools=[{
+                         "type": "web_search_preview"
+                     }])
+    for _ in range(ITEMS_PER_PROFILE):
+        ChatOpenAI(model=LLM_MODEL,
+                   reasoning={
+                       "effort": SCORING_REASONING_EFFORT
+                   }).with_structured_output(AutomationScore)
+
+
+def make_registry_setup(registry: LLMRegistry):
+
+    def registry_setup() -> None:
+        for name in AGENT_SCHEMAS:
+            registry.agents[name]
+        for _ in range(ITEMS_PER_PROFILE):
+            registry.scorers["per_item"]
+
+    return registry_setup
+
+
+def measure(fn, requests: int) -> list[float]:
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def report(label: str, samples: list[float]) -> None:
+    print(f"{label:<22} mean {statistics.mean(samples):9.3f} ms   "
+          f"p50 {statistics.median(samples):9.3f} ms   "
+          f"max {max(samples):9.3f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    registry = LLMRegistry()
+    build_ms = (time.perf_counter() - start) * 1000
+
+    print(f"Simulating {args.requests} requests "
+          f"({ITEMS_PER_PROFILE} scored items each)")
+    print(f"{'registry build (once)':<22} {build_ms:14.3f} ms")
+    report("per-request setup", measure(per_request_setup, args.requests))
+    report("shared registry",
+           measure(make_registry_setup(registry), args.requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Startup-time benchmark of the API workers.
+
+Reports the import time of the app (a fresh interpreter per sample) and, per
+launcher (`uvicorn --workers N` and the pre-forking serve.py), the time from
+launch until a worker answers /health, until /ready, until every worker has
+logged that it is warm, and until the first successful /analyze.
+
+The default backend builds the real model registry, so the SDK imports and
+agent graph construction are measured, with a dummy key and an unreachable
+local endpoint: nothing leaves the host, and no /analyze can succeed. With
+--backend fake the first /analyze is answered by the fake models instead.
+
+    poetry run python benchmarks/startup.py --workers 8
+    poetry run python benchmarks/startup.py --backend fake --launcher serve
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+BACKEND_DIR = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, BACKEND_DIR)
+
+import httpx  # noqa: E402
+
+IMPORT_SNIPPET = ("import time; started_at = time.perf_counter(); "
+                  "import main; print(time.perf_counter() - started_at)")
+
+PROFILE = {
+    "age": "35",
+    "gender": "female",
+    "job_title": "Startup Benchmark Accountant",
+    "job_description": "Prepares reports and talks to clients.",
+    "daily_routine": "Emails in the morning, meetings, spreadsheets.",
+    "location": "Office in Bratislava",
+    "education": "Master's degree in economics"
+}
+
+
+def startup_env(backend: str) -> dict:
+    """
+    Environment for the app under test: no caches, history, rollup store,
+    research corpus or shared state, so only the worker's own startup is
+    measured.
+    """
+    env = {
+        **os.environ,
+        "LLM_BACKEND": backend,
+        "RESULT_CACHE_BACKEND": "none",
+        "ITEM_CACHE_BACKEND": "none",
+        "ANALYSIS_HISTORY_PATH": "none",
+        "WORKFORCE_STORE_PATH": "none",
+        "RESEARCH_CORPUS_PATH": "none",
+        "SHARED_STATE_BACKEND": "none",
+        "PYTHONUNBUFFERED": "1",
+    }
+    if backend == "openai":
+        env["OPENAI_API_KEY"] = "sk-startup-benchmark"
+        env["OPENAI_BASE_URL"] = "http://127.0.0.1:9/v1"
+    return env
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_import(env: dict) -> float:
+    output = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET],
+                            cwd=BACKEND_DIR,
+                            env=env,
+                            capture_output=True,
+                            text=True,
+                            check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def launch_command(launcher: str, port: int, workers: int) -> List[str]:
+    if launcher == "serve":
+        return [
+            sys.executable, "serve.py", "--port",
+            str(port), "--workers",
+            str(workers), "--log-level", "warning"
+        ]
+    return [
+        sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+        "--port",
+        str(port), "--workers",
+        str(workers), "--log-level", "warning"
+    ]
+
+
+def measure_boot(launcher: str, workers: int, env: dict, analyze: bool,
+                 timeout: float) -> Dict[str, Optional[float]]:
+    """
+    Seconds from launch to each startup milestone (None if not reached).
+    """
+    port = _free_port()
+    timings: Dict[str, Optional[float]] = {
+        "health": None,
+        "ready": None,
+        "all_ready": None,
+        "first_analyze": None
+    }
+    started_at = time.perf_counter()
+    server = subprocess.Popen(launch_command(launcher, port, workers),
+                              cwd=BACKEND_DIR,
+                              env=env,
+                              stdout=subprocess.PIPE,
+                              stderr=subprocess.STDOUT,
+                              text=True)
+
+    def watch_output() -> None:
+        warm = 0
+        for line in server.stdout:
+            if "Worker ready" in line:
+                warm += 1
+                if warm == workers:
+                    timings["all_ready"] = time.perf_counter() - started_at
+
+    watcher = threading.Thread(target=watch_output, daemon=True)
+    watcher.start()
+    milestones = [("health", "GET", "/health"), ("ready", "GET", "/ready")]
+    if analyze:
+        milestones.append(("first_analyze", "POST", "/analyze"))
+    deadline = started_at + timeout
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}",
+                          timeout=timeout) as client:
+            for name, method, path in milestones:
+                while time.perf_counter() < deadline:
+                    try:
+                        response = client.request(
+                            method,
+                            path,
+                            json=PROFILE if method == "POST" else None)
+                        if response.status_code == 200:
+                            timings[name] = time.perf_counter() - started_at
+                            break
+                    except httpx.HTTPError:
+                        pass
+                    time.sleep(0.01)
+        while timings["all_ready"] is None and time.perf_counter() < deadline:
+            time.sleep(0.01)
+    finally:
+        server.terminate()
+        server.wait()
+    return timings
+
+
+def summarize(samples: List[Optional[float]]) -> str:
+    values = [sample for sample in samples if sample is not None]
+    if not values:
+        return "       n/a"
+    return f"{statistics.median(values):8.2f} s"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--backend", choices=["openai", "fake"],
+                        default="openai")
+    parser.add_argument("--launcher",
+                        choices=["uvicorn", "serve", "both"],
+                        default="both")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--import-samples", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    env = startup_env(args.backend)
+    imports = [measure_import(env) for _ in range(args.import_samples)]
+    print(f"import main (p50 of {args.import_samples})   "
+          f"{statistics.median(imports):.3f} s   "
+          f"min {min(imports):.3f} s")
+
+    launchers = (["uvicorn", "serve"]
+                 if args.launcher == "both" else [args.launcher])
+    print(f"\nMedian of {args.runs} launches, {args.workers} workers, "
+          f"{args.backend} backend:")
+    print(f"{'launcher':<10}{'/health':>11}{'/ready':>11}"
+          f"{'all warm':>11}{'/analyze':>11}")
+    for launcher in launchers:
+        runs = [
+            measure_boot(launcher, args.workers, env, args.backend == "fake",
+                         args.timeout) for _ in range(args.runs)
+        ]
+        print(f"{launcher:<10}" + "".join(
+            f"{summarize([run[name] for run in runs]):>11}"
+            for name in ("health", "ready", "all_ready", "first_analyze")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Protocol, Set
+from shared_state import SHARED_STATE_BACKEND, get_shared_client
+
+# A hit on a SQLiteCache entry refreshes its last use at most this often,
+# so hits do not all turn into writes.
+SQLITE_CACHE_TOUCH_SECONDS = float(
+    os.getenv("SQLITE_CACHE_TOUCH_SECONDS", "60"))
+
+
+class CacheBackend(Protocol):
+    """
+    Minimal async key/value interface every cache backend implements.
+    Values are opaque strings; expiry is handled by the backend.
+    """
+
+    async def get(self, key: str) -> Optional[str]:
+        ...
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        ...
+
+
+class MemoryCache:
+    """
+    In-process LRU cache with per-entry TTL. Not shared between workers.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        self._entries[key] = (time.time() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """
+    On-disk cache in a single SQLite file, shareable by all workers on a host.
+
+    Writes periodically delete the expired entries and, beyond
+    `max_entries` (0: unbounded), the least recently used ones. Every 1% of
+    `max_entries` writes per worker, so the file overshoots the bound by
+    at most that much per worker between two prunes.
+    """
+
+    def __init__(self, path: str, max_entries: int = 0):
+        self.path = path
+        self.max_entries = max_entries
+        self._prune_every = max(1, max_entries // 100) if max_entries else 1000
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path,
+                                     check_same_thread=False,
+                                     isolation_level=None,
+                                     timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS cache ("
+                           "key TEXT PRIMARY KEY, "
+                           "value TEXT NOT NULL, "
+                           "expires_at REAL NOT NULL, "
+                           "used_at REAL NOT NULL DEFAULT 0)")
+        columns = [
+            row[1]
+            for row in self._conn.execute("PRAGMA table_info(cache)")
+        ]
+        if "used_at" not in columns:
+            # A file from before entries recorded their last use.
+            try:
+                self._conn.execute("ALTER TABLE cache ADD COLUMN "
+                                   "used_at REAL NOT NULL DEFAULT 0")
+            except sqlite3.OperationalError:
+                pass  # Another worker added it first.
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_expires_at "
+                           "ON cache (expires_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_used_at "
+                           "ON cache (used_at)")
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at, used_at FROM cache WHERE key = ?",
+                (key, )).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if row[1] < now:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key, ))
+                return None
+            if now - row[2] >= SQLITE_CACHE_TOUCH_SECONDS:
+                self._conn.execute(
+                    "UPDATE cache SET used_at = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def _set(self, key: str, value: str, ttl: float) -> None:
+        with self._lock:
+            now = time.time()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, "
+                "used_at) VALUES (?, ?, ?, ?)", (key, value, now + ttl, now))
+            self._writes += 1
+            if self._writes >= self._prune_every:
+                self._writes = 0
+                self._prune()
+
+    def _prune(self) -> None:
+        self._conn.execute("DELETE FROM cache WHERE expires_at < ?",
+                           (time.time(), ))
+        if self.max_entries > 0:
+            self._conn.execute(
+                "DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache "
+                "ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries, ))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    async def get(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        await asyncio.to_thread(self._set, key, value, ttl)
+
+
+class RedisCache:
+    """
+    Cache on any Redis-compatible async client exposing
+    `get(key)` and `set(key, value, ex=seconds)`: redis-py or the shared
+    state socket client.
+    """
+
+    def __init__(self, client: Any, prefix: str = "willaireplaceyou:"):
+        self.client = client
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[str]:
+        value = await self.client.get(self.prefix + key)
+        if isinstance(value, bytes):
+            value = value.decode("utf-8")
+        return value
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        await self.client.set(self.prefix + key, value, ex=max(1, int(ttl)))
+
+    async def incr(self, counter: str) -> None:
+        await self.client.incrby(f"{self.prefix}stats:{counter}", 1)
+
+    async def counter(self, counter: str) -> int:
+        value = await self.client.get(f"{self.prefix}stats:{counter}")
+        return int(value or 0)
+
+
+class ResultCache:
+    """
+    Content-addressed cache of JSON payloads with hit/miss accounting.
+
+    Backend failures are counted and treated as misses, the cache must
+    never be the reason an analysis fails. On a shared backend the counters
+    are also kept in the store, for the hit rate across all workers.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.stats = {"hits": 0, "misses": 0, "bypasses": 0, "errors": 0}
+        self._counting: Set[asyncio.Task] = set()
+
+    def _count(self, stat: str) -> None:
+        self.stats[stat] += 1
+        if isinstance(self.backend, RedisCache):
+            # Off the request path; a lost increment only skews the stats.
+            task = asyncio.ensure_future(self._count_shared(stat))
+            self._counting.add(task)
+            task.add_done_callback(self._counting.discard)
+
+    async def _count_shared(self, stat: str) -> None:
+        try:
+            await self.backend.incr(stat)
+        except Exception as e:
+            print(f"⚠️ Shared cache stats update failed: {e}")
+
+    async def get(self, key: str) -> Optional[Any]:
+        try:
+            value = await self.backend.get(key)
+        except Exception as e:
+            print(f"⚠️ Cache read failed: {e}")
+            self._count("errors")
+            value = None
+        if value is None:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return json.loads(value)
+
+    async def set(self, key: str, payload: Any) -> None:
+        try:
+            await self.backend.set(key, json.dumps(payload), self.ttl)
+        except Exception as e:
+            print(f"⚠️ Cache write failed: {e}")
+            self._count("errors")
+
+    def record_bypass(self) -> None:
+        self._count("bypasses")
+
+    async def shared_snapshot(self) -> Optional[dict]:
+        """
+        Counters of all workers sharing the backend, or None if the backend
+        is private to this worker.
+        """
+        if not isinstance(self.backend, RedisCache):
+            return None
+        try:
+            stats = {
+                stat: await self.backend.counter(stat)
+                for stat in self.stats
+            }
+        except Exception as e:
+            print(f"⚠️ Shared cache stats read failed: {e}")
+            return None
+        lookups = stats["hits"] + stats["misses"]
+        return {
+            **stats, "hit_rate": stats["hits"] / lookups if lookups else 0.0
+        }
+
+    def snapshot(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            "backend": type(self.backend).__name__,
+            **self.stats, "hit_rate":
+            self.stats["hits"] / lookups if lookups else 0.0
+        }
+
+
+def normalize_text(value: str) -> str:
+    return " ".join(value.split()).casefold()
+
+
+def fingerprint(fields: dict, *extra: str) -> str:
+    """
+    Stable hash of whitespace/case-normalized fields plus any extra
+    discriminators (pipeline version, scoring mode, ...).
+    """
+    normalized = {
+        name: normalize_text(str(value))
+        for name, value in sorted(fields.items())
+    }
+    raw = json.dumps([normalized, *extra],
+                     ensure_ascii=False,
+                     separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def item_score_key(item_type: str, item_name: str, job_title: str,
+                   prompt_version: str) -> str:
+    """
+    Key for one task/skill score, shared by every profile whose job title
+    normalizes to the same bucket.
+    """
+    return fingerprint({
+        "item_type": item_type,
+        "item_name": item_name,
+        "job_title": job_title
+    }, prompt_version)
+
+
+def backend_from_env(prefix: str, default_backend: str,
+                     default_max_entries: int,
+                     default_path: str) -> Optional[CacheBackend]:
+    """
+    Builds the backend selected by `<prefix>_BACKEND` (memory, sqlite,
+    redis, socket or none). Returns None for "none". With a
+    SHARED_STATE_BACKEND configured, that is the default instead of
+    `default_backend`.
+    """
+    if SHARED_STATE_BACKEND != "none":
+        default_backend = SHARED_STATE_BACKEND
+    backend_name = os.getenv(f"{prefix}_BACKEND", default_backend)
+
+    if backend_name == "none":
+        return None
+    max_entries = int(
+        os.getenv(f"{prefix}_MAX_ENTRIES", str(default_max_entries)))
+    if backend_name == "memory":
+        return MemoryCache(max_entries)
+    if backend_name == "sqlite":
+        return SQLiteCache(os.getenv(f"{prefix}_PATH", default_path),
+                           max_entries)
+    if backend_name in ("redis", "socket"):
+        return RedisCache(get_shared_client(backend_name),
+                          prefix=f"willaireplaceyou:{prefix.lower()}:")
+    raise ValueError(f"Unknown {prefix}_BACKEND: {backend_name}")
+
+
+def _cache_from_env(prefix: str, default_backend: str, default_ttl: float,
+                    default_max_entries: int,
+                    default_path: str) -> Optional[ResultCache]:
+    backend = backend_from_env(prefix, default_backend, default_max_entries,
+                               default_path)
+    if backend is None:
+        return None
+    ttl = float(os.getenv(f"{prefix}_TTL_SECONDS", str(default_ttl)))
+    return ResultCache(backend, ttl)
+
+
+def create_result_cache_from_env() -> Optional[ResultCache]:
+    """
+    Builds the /analyze result cache from RESULT_CACHE_* settings.
+    Returns None when caching is disabled.
+    """
+    return _cache_from_env("RESULT_CACHE", "memory", 86400, 1024,
+                           "result_cache.sqlite3")
+
+
+def create_item_score_cache_from_env() -> Optional[ResultCache]:
+    """
+    Builds the per-item score cache from ITEM_CACHE_* settings.
+    Returns None when caching is disabled.
+    """
+    return _cache_from_env("ITEM_CACHE", "memory", 7 * 86400, 50000,
+                           "item_cache.sqlite3")
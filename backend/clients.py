@@ -0,0 +1,208 @@
+import asyncio
+import os
+import threading
+from typing import Any, Dict, Optional
+import httpx
+from models import (AutomationScore, BatchAutomationScores,
+                    CareerRecommendationsInitial, FutureScenarios,
+                    OccupationResearch, SkillDecomposition,
+                    TaskDecomposition)
+
+LLM_MODEL = "gpt-5.1"
+SCORING_REASONING_EFFORT = "high"
+# Cheaper scoring tier for items too light to move the final score.
+SCORING_LOW_MODEL = os.getenv("SCORING_LOW_MODEL", LLM_MODEL)
+SCORING_LOW_REASONING_EFFORT = os.getenv("SCORING_LOW_REASONING_EFFORT",
+                                         "low")
+# Model and reasoning effort of every scoring tier.
+SCORING_TIERS = {
+    "high": (LLM_MODEL, SCORING_REASONING_EFFORT),
+    "low": (SCORING_LOW_MODEL, SCORING_LOW_REASONING_EFFORT),
+}
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "256"))
+
+# Response schema of every agent the pipeline runs.
+AGENT_SCHEMAS = {
+    "tasks": TaskDecomposition,
+    "skills": SkillDecomposition,
+    "scenarios": FutureScenarios,
+    "careers": CareerRecommendationsInitial,
+    "research": OccupationResearch,
+}
+
+# Agents that can research in the local corpus instead of the web.
+CORPUS_AGENTS = ("tasks", "skills", "scenarios", "careers")
+
+# Structured-output schema of every scoring path.
+SCORER_SCHEMAS = {
+    "per_item": AutomationScore,
+    "batched": BatchAutomationScores,
+}
+
+# Structured-output schema of the adapters that personalize a decomposition
+# taken from the job-title index.
+ADAPTER_SCHEMAS = {
+    "tasks": TaskDecomposition,
+    "skills": SkillDecomposition,
+}
+
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "200"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(
+    os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "100"))
+LLM_KEEPALIVE_EXPIRY_SECONDS = float(
+    os.getenv("LLM_KEEPALIVE_EXPIRY_SECONDS", "120"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "600"))
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """
+    One pooled HTTP client for all model traffic of this process, so TLS
+    sessions are reused instead of being set up per call. Uses HTTP/2 when
+    the `h2` package is installed.
+    """
+    return httpx.AsyncClient(
+        http2=_http2_available(),
+        timeout=httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=10.0),
+        limits=httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=LLM_KEEPALIVE_EXPIRY_SECONDS))
+
+
+class LLMRegistry:
+    """
+    Process-wide set of ready-to-use runnables: compiled agent graphs and
+    structured-output scorers, all sharing one connection pool.
+
+    Build once per worker (see get_registry) and reuse across requests.
+    """
+
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
+        # Imported here rather than at module load: the model SDKs are most
+        # of a worker's import time, and the fake backend never needs them.
+        from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+        from langchain.agents import create_agent
+        from langchain.agents.structured_output import ProviderStrategy
+        from research_corpus import create_corpus_tool, get_research_corpus
+
+        self.http_client = http_client or create_http_client()
+
+        # Retries are done by resilience.resilient_call, per stage and
+        # within its deadlines, not by the SDK.
+        self.llm = ChatOpenAI(model=LLM_MODEL,
+                              max_retries=0,
+                              http_async_client=self.http_client)
+        self.evaluator = ChatOpenAI(
+            model=LLM_MODEL,
+            reasoning={"effort": SCORING_REASONING_EFFORT},
+            max_retries=0,
+            http_async_client=self.http_client)
+        self.low_evaluator = ChatOpenAI(
+            model=SCORING_LOW_MODEL,
+            reasoning={"effort": SCORING_LOW_REASONING_EFFORT},
+            max_retries=0,
+            http_async_client=self.http_client)
+
+        self.agents: Dict[str, Any] = {
+            name: create_agent(self.llm,
+                               response_format=ProviderStrategy(schema),
+                               tools=[{
+                                   "type": "web_search_preview"
+                               }])
+            for name, schema in AGENT_SCHEMAS.items()
+        }
+        # Same agents with the local corpus search tool instead of the
+        # hosted web search; pipeline.run_agent picks one or the other.
+        corpus = get_research_corpus()
+        self.corpus_agents: Dict[str, Any] = {} if corpus is None else {
+            name: create_agent(self.llm,
+                               response_format=ProviderStrategy(
+                                   AGENT_SCHEMAS[name]),
+                               tools=[create_corpus_tool(corpus)])
+            for name in CORPUS_AGENTS
+        }
+        # include_raw keeps the AIMessage around for its token usage; the
+        # scorers return {"raw", "parsed", "parsing_error"}.
+        self.scorers: Dict[str, Any] = {
+            path: self.evaluator.with_structured_output(schema,
+                                                        include_raw=True)
+            for path, schema in SCORER_SCHEMAS.items()
+        }
+        self.low_scorers: Dict[str, Any] = {
+            path: self.low_evaluator.with_structured_output(
+                schema, include_raw=True)
+            for path, schema in SCORER_SCHEMAS.items()
+        }
+        self.embeddings = OpenAIEmbeddings(
+            model=EMBEDDING_MODEL,
+            dimensions=EMBEDDING_DIMENSIONS,
+            http_async_client=self.http_client)
+        # No search tool: adapting an indexed decomposition needs no research.
+        self.adapters: Dict[str, Any] = {
+            name: self.llm.with_structured_output(schema, include_raw=True)
+            for name, schema in ADAPTER_SCHEMAS.items()
+        }
+
+    async def aclose(self) -> None:
+        await self.http_client.aclose()
+
+
+# "openai" talks to the provider; "fake" uses the offline stand-in from
+# fake_llm.py for benchmarks and local development.
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
+
+_registry: Optional[LLMRegistry] = None
+# The registry may be built by a thread (a CLI's, or the warm-up's) while
+# another one asks for it.
+_registry_lock = threading.Lock()
+# The build the event loop's callers await, started by the first of them.
+_registry_build: Optional[asyncio.Future] = None
+
+
+def get_registry() -> LLMRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                if LLM_BACKEND == "fake":
+                    from fake_llm import FakeLLMRegistry
+                    _registry = FakeLLMRegistry.from_env()
+                else:
+                    _registry = LLMRegistry()
+    return _registry
+
+
+async def aget_registry() -> LLMRegistry:
+    """
+    get_registry for code running on the event loop. The first caller
+    (normally the worker's warm-up) builds the registry in a thread; every
+    other caller awaits that build instead of blocking the loop on the lock.
+    """
+    global _registry_build
+    if _registry is not None:
+        return _registry
+    loop = asyncio.get_running_loop()
+    # A failed build is retried by the next caller.
+    if (_registry_build is None or _registry_build.done()
+            or _registry_build.get_loop() is not loop):
+        _registry_build = asyncio.ensure_future(
+            asyncio.to_thread(get_registry))
+    # A cancelled caller leaves the build running for the others.
+    return await asyncio.shield(_registry_build)
+
+
+async def close_registry() -> None:
+    global _registry, _registry_build
+    _registry_build = None
+    if _registry is not None:
+        await _registry.aclose()
+        _registry = None
@@ -0,0 +1,323 @@
+import asyncio
+import hashlib
+import os
+import random
+import re
+from typing import Any, Dict, List, Optional
+from langchain_core.messages import AIMessage
+from clients import CORPUS_AGENTS
+from models import (AutomationScore, BatchAutomationScores,
+                    CareerOptionInitial, CareerRecommendationsInitial,
+                    FutureScenario, FutureScenarios, ItemAutomationScore,
+                    OccupationResearch, Skill, SkillDecomposition, Task,
+                    TaskDecomposition)
+from research_corpus import get_research_corpus
+from resilience import TransientLLMError
+
+
+class FakeLLMError(TransientLLMError):
+    """
+    Injected failure, standing in for a transient provider error.
+    """
+
+
+def _stable_fraction(*parts: str) -> float:
+    digest = hashlib.sha256("\x1f".join(parts).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") / 2**64
+
+
+def _split_evenly(count: int) -> List[float]:
+    weights = [1.0 / count] * count
+    weights[-1] = 1.0 - sum(weights[:-1])
+    return weights
+
+
+class _LatencyModel:
+    """
+    Log-normal latency around a median, plus an error rate, drawn from a
+    seeded RNG so runs are repeatable.
+    """
+
+    def __init__(self, median_ms: float, sigma: float, error_rate: float,
+                 rng: random.Random):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.rng = rng
+
+    async def wait(self, run_name: str) -> None:
+        delay_ms = self.median_ms * self.rng.lognormvariate(0, self.sigma)
+        await asyncio.sleep(delay_ms / 1000)
+        if self.rng.random() < self.error_rate:
+            raise FakeLLMError(f"Injected failure in {run_name}")
+
+
+def _content_of(messages: List[Any]) -> str:
+    return "\n".join(str(message.content) for message in messages)
+
+
+def _ai_message(prompt: str,
+                output_tokens: int,
+                cached_tokens: int = 0) -> AIMessage:
+    """
+    Empty AI message carrying plausible token usage for the metrics.
+    """
+    input_tokens = len(prompt) // 4
+    return AIMessage(content="",
+                     usage_metadata={
+                         "input_tokens": input_tokens,
+                         "output_tokens": output_tokens,
+                         "total_tokens": input_tokens + output_tokens,
+                         "input_token_details": {
+                             "cache_read": cached_tokens
+                         }
+                     },
+                     response_metadata={"model_name": "fake"})
+
+
+class FakeAgent:
+    """
+    Drop-in for a compiled create_agent graph returning a schema-valid
+    `structured_response`. With `search_latency`, it also waits as long as
+    a hosted web search would take.
+    """
+
+    def __init__(self,
+                 name: str,
+                 latency: _LatencyModel,
+                 tasks: int,
+                 skills: int,
+                 search_latency: Optional[_LatencyModel] = None):
+        self.name = name
+        self.latency = latency
+        self.tasks = tasks
+        self.skills = skills
+        self.search_latency = search_latency
+
+    def _response(self, profile_text: str) -> Any:
+        if self.name == "tasks":
+            return TaskDecomposition(tasks=[
+                Task(task_name=f"Task {i + 1} of {self._title(profile_text)}",
+                     time_share=share)
+                for i, share in enumerate(_split_evenly(self.tasks))
+            ])
+        if self.name == "skills":
+            return SkillDecomposition(skills=[
+                Skill(skill_name=f"Skill {i + 1}", importance=weight)
+                for i, weight in enumerate(_split_evenly(self.skills))
+            ])
+        if self.name == "scenarios":
+            return FutureScenarios(scenarios=[
+                FutureScenario(title=title,
+                               description=f"{title} scenario narrative.",
+                               likelihood=likelihood)
+                for title, likelihood in [(
+                    "Human-Centric Evolution",
+                    "medium"), ("High Automation Integration", "low")]
+            ])
+        if self.name == "research":
+            title = self._title(profile_text)
+            return OccupationResearch(
+                overview=f"{title} is a common occupation.",
+                typical_tasks=[
+                    f"Task {i + 1} of {title}" for i in range(self.tasks)
+                ],
+                key_skills=[f"Skill {i + 1}" for i in range(self.skills)],
+                automation_outlook=f"AI assists {title} with routine work.",
+                career_paths=f"People leave {title} for adjacent roles.",
+                sources=["fake"])
+        return CareerRecommendationsInitial(recommendations=[
+            CareerOptionInitial(job_title=f"Alternative Career {i + 1}",
+                                reason="Builds on the most human skills.",
+                                transferable_skills=["Skill 1"],
+                                new_skills_needed=["AI tooling"],
+                                ease_of_transition="Medium") for i in range(3)
+        ])
+
+    @staticmethod
+    def _title(profile_text: str) -> str:
+        match = re.search(r"Job Title: (.*)", profile_text)
+        return match.group(1).strip() if match else "the job"
+
+    async def ainvoke(self, input: dict, config: dict = None) -> dict:
+        run_name = (config or {}).get("run_name", self.name)
+        if self.search_latency is not None:
+            await self.search_latency.wait(run_name)
+        await self.latency.wait(run_name)
+        prompt = _content_of(input["messages"])
+        return {
+            "messages": [*input["messages"],
+                         _ai_message(prompt, 1500)],
+            "structured_response": self._response(prompt)
+        }
+
+
+class FakeScorer:
+    """
+    Drop-in for a structured-output scorer. Scores are a stable function of
+    the item name, so repeated runs agree exactly; `noise` shifts them by a
+    stable offset of up to that much, standing in for a cheaper tier. Like
+    the provider's prompt cache, it reports every message but the last as
+    cached once seen.
+    """
+
+    def __init__(self,
+                 path: str,
+                 latency: _LatencyModel,
+                 noise: float = 0.0):
+        self.path = path
+        self.latency = latency
+        self.noise = noise
+        self._prefixes: set = set()
+
+    def _score(self, name: str) -> float:
+        offset = (_stable_fraction(name, "noise") * 2 - 1) * self.noise
+        return min(1.0, max(0.0, _stable_fraction(name) + offset))
+
+    async def ainvoke(self, messages: List[Any], config: dict = None) -> Any:
+        run_name = (config or {}).get("run_name", self.path)
+        await self.latency.wait(run_name)
+        text = _content_of(messages)
+        if self.path == "batched":
+            names = re.findall(r"^\s*- Name: (.*?) \|", text, re.MULTILINE)
+            parsed = BatchAutomationScores(scores=[
+                ItemAutomationScore(name=name, score=self._score(name))
+                for name in names
+            ])
+        else:
+            match = re.search(r"Name: (.*)", text)
+            parsed = AutomationScore(score=self._score(
+                match.group(1).strip() if match else text))
+        prefix = _content_of(messages[:-1])
+        cached_tokens = len(prefix) // 4 if prefix in self._prefixes else 0
+        if len(self._prefixes) >= 10000:
+            self._prefixes.clear()
+        self._prefixes.add(prefix)
+        return {
+            "raw": _ai_message(text, 800, cached_tokens),
+            "parsed": parsed,
+            "parsing_error": None
+        }
+
+
+class FakeAdapter:
+    """
+    Drop-in for a decomposition adapter: returns the canonical decomposition
+    from the prompt unchanged.
+    """
+
+    def __init__(self, name: str, latency: _LatencyModel):
+        self.name = name
+        self.latency = latency
+
+    async def ainvoke(self, messages: List[Any], config: dict = None) -> Any:
+        run_name = (config or {}).get("run_name", self.name)
+        await self.latency.wait(run_name)
+        text = _content_of(messages)
+        schema = (TaskDecomposition
+                  if self.name == "tasks" else SkillDecomposition)
+        canonical = text.split("Canonical Decomposition:", 1)[1]
+        return {
+            "raw": _ai_message(text, 600),
+            "parsed": schema.model_validate_json(canonical),
+            "parsing_error": None
+        }
+
+
+class FakeEmbeddings:
+    """
+    Drop-in for the embeddings client: hashed character trigram counts, so
+    texts sharing most of their wording come out close.
+    """
+
+    def __init__(self, dimensions: int = 256):
+        self.dimensions = dimensions
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        padded = f"  {text.lower()} "
+        for i in range(len(padded) - 2):
+            digest = hashlib.md5(padded[i:i + 3].encode("utf-8")).digest()
+            vector[int.from_bytes(digest[:4], "big") % self.dimensions] += 1
+        return vector
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+
+class FakeLLMRegistry:
+    """
+    Offline stand-in for clients.LLMRegistry (LLM_BACKEND=fake): same
+    `agents`, `corpus_agents`, `scorers` and `low_scorers` mappings, no
+    network, configurable latency and error injection. `search_latency_ms`
+    is added to the agents with the hosted web search only.
+    """
+
+    def __init__(self,
+                 agent_latency_ms: float = 50,
+                 search_latency_ms: float = 0,
+                 score_latency_ms: float = 20,
+                 low_score_latency_ms: float = 8,
+                 low_score_noise: float = 0.1,
+                 latency_sigma: float = 0.5,
+                 error_rate: float = 0.0,
+                 tasks: int = 8,
+                 skills: int = 6,
+                 seed: int = 0):
+        rng = random.Random(seed)
+        agent_latency = _LatencyModel(agent_latency_ms, latency_sigma,
+                                      error_rate, rng)
+        score_latency = _LatencyModel(score_latency_ms, latency_sigma,
+                                      error_rate, rng)
+        low_score_latency = _LatencyModel(low_score_latency_ms,
+                                          latency_sigma, error_rate, rng)
+        # Its own RNG: the other latencies draw the same values with or
+        # without it.
+        search_latency = (_LatencyModel(search_latency_ms, latency_sigma, 0,
+                                        random.Random(seed + 1))
+                          if search_latency_ms > 0 else None)
+        self.agents: Dict[str, Any] = {
+            name: FakeAgent(name, agent_latency, tasks, skills,
+                            search_latency)
+            for name in ("tasks", "skills", "scenarios", "careers",
+                         "research")
+        }
+        self.corpus_agents: Dict[str, Any] = {
+            name: FakeAgent(name, agent_latency, tasks, skills)
+            for name in CORPUS_AGENTS
+        } if get_research_corpus() is not None else {}
+        self.scorers: Dict[str, Any] = {
+            path: FakeScorer(path, score_latency)
+            for path in ("per_item", "batched")
+        }
+        self.low_scorers: Dict[str, Any] = {
+            path: FakeScorer(path, low_score_latency, low_score_noise)
+            for path in ("per_item", "batched")
+        }
+        self.adapters: Dict[str, Any] = {
+            name: FakeAdapter(name, score_latency)
+            for name in ("tasks", "skills")
+        }
+        self.embeddings = FakeEmbeddings()
+
+    @classmethod
+    def from_env(cls) -> "FakeLLMRegistry":
+        return cls(
+            agent_latency_ms=float(
+                os.getenv("FAKE_LLM_AGENT_LATENCY_MS", "50")),
+            search_latency_ms=float(
+                os.getenv("FAKE_LLM_SEARCH_LATENCY_MS", "0")),
+            score_latency_ms=float(
+                os.getenv("FAKE_LLM_SCORE_LATENCY_MS", "20")),
+            low_score_latency_ms=float(
+                os.getenv("FAKE_LLM_LOW_SCORE_LATENCY_MS", "8")),
+            low_score_noise=float(os.getenv("FAKE_LLM_LOW_SCORE_NOISE",
+                                            "0.1")),
+            latency_sigma=float(os.getenv("FAKE_LLM_LATENCY_SIGMA", "0.5")),
+            error_rate=float(os.getenv("FAKE_LLM_ERROR_RATE", "0")),
+            tasks=int(os.getenv("FAKE_LLM_TASKS", "8")),
+            skills=int(os.getenv("FAKE_LLM_SKILLS", "6")),
+            seed=int(os.getenv("FAKE_LLM_SEED", "0")))
+
+    async def aclose(self) -> None:
+        pass
@@ -0,0 +1,440 @@
+"""
+History of completed analyses, each stored with the versions of the stages
+that produced it (see pipeline.stage_versions).
+
+When a prompt, the model or a reasoning setting changes, stored analyses go
+stale stage by stage. The re-score job recomputes only the stale stages and
+what is downstream of them, reusing the rest: a scoring prompt tweak
+re-scores the items of the stored decompositions and rebuilds the
+narratives, without re-running the decomposition agents.
+
+The history is off unless ANALYSIS_HISTORY_PATH is set, and it only keeps
+entries for ANALYSIS_HISTORY_TTL_DAYS, at most ANALYSIS_HISTORY_MAX_ROWS.
+
+    poetry run python history.py rescore --dry-run
+    poetry run python history.py rescore --concurrency 16 -o rescored.jsonl
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, AsyncIterator, List, Optional, Tuple
+from models import UserProfile, Task, Skill
+from clients import close_registry, get_registry
+from cache import fingerprint
+from serialization import to_jsonable
+from pipeline import (NARRATIVE_START, ScoringMode, aggregate_scores,
+                      build_analysis_summary, build_job_context,
+                      build_preliminary_summary, decompose,
+                      generate_narratives, mark_fallbacks, score_items,
+                      stage_versions, stale_stages, with_drafts)
+
+# SQLite file of the history. It holds personal profiles, so it is opt-in:
+# "none" (the default) disables it.
+ANALYSIS_HISTORY_PATH = os.getenv("ANALYSIS_HISTORY_PATH", "none")
+# Analyses are deleted this many days after they were first recorded, and
+# beyond this many entries, oldest first. 0 disables either limit.
+ANALYSIS_HISTORY_TTL_DAYS = float(os.getenv("ANALYSIS_HISTORY_TTL_DAYS", "30"))
+ANALYSIS_HISTORY_MAX_ROWS = int(
+    os.getenv("ANALYSIS_HISTORY_MAX_ROWS", "100000"))
+# Writes prune expired and surplus entries at most this often.
+ANALYSIS_HISTORY_PRUNE_SECONDS = 60.0
+RESCORE_CONCURRENCY = int(os.getenv("RESCORE_CONCURRENCY", "8"))
+# Re-scoring runs below interactive traffic, at the batch runs' offset.
+RESCORE_PRIORITY_OFFSET = float(os.getenv("BATCH_PRIORITY_OFFSET", "3600"))
+
+
+def history_key(profile: UserProfile, scoring_mode: str,
+                source: Optional[dict]) -> str:
+    # No versions: a newer analysis of the same profile replaces the old one.
+    # Batch rows are kept per row, identical profiles of two employees are
+    # still two entries.
+    extra = [] if source is None else [str(source.get("id"))]
+    return fingerprint(profile.model_dump(), scoring_mode, *extra)
+
+
+class AnalysisHistory:
+    """
+    Latest analysis of every profile (per scoring mode) in a single SQLite
+    file, shareable by all workers on a host. Entries older than `ttl`
+    seconds and beyond `max_rows` are pruned, oldest first.
+    """
+
+    def __init__(self,
+                 path: str,
+                 ttl: float = ANALYSIS_HISTORY_TTL_DAYS * 86400,
+                 max_rows: int = ANALYSIS_HISTORY_MAX_ROWS):
+        self.path = path
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._pruned_at = 0.0
+        self._conn = sqlite3.connect(path,
+                                     check_same_thread=False,
+                                     isolation_level=None,
+                                     timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS analyses ("
+                           "key TEXT PRIMARY KEY, "
+                           "profile TEXT NOT NULL, "
+                           "scoring_mode TEXT NOT NULL, "
+                           "result TEXT NOT NULL, "
+                           "source TEXT, "
+                           "updated_at REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS analyses_updated_at "
+                           "ON analyses (updated_at)")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM analyses").fetchone()[0]
+
+    def _put(self, key: str, profile: str, scoring_mode: str, result: str,
+             source: Optional[str], updated_at: float) -> None:
+        # An upsert keeps the rowid of an existing entry (INSERT OR REPLACE
+        # would give it a new one), so entries() paging by rowid does not
+        # meet the entries a re-score writes back a second time.
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO analyses (key, profile, scoring_mode, result, "
+                "source, updated_at) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET profile = excluded.profile, "
+                "scoring_mode = excluded.scoring_mode, "
+                "result = excluded.result, source = excluded.source, "
+                "updated_at = excluded.updated_at",
+                (key, profile, scoring_mode, result, source, updated_at))
+        if time.time() - self._pruned_at >= ANALYSIS_HISTORY_PRUNE_SECONDS:
+            self.prune()
+
+    def prune(self) -> int:
+        """
+        Deletes the expired entries and those beyond `max_rows`, oldest
+        first. Returns how many were deleted.
+        """
+        deleted = 0
+        with self._lock:
+            self._pruned_at = time.time()
+            if self.ttl > 0:
+                deleted += self._conn.execute(
+                    "DELETE FROM analyses WHERE updated_at < ?",
+                    (time.time() - self.ttl, )).rowcount
+            if self.max_rows > 0:
+                deleted += self._conn.execute(
+                    "DELETE FROM analyses WHERE rowid IN (SELECT rowid "
+                    "FROM analyses ORDER BY updated_at DESC "
+                    "LIMIT -1 OFFSET ?)", (self.max_rows, )).rowcount
+        return deleted
+
+    def _page(self, after: int, size: int) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT rowid, key, profile, scoring_mode, result, source, "
+                "updated_at FROM analyses WHERE rowid > ? ORDER BY rowid "
+                "LIMIT ?", (after, size)).fetchall()
+
+    async def record(self,
+                     profile: UserProfile,
+                     scoring_mode: ScoringMode,
+                     result: dict,
+                     source: Optional[dict] = None,
+                     recorded_at: Optional[float] = None) -> None:
+        """
+        Stores the analysis of a profile. Compare runs are diagnostics and
+        not kept. A failed write is logged, never raised: the history must
+        not fail the analysis it records. `recorded_at` keeps the time of an
+        earlier analysis (re-scoring does not extend its retention).
+        """
+        if scoring_mode == "compare":
+            return
+        # Timings describe one particular run, not the analysis.
+        stored = {
+            name: value
+            for name, value in result.items() if name != "timings"
+        }
+        try:
+            await asyncio.to_thread(
+                self._put, history_key(profile, scoring_mode, source),
+                json.dumps(profile.model_dump(), ensure_ascii=False),
+                scoring_mode, json.dumps(to_jsonable(stored),
+                                         ensure_ascii=False),
+                json.dumps(source) if source is not None else None,
+                time.time() if recorded_at is None else recorded_at)
+        except Exception as e:
+            print(f"⚠️ Analysis history write failed. Error: {e}")
+
+    async def entries(self, page_size: int = 500) -> AsyncIterator[dict]:
+        """
+        Every stored analysis, read a page at a time.
+        """
+        after = 0
+        while True:
+            rows = await asyncio.to_thread(self._page, after, page_size)
+            for (rowid, key, profile, scoring_mode, result, source,
+                 updated_at) in rows:
+                yield {
+                    "key": key,
+                    "profile": json.loads(profile),
+                    "scoring_mode": scoring_mode,
+                    "result": json.loads(result),
+                    "source": json.loads(source) if source else None,
+                    "updated_at": updated_at
+                }
+                after = rowid
+            if len(rows) < page_size:
+                return
+
+
+def create_history_from_env() -> Optional[AnalysisHistory]:
+    """
+    The history at ANALYSIS_HISTORY_PATH. Returns None when it is "none",
+    the default.
+    """
+    if ANALYSIS_HISTORY_PATH == "none":
+        return None
+    return AnalysisHistory(ANALYSIS_HISTORY_PATH)
+
+
+analysis_history = create_history_from_env()
+
+
+def plan_rescore(result: dict, scoring_mode: ScoringMode) -> List[str]:
+    """
+    Stages of a stored analysis to recompute, in pipeline order. Analyses
+    stored without narratives (batch runs) stay without them; degraded
+    scoring and narratives are always redone.
+    """
+    narratives = "future_scenarios" in result
+    degraded = result.get("degraded", [])
+    versions = {
+        stage: version
+        for stage, version in result.get("versions", {}).items()
+        if stage not in degraded
+    }
+    stale = stale_stages(versions, stage_versions(scoring_mode, narratives))
+    if (narratives and set(degraded) & {"scenarios", "careers"}
+            and "narratives" not in stale):
+        stale.append("narratives")
+    return stale
+
+
+def stored_items(result: dict) -> Tuple[List[Task], List[Skill]]:
+    """
+    The decomposition of a stored analysis, rebuilt from its breakdowns.
+    """
+    tasks = [
+        Task(task_name=name, time_share=entry["time_share"])
+        for name, entry in result["task_automation_breakdown"].items()
+    ]
+    skills = [
+        Skill(skill_name=name, importance=entry["importance"])
+        for name, entry in result["skill_automation_breakdown"].items()
+    ]
+    return tasks, skills
+
+
+def stored_scores(
+        breakdown: dict
+) -> Tuple[List[float], Optional[List[float]], List[str]]:
+    """
+    Scores, draft scores (progressive analyses, else None) and tiers of a
+    stored breakdown.
+    """
+    drafts = [entry.get("draft_score") for entry in breakdown.values()]
+    return ([entry["score"] for entry in breakdown.values()],
+            None if None in drafts else drafts,
+            [entry.get("tier", "high") for entry in breakdown.values()])
+
+
+async def rescore_analysis(profile: UserProfile, scoring_mode: ScoringMode,
+                           previous: dict, stale: List[str],
+                           priority: float) -> dict:
+    """
+    Recomputes the `stale` stages of a stored analysis and reuses the
+    others from `previous`.
+    """
+    job_context = build_job_context(profile)
+    if "decomposition" in stale:
+        tasks, skills = await asyncio.gather(
+            decompose("task", job_context, priority, profile.job_title),
+            decompose("skill", job_context, priority, profile.job_title))
+    else:
+        tasks, skills = stored_items(previous)
+
+    degraded: List[str] = []
+    if "scoring" in stale:
+        (task_scores, draft_tasks, task_tiers,
+         task_fallbacks), (skill_scores, draft_skills, skill_tiers,
+                           skill_fallbacks) = await asyncio.gather(
+            score_items(tasks, "task", job_context, scoring_mode, priority,
+                        job_title=profile.job_title),
+            score_items(skills, "skill", job_context, scoring_mode,
+                        priority, job_title=profile.job_title))
+        aggregate = aggregate_scores(tasks, task_scores, skills, skill_scores,
+                                     task_tiers, skill_tiers)
+        if mark_fallbacks(aggregate, tasks, task_fallbacks, skills,
+                          skill_fallbacks):
+            degraded.append("scoring")
+    else:
+        task_scores, draft_tasks, task_tiers = stored_scores(
+            previous["task_automation_breakdown"])
+        skill_scores, draft_skills, skill_tiers = stored_scores(
+            previous["skill_automation_breakdown"])
+        aggregate = aggregate_scores(tasks, task_scores, skills, skill_scores,
+                                     task_tiers, skill_tiers)
+    result = (with_drafts(aggregate, tasks, draft_tasks, skills,
+                          draft_skills)
+              if scoring_mode == "progressive" else dict(aggregate))
+
+    narratives = "future_scenarios" in previous
+    if "narratives" in stale:
+        summary = (build_preliminary_summary(job_context, tasks, skills)
+                   if NARRATIVE_START == "preliminary" else
+                   build_analysis_summary(job_context, aggregate))
+        scenarios, careers, skipped = await generate_narratives(
+            summary, priority, job_title=profile.job_title)
+        result["future_scenarios"] = scenarios
+        result["career_recommendations"] = careers
+        degraded += skipped
+    elif narratives:
+        result["future_scenarios"] = previous["future_scenarios"]
+        result["career_recommendations"] = previous["career_recommendations"]
+    if degraded:
+        result["degraded"] = degraded
+    result["versions"] = stage_versions(scoring_mode, narratives)
+    return result
+
+
+async def rescore(history: AnalysisHistory,
+                  concurrency: int = RESCORE_CONCURRENCY,
+                  limit: Optional[int] = None,
+                  dry_run: bool = False,
+                  output: Optional[Any] = None) -> dict:
+    """
+    Brings every stale analysis of the history up to date and returns the
+    per-stage counts. Analyses that came from batch.py rows are also written
+    to `output` as batch records, ready for `rollup.py import`.
+    """
+    summary: dict = {
+        "analyses": 0,
+        "current": 0,
+        "stale": 0,
+        "rescored": 0,
+        "failed": 0,
+        "recomputed": Counter(),
+        "reused": Counter()
+    }
+    priority = time.monotonic() + RESCORE_PRIORITY_OFFSET
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+
+    async def work(entry: dict, stale: List[str]) -> None:
+        profile = UserProfile(**entry["profile"])
+        try:
+            result = await rescore_analysis(profile, entry["scoring_mode"],
+                                            entry["result"], stale,
+                                            priority)
+        except Exception as e:
+            print(f"⚠️ Re-scoring analysis {entry['key'][:12]} failed. "
+                  f"Error: {e}")
+            summary["failed"] += 1
+            return
+        await history.record(profile, entry["scoring_mode"], result,
+                             entry["source"], entry["updated_at"])
+        summary["rescored"] += 1
+        if output is not None and entry["source"] is not None:
+            output.write(
+                json.dumps({
+                    "id": entry["source"].get("id"),
+                    "job_title": profile.job_title,
+                    "department": entry["source"].get("department"),
+                    "status": "ok",
+                    "result": to_jsonable(result)
+                }) + "\n")
+
+    async def worker() -> None:
+        while (job := await queue.get()) is not None:
+            await work(*job)
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        async for entry in history.entries():
+            summary["analyses"] += 1
+            stale = plan_rescore(entry["result"], entry["scoring_mode"])
+            if not stale:
+                summary["current"] += 1
+                continue
+            if limit is not None and summary["stale"] >= limit:
+                continue
+            summary["stale"] += 1
+            summary["recomputed"].update(stale)
+            summary["reused"].update(
+                stage for stage in stage_versions(
+                    entry["scoring_mode"], "future_scenarios"
+                    in entry["result"]) if stage not in stale)
+            if not dry_run:
+                await queue.put((entry, stale))
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+    summary["recomputed"] = dict(summary["recomputed"])
+    summary["reused"] = dict(summary["reused"])
+    return summary
+
+
+async def run_rescore(args: argparse.Namespace) -> dict:
+    history = AnalysisHistory(args.history)
+    await asyncio.to_thread(history.prune)
+    output = open(args.output, "a",
+                  encoding="utf-8") if args.output else None
+    get_registry()
+    try:
+        return await rescore(history, args.concurrency, args.limit,
+                             args.dry_run, output)
+    finally:
+        if output is not None:
+            output.close()
+        await close_registry()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--history", default=ANALYSIS_HISTORY_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    rescore_parser = commands.add_parser(
+        "rescore", help="recompute the stale stages of stored analyses")
+    rescore_parser.add_argument("--concurrency",
+                                type=int,
+                                default=RESCORE_CONCURRENCY)
+    rescore_parser.add_argument("--limit",
+                                type=int,
+                                help="re-score at most this many analyses")
+    rescore_parser.add_argument("--dry-run",
+                                action="store_true",
+                                help="only report what would be recomputed")
+    rescore_parser.add_argument(
+        "-o",
+        "--output",
+        help="append re-scored batch rows to this JSONL file")
+    args = parser.parse_args()
+
+    if args.history == "none":
+        print("No analysis history configured: set ANALYSIS_HISTORY_PATH "
+              "or pass --history", file=sys.stderr)
+        sys.exit(1)
+    if not os.path.exists(args.history):
+        print(f"No analysis history at {args.history}", file=sys.stderr)
+        sys.exit(1)
+    summary = asyncio.run(run_rescore(args))
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import asyncio
+import json
+import os
+import time
+import traceback
+import uuid
+from typing import Any, Awaitable, Callable, List, Optional
+from fastapi import HTTPException
+from cache import CacheBackend, backend_from_env
+
+# Receives the job request and an event callback, returns the final payload.
+JobHandler = Callable[[dict, Callable[[str, Any], Awaitable[None]]],
+                      Awaitable[dict]]
+
+
+class JobQueueFull(Exception):
+    """
+    Raised on submit when the pending-job queue is full.
+    """
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Job queue full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+def _apply_event(job: dict, event: str, data: Any) -> None:
+    """
+    Folds one pipeline event into the job's stage-level progress. Draft
+    scores and the draft aggregate of progressive scoring are not progress:
+    every item is still scored (and counted) once more for good.
+    """
+    if isinstance(data, dict) and data.get("status") == "draft":
+        return
+    progress = job["progress"]
+    if event == "tasks":
+        progress["tasks"] = len(data)
+    elif event == "skills":
+        progress["skills"] = len(data)
+    elif event == "score":
+        progress["items_scored"] += 1
+    elif event == "aggregate":
+        job["stage"] = "narratives"
+        progress["weighted_final_score"] = data["weighted_final_score"]
+    elif event == "scenarios":
+        progress["scenarios_ready"] = True
+    elif event == "careers":
+        progress["careers_ready"] = True
+
+    if progress["tasks"] is not None and progress["skills"] is not None:
+        progress["items_total"] = progress["tasks"] + progress["skills"]
+        if job["stage"] == "decomposition":
+            job["stage"] = "scoring"
+
+
+class AnalysisJobs:
+    """
+    Background execution of analyses: submit() returns immediately and a
+    fixed pool of worker coroutines runs the pipeline.
+
+    Job records live in a CacheBackend with a TTL, so the store stays
+    bounded and, with the sqlite or redis backend, any worker can answer
+    status polls for jobs run by another one.
+    """
+
+    def __init__(self,
+                 handler: JobHandler,
+                 store: CacheBackend,
+                 workers: int = 4,
+                 max_pending: int = 1000,
+                 ttl: float = 3600):
+        self.handler = handler
+        self.store = store
+        self.workers = workers
+        self.ttl = ttl
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._worker_tasks: List[asyncio.Task] = []
+
+    async def _save(self, job: dict) -> None:
+        job["updated_at"] = time.time()
+        await self.store.set(job["job_id"], json.dumps(job), self.ttl)
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        value = await self.store.get(job_id)
+        return None if value is None else json.loads(value)
+
+    async def submit(self, request: dict) -> dict:
+        now = time.time()
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "status": "queued",
+            "stage": "queued",
+            "progress": {
+                "tasks": None,
+                "skills": None,
+                "items_total": None,
+                "items_scored": 0,
+                "weighted_final_score": None,
+                "scenarios_ready": False,
+                "careers_ready": False
+            },
+            "created_at": now,
+            "updated_at": now,
+            "result": None,
+            "error": None
+        }
+        if self._queue.full():
+            raise JobQueueFull(retry_after=30)
+        # Persist before enqueueing so a fast worker's updates always land
+        # after the initial record.
+        await self._save(job)
+        self._queue.put_nowait((job, request))
+        return job
+
+    async def _run(self, job: dict, request: dict) -> None:
+        job["status"] = "running"
+        job["stage"] = "decomposition"
+        await self._save(job)
+
+        async def on_event(event: str, data: Any) -> None:
+            _apply_event(job, event, data)
+            await self._save(job)
+
+        try:
+            job["result"] = await self.handler(request, on_event)
+            job["status"] = "succeeded"
+            job["stage"] = "done"
+        except HTTPException as e:
+            job["status"] = "failed"
+            job["error"] = {"status_code": e.status_code, "detail": e.detail}
+        except Exception as e:
+            print(f"⚠️ Analysis job {job['job_id']} failed. Error: {e}")
+            traceback.print_exc()
+            job["status"] = "failed"
+            job["error"] = {
+                "status_code": 500,
+                "detail": "Internal Server Error"
+            }
+        await self._save(job)
+
+    async def _worker(self) -> None:
+        while True:
+            job, request = await self._queue.get()
+            try:
+                await self._run(job, request)
+            finally:
+                self._queue.task_done()
+
+    def start(self) -> None:
+        self._worker_tasks = [
+            asyncio.create_task(self._worker()) for _ in range(self.workers)
+        ]
+
+    async def stop(self) -> None:
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+
+def create_jobs_from_env(handler: JobHandler) -> AnalysisJobs:
+    store = backend_from_env("JOB_STORE", "memory", 10000, "jobs.sqlite3")
+    if store is None:
+        raise ValueError("JOB_STORE_BACKEND cannot be none")
+    return AnalysisJobs(
+        handler,
+        store,
+        workers=int(os.getenv("ANALYSIS_JOB_WORKERS", "4")),
+        max_pending=int(os.getenv("ANALYSIS_JOB_MAX_PENDING", "1000")),
+        ttl=float(os.getenv("JOB_STORE_TTL_SECONDS", "3600")))
@@ -1,23 +1,48 @@
 import asyncio
-import json
+import csv
 import re
-from typing import List, Union, Literal
-from fastapi import FastAPI, HTTPException, Request, Response
+import time
+import traceback
+from typing import Any, Awaitable, Callable, Literal, Optional, Union
+from fastapi import FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field, ValidationError
-import uvicorn
-from langchain_openai import ChatOpenAI
-from langchain.agents import create_agent
-from langchain.agents.structured_output import ProviderStrategy
-from langchain_core.messages import SystemMessage, HumanMessage, BaseMessage
-from prompts import (
-    TASKS_DECOMPOSITION_SYSTEM_PROMPT, TASKS_REPLACABILITY_SYSTEM_PROMPT,
-    SKILLS_DECOMPOSITION_SYSTEM_PROMPT, SKILLS_REPLACABILITY_SYSTEM_PROMPT,
-    SCENARIO_GENERATION_SYSTEM_PROMPT, CAREER_RECOMMENDATIONS_SYSTEM_PROMPT)
+from fastapi.responses import (JSONResponse, PlainTextResponse,
+                               StreamingResponse)
+from starlette.requests import ClientDisconnect
+from starlette.types import Receive, Scope, Send
+from contextlib import asynccontextmanager
+from langchain_core.messages import BaseMessage
+from models import UserProfile
+from clients import aget_registry, close_registry
+from scheduler import SchedulerOverloaded
+from batch import BatchRunner, iter_upload_rows
+from jobs import JobQueueFull, create_jobs_from_env
+from metrics import CallbackMetric, register, render_metrics
+from cache import (ResultCache, create_result_cache_from_env, fingerprint,
+                   normalize_text)
+from semantic_cache import SEMANTIC_CACHE_RESULT_THRESHOLD
+from serialization import FastJSONResponse, dumps, to_jsonable
+from singleflight import Flight, SingleFlight
+from history import analysis_history
+from rollup import (WorkforceStore, create_workforce_store_from_env,
+                    import_records, rollup)
+from pipeline import (NARRATIVE_START, PIPELINE_VERSION, SCORING_MODE,
+                      EventEmitter, ScoringMode, item_score_cache,
+                      llm_scheduler, run_analysis, semantic_cache)
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Profile fields that make two submissions "the same analysis".
+FINGERPRINT_FIELDS = {
+    "job_title", "job_description", "daily_routine", "location", "education"
+}
+
+result_cache = create_result_cache_from_env()
+# Identical analyses requested while one is running attach to it.
+profile_flights = SingleFlight("analysis")
+workforce_store = create_workforce_store_from_env()
+
 
 # --- Helper Functions for Content Blocks ---
 def get_text_content(message: BaseMessage) -> str:
@@ -33,7 +58,45 @@ def get_text_content(message: BaseMessage) -> str:
     return message.content if isinstance(message.content, str) else ""
 
 
-app = FastAPI()
+# Warm-up state of this worker, reported by /ready: "warming_up", "ready",
+# "failed" or "stopping".
+startup = {"status": "warming_up", "warmup_seconds": None, "error": None}
+
+
+async def warm_up() -> None:
+    """
+    Builds the model clients and agent graphs, importing the model SDKs on
+    the way. The build runs in a thread, so the worker already answers
+    /health and /ready while it warms up; an early request awaits the same
+    build without blocking the event loop.
+    """
+    started_at = time.perf_counter()
+    try:
+        await aget_registry()
+    except Exception as e:
+        print(f"⚠️ Worker warm-up failed. Error: {e}")
+        traceback.print_exception(e)
+        startup.update(status="failed", error=str(e))
+        return
+    startup.update(status="ready",
+                   warmup_seconds=round(time.perf_counter() - started_at, 3))
+    print(f"🔥 Worker ready in {startup['warmup_seconds']:.2f} s")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Clients and agent graphs are built once per worker, in the background
+    # so the worker starts serving right away; /ready flips once they are.
+    warmup = asyncio.create_task(warm_up())
+    analysis_jobs.start()
+    yield
+    startup["status"] = "stopping"
+    await warmup
+    await analysis_jobs.stop()
+    await close_registry()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 origins = [
     "https://willaireplace.you",
@@ -50,345 +113,497 @@ app.add_middleware(
 )
 
 
-class UserProfile(BaseModel):
-    age: str
-    gender: str
-    job_title: str
-    job_description: str
-    daily_routine: str
-    location: str
-    education: str
-
-    model_config = {
-        "json_schema_extra": {
-            "examples": [{
-                "age":
-                "25 rokov",
-                "gender":
-                "muz",
-                "job_title":
-                "psycholog",
-                "job_description":
-                "Pomaham klientom s ich mentalnym stavom na zaklade medziludskej komunikacie.",
-                "daily_routine":
-                "Skoro rano pridem do prace, citam si diar, pride klient, s ktorym prekonzultujem ich problemy, zanalyzujem ich situaciu, pinpointujem nihc zivotne problemy a postupne casom sa snazim ezlepsit ich mentalny stav",
-                "location":
-                "kancelaria v Kosiciach",
-                "education":
-                "univerzita komenskeho v Bratislave, psychologia"
-            }]
-        }
-    }
+@app.exception_handler(SchedulerOverloaded)
+@app.exception_handler(JobQueueFull)
+async def server_busy_handler(request: Request,
+                              exc: Union[SchedulerOverloaded, JobQueueFull]):
+    return JSONResponse(status_code=429,
+                        headers={"Retry-After": str(int(exc.retry_after))},
+                        content={
+                            "detail": {
+                                "error_code":
+                                "SERVER_BUSY",
+                                "message":
+                                "We are analyzing a lot of profiles right now. Please try again in a moment."
+                            }
+                        })
 
 
-# Renamed models for clarity
-class Task(BaseModel):
-    task_name: str = Field(
-        description="Name of the specific task performed in the job")
-    time_share: float = Field(
-        description=
-        "Fraction of total work time spent on this task (must verify all tasks sum to 1.0)"
-    )
+# Seconds of silence after which the SSE stream sends a keep-alive comment so
+# that proxies do not drop the connection while a slow stage is running.
+SSE_HEARTBEAT_SECONDS = 15
 
 
-class Skill(BaseModel):
-    skill_name: str = Field(
-        description="Name of the specific skill required for the job")
-    importance: float = Field(
-        description=
-        "Importance weight of this skill (must verify all skills sum to 1.0)")
+def log_incoming_profile(profile: UserProfile) -> None:
+    print("\n=== INCOMING REQUEST PROFILE ===")
+    print(profile.model_dump_json(indent=2))
+    print("================================\n")
 
 
-class AutomationScore(BaseModel):
-    score: float = Field(
-        description="Automation score 0.0-1.0 (1.0 being fully automatable)")
+def format_sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {dumps(data).decode()}\n\n"
 
 
-class TaskDecomposition(BaseModel):
-    tasks: List[Task] = Field(
-        description="List of decomposed tasks that make up the job profile",
-        min_length=3,
-        max_length=20)
+def profile_fingerprint(profile: UserProfile, scoring_mode: str) -> str:
+    return fingerprint(profile.model_dump(include=FINGERPRINT_FIELDS),
+                       PIPELINE_VERSION, scoring_mode, NARRATIVE_START)
 
 
-class SkillDecomposition(BaseModel):
-    skills: List[Skill] = Field(
-        description="List of decomposed skills that make up the job profile",
-        min_length=3,
-        max_length=15)
+async def lookup_cached_result(
+        profile: UserProfile, scoring_mode: ScoringMode,
+        bypass: Optional[str]) -> tuple[Optional[str], Optional[dict], str]:
+    """
+    Returns (cache key, cached payload, X-Cache status) for a request.
+    A None key means the result must not be stored.
+    """
+    if result_cache is None:
+        return None, None, "DISABLED"
+    # Compare mode is a diagnostic run and always hits the models.
+    if scoring_mode == "compare":
+        return None, None, "BYPASS"
+    key = profile_fingerprint(profile, scoring_mode)
+    if bypass and bypass.lower() not in ("0", "false", "no"):
+        result_cache.record_bypass()
+        return key, None, "BYPASS"
+    cached = await result_cache.get(key)
+    if cached is not None:
+        return key, cached, "HIT"
+    if semantic_cache is not None:
+        [similar_key] = await semantic_cache.lookup(
+            f"result:{scoring_mode}", [profile_semantic_text(profile)],
+            SEMANTIC_CACHE_RESULT_THRESHOLD)
+        if similar_key is not None:
+            cached = await result_cache.get(similar_key)
+            if cached is not None:
+                return key, cached, "SEMANTIC"
+    return key, None, "MISS"
+
+
+def profile_semantic_text(profile: UserProfile) -> str:
+    return "\n".join(f"{field}: {normalize_text(getattr(profile, field))}"
+                     for field in sorted(FINGERPRINT_FIELDS))
+
+
+async def store_cached_result(key: Optional[str], result: dict,
+                              profile: UserProfile,
+                              scoring_mode: ScoringMode) -> None:
+    # A degraded result is missing stages a retry would likely produce.
+    if result_cache is not None and key is not None and not result.get(
+            "degraded"):
+        # Timings describe one particular run, not the analysis.
+        await result_cache.set(
+            key,
+            to_jsonable({
+                name: value
+                for name, value in result.items() if name != "timings"
+            }))
+        # Near-duplicate profiles find the exact entry through its key.
+        if semantic_cache is not None:
+            await semantic_cache.store(f"result:{scoring_mode}",
+                                       [profile_semantic_text(profile)],
+                                       [key])
+
+
+def analysis_flight_key(profile: UserProfile, scoring_mode: ScoringMode,
+                        timings: bool) -> str:
+    return f"{profile_fingerprint(profile, scoring_mode)}:{int(timings)}"
+
+
+def analyze_and_store(
+        profile: UserProfile, scoring_mode: ScoringMode, key: Optional[str],
+        timings: bool) -> Callable[[EventEmitter], Awaitable[dict]]:
+    """
+    The run behind an analysis flight: the pipeline, then the cache and
+    history writes, done once for every request attached to it.
+    """
 
+    async def run(emit: EventEmitter) -> dict:
+        result = await run_analysis(profile, emit, scoring_mode, timings)
+        await store_cached_result(key, result, profile, scoring_mode)
+        if analysis_history is not None:
+            await analysis_history.record(profile, scoring_mode, result)
+        return result
 
-class FutureScenario(BaseModel):
-    title: str = Field(description="Title of the scenario")
-    description: str = Field(
-        description="Description of how the job role evolves in this scenario")
-    likelihood: Literal["low", "medium", "high"] = Field(
-        description="Estimated likelihood: Low, Medium, High")
+    return run
 
 
-class FutureScenarios(BaseModel):
-    scenarios: List[FutureScenario] = Field(
-        description="List of 1 to 5 different future scenarios",
-        min_length=1,
-        max_length=5)
+def flight_outcome(flight: Flight) -> tuple[str, Any]:
+    """
+    Final SSE event of a finished analysis flight: the result, or an error
+    carrying the same detail as /analyze.
+    """
+    try:
+        return "result", to_jsonable(flight.task.result())
+    except HTTPException as e:
+        return "error", {"status_code": e.status_code, "detail": e.detail}
+    except Exception as e:
+        print(f"⚠️ Streaming analysis failed. Error: {e}")
+        traceback.print_exception(e)
+        return "error", {
+            "status_code": 500,
+            "detail": "Internal Server Error"
+        }
 
 
-# --- New Models for Two-Step Process ---
-class CareerOptionInitial(BaseModel):
-    job_title: str = Field(
-        description="Title of the recommended alternative career")
-    reason: str = Field(description="Explanation of why this is a good fit")
-    transferable_skills: List[str] = Field(
-        description=
-        "List of skills the user already possesses that are relevant")
-    new_skills_needed: List[str] = Field(
-        description="List of new skills the user needs to acquire")
-    ease_of_transition: Literal["Low", "Medium", "High"] = Field(
-        description="Estimated difficulty of transitioning to this role")
+async def _cache_snapshot(cache: Optional[ResultCache]) -> Optional[dict]:
+    if cache is None:
+        return None
+    # This worker's counters, plus those of all workers on a shared backend.
+    return {**cache.snapshot(), "all_workers": await cache.shared_snapshot()}
 
 
-class CareerRecommendationsInitial(BaseModel):
-    recommendations: List[CareerOptionInitial] = Field(
-        description="List of 3 to 5 recommended career options",
-        min_length=3,
-        max_length=5)
+@app.get("/cache/stats")
+async def cache_stats():
+    return {
+        "results":
+        await _cache_snapshot(result_cache),
+        "item_scores":
+        await _cache_snapshot(item_score_cache),
+        "semantic":
+        semantic_cache.snapshot() if semantic_cache is not None else None
+    }
 
 
-# ---------------------------------------
+def _cache_stats() -> dict:
+    return {
+        (name, stat): cache.stats[stat]
+        for name, cache in (("results", result_cache), ("item_scores",
+                                                        item_score_cache))
+        if cache is not None for stat in ("hits", "misses", "bypasses",
+                                           "errors")
+    }
 
-llm = ChatOpenAI(model="gpt-5.1",
-                 # temperature=1
-                 )
 
+register(
+    CallbackMetric("cache_requests_total", "Cache lookups by outcome",
+                   ("cache", "outcome"),
+                   _cache_stats,
+                   kind="counter"))
+register(
+    CallbackMetric(
+        "llm_scheduler_calls", "LLM calls active or waiting in the scheduler",
+        ("state", ), lambda: {
+            ("active", ): llm_scheduler.active,
+            ("queued", ): llm_scheduler.queued
+        }))
 
-async def evaluate_automation_potential(item: Union[Task, Skill],
-                                        job_context: str, item_type: str,
-                                        semaphore: asyncio.Semaphore) -> float:
+
+register(
+    CallbackMetric(
+        "worker_warmup_seconds",
+        "Time this worker took to build its model clients and agent graphs",
+        (), lambda: {(): startup["warmup_seconds"]}
+        if startup["warmup_seconds"] is not None else {}))
+
+
+@app.get("/health")
+async def health():
     """
-    Generic function to evaluate automation potential for either a Task or a Skill.
+    Liveness: the worker's event loop is answering.
     """
-    async with semaphore:
-        llm_evaluator = ChatOpenAI(model="gpt-5.1",
-                                   reasoning={"effort": "high"})
-        structured_llm = llm_evaluator.with_structured_output(AutomationScore)
-
-        if item_type == "task":
-            system_prompt = TASKS_REPLACABILITY_SYSTEM_PROMPT
-            user_prompt = f"""
-            Job Context: {job_context}
-            
-            Task to Analyze:
-            Name: {item.task_name}
-            Time Share: {item.time_share}
-            
-            Judge the automation potential of this specific task by AI in the future.
-            """
-        else:  # skill
-            system_prompt = SKILLS_REPLACABILITY_SYSTEM_PROMPT
-            user_prompt = f"""
-            Job Context: {job_context}
-            
-            Skill to Analyze:
-            Name: {item.skill_name}
-            Importance: {item.importance}
-            
-            Judge the automation potential of this specific skill by AI in the future.
-            """
-
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=user_prompt)
-        ]
-
-        analysis = await structured_llm.ainvoke(
-            messages,
-            config={
-                "run_name": f"{item_type.capitalize()}AutomationEvaluator"
-            })
-        return analysis.score
+    return {"status": "ok"}
 
 
-@app.post("/analyze")
-async def analyze_profile(profile: UserProfile):
-    print("\n=== INCOMING REQUEST PROFILE ===")
-    print(profile.model_dump_json(indent=2))
-    print("================================\n")
+@app.get("/ready")
+async def ready():
+    """
+    Readiness: 200 once this worker has built its model clients and agent
+    graphs, 503 while it is warming up, failed to or is shutting down.
+    """
+    if startup["status"] != "ready":
+        return JSONResponse(status_code=503,
+                            headers={"Retry-After": "1"},
+                            content={
+                                "status": startup["status"],
+                                "error": startup["error"]
+                            })
+    return {"status": "ready", "warmup_seconds": startup["warmup_seconds"]}
+
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus text exposition of this worker's stage timings, token usage,
+    scheduler and cache counters.
+    """
+    return PlainTextResponse(render_metrics(),
+                             media_type="text/plain; version=0.0.4")
 
-    job_context = f"""Age: {profile.age}
-Gender: {profile.gender}
-Job Title: {profile.job_title}
-Job Description: {profile.job_description}
-Daily Routine: {profile.daily_routine}
-Location: {profile.location}
-Education: {profile.education}"""
-
-    # 1. Decomposition Agents (Parallel)
-    agent_tasks = create_agent(
-        llm,
-        response_format=ProviderStrategy(TaskDecomposition),
-        tools=[{
-            "type": "web_search_preview"
-        }])
-
-    agent_skills = create_agent(
-        llm,
-        response_format=ProviderStrategy(SkillDecomposition),
-        tools=[{
-            "type": "web_search_preview"
-        }])
-
-    task_future = agent_tasks.ainvoke(
-        {
-            "messages": [
-                SystemMessage(content=TASKS_DECOMPOSITION_SYSTEM_PROMPT),
-                HumanMessage(content=f"User Profile:\n{job_context}")
-            ]
-        },
-        config={"run_name": "TaskDecompositionAgent"})
-
-    skill_future = agent_skills.ainvoke(
-        {
-            "messages": [
-                SystemMessage(content=SKILLS_DECOMPOSITION_SYSTEM_PROMPT),
-                HumanMessage(content=f"User Profile:\n{job_context}")
-            ]
-        },
-        config={"run_name": "SkillDecompositionAgent"})
 
-    try:
-        result_tasks, result_skills = await asyncio.gather(
-            task_future, skill_future)
-
-        tasks: List[Task] = result_tasks["structured_response"].tasks
-        skills: List[Skill] = result_skills["structured_response"].skills
-    except (ValidationError, Exception) as e:
-        print(f"⚠️ Input validation failed (likely invalid/short content). Error: {e}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(
-            status_code=400,
-            detail={
-                "error_code":
-                "INVALID_INPUT_CONTENT",
-                "message":
-                "Could not extract meaningful tasks or skills from the provided input. Please ensure the job description and routine are detailed and relevant."
-            })
+@app.post("/analyze")
+async def analyze_profile(profile: UserProfile,
+                          request: Request,
+                          scoring_mode: Optional[ScoringMode] = None,
+                          timings: bool = False,
+                          x_cache_bypass: Optional[str] = Header(None)):
+    log_incoming_profile(profile)
+    scoring_mode = scoring_mode or SCORING_MODE
+    key, cached, cache_status = await lookup_cached_result(
+        profile, scoring_mode, x_cache_bypass)
+    accept_encoding = request.headers.get("accept-encoding", "")
+    if cached is not None:
+        return FastJSONResponse(cached,
+                                headers={"X-Cache": cache_status},
+                                accept_encoding=accept_encoding)
+
+    async with profile_flights.attach(
+            analysis_flight_key(profile, scoring_mode, timings),
+            analyze_and_store(profile, scoring_mode, key, timings),
+            llm_scheduler.admit) as (flight, leader):
+        result = await flight.result()
+    return FastJSONResponse(
+        result,
+        headers={"X-Cache": cache_status if leader else "COALESCED"},
+        accept_encoding=accept_encoding)
+
+
+async def run_analysis_job(request: dict, emit: EventEmitter) -> dict:
+    """
+    Job handler: the /analyze flow (cache included) for a queued request.
+    """
+    profile = UserProfile(**request["profile"])
+    scoring_mode = request["scoring_mode"]
+    key, cached, _ = await lookup_cached_result(profile, scoring_mode, None)
+    if cached is not None:
+        return cached
 
-    # 2. Automation Analysis (Parallel)
-    semaphore = asyncio.Semaphore(50)
+    async with profile_flights.attach(
+            analysis_flight_key(profile, scoring_mode, False),
+            analyze_and_store(profile, scoring_mode, key,
+                              False)) as (flight, _):
+        await flight.forward(emit)
+        return to_jsonable(await flight.result())
 
-    # We gather scores directly instead of creating Analyzed objects
-    task_scores_future = asyncio.gather(*[
-        evaluate_automation_potential(task, job_context, "task", semaphore)
-        for task in tasks
-    ])
 
-    skill_scores_future = asyncio.gather(*[
-        evaluate_automation_potential(skill, job_context, "skill", semaphore)
-        for skill in skills
-    ])
+analysis_jobs = create_jobs_from_env(run_analysis_job)
 
-    task_scores_list, skill_scores_list = await asyncio.gather(
-        task_scores_future, skill_scores_future)
 
-    # 3. Calculate Results
+@app.post("/analyze/jobs", status_code=202)
+async def submit_analysis_job(profile: UserProfile,
+                              scoring_mode: Optional[ScoringMode] = None):
+    """
+    Queues an analysis and returns its job id immediately; poll
+    GET /analyze/jobs/{job_id} for progress and the final payload.
+    """
+    log_incoming_profile(profile)
+    job = await analysis_jobs.submit({
+        "profile": profile.model_dump(),
+        "scoring_mode": scoring_mode or SCORING_MODE
+    })
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "status_url": f"/analyze/jobs/{job['job_id']}"
+    }
 
-    # Tasks
-    task_automation_breakdown = {}
-    total_task_automation = 0.0
 
-    for task, score in zip(tasks, task_scores_list):
-        weighted_val = task.time_share * score
-        task_automation_breakdown[task.task_name] = {
-            "score": score,
-            "weighted_score": weighted_val,
-            "time_share": task.time_share
-        }
-        total_task_automation += weighted_val
-
-    # Skills
-    skill_automation_breakdown = {}
-    total_skill_automation = 0.0
-
-    for skill, score in zip(skills, skill_scores_list):
-        weighted_val = skill.importance * score
-        skill_automation_breakdown[skill.skill_name] = {
-            "score": score,
-            "weighted_score": weighted_val,
-            "importance": skill.importance
-        }
-        total_skill_automation += weighted_val
+@app.get("/analyze/jobs/{job_id}")
+async def get_analysis_job(job_id: str, request: Request):
+    job = await analysis_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404,
+                            detail={
+                                "error_code": "JOB_NOT_FOUND",
+                                "message":
+                                "Unknown or expired analysis job."
+                            })
+    return FastJSONResponse(
+        job, accept_encoding=request.headers.get("accept-encoding", ""))
+
+
+@app.post("/analyze/stream")
+async def analyze_profile_stream(profile: UserProfile,
+                                 scoring_mode: Optional[ScoringMode] = None,
+                                 timings: bool = False,
+                                 x_cache_bypass: Optional[str] = Header(None)):
+    """
+    Same pipeline as /analyze, delivered as Server-Sent Events.
 
-    weighted_final_score = (total_task_automation *
-                            0.4) + (total_skill_automation * 0.6)
+    Events: tasks, skills, score (one per item), aggregate, scenarios,
+    careers and finally result with the full /analyze payload. Failures are
+    reported as an error event carrying the same detail as /analyze.
+    """
+    log_incoming_profile(profile)
+    scoring_mode = scoring_mode or SCORING_MODE
+    key, cached, cache_status = await lookup_cached_result(
+        profile, scoring_mode, x_cache_bypass)
+    if cached is None:
+        flight_key = analysis_flight_key(profile, scoring_mode, timings)
+        flight, leader = profile_flights.join(
+            flight_key, analyze_and_store(profile, scoring_mode, key,
+                                          timings), llm_scheduler.admit)
+        if not leader:
+            cache_status = "COALESCED"
+
+    async def event_stream():
+        if cached is not None:
+            yield format_sse("result", cached)
+            return
+        queue = flight.subscribe()
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(),
+                                                  SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if item is None:
+                    break
+                yield format_sse(*item)
+            yield format_sse(*flight_outcome(flight))
+        finally:
+            # Client went away (or we are done): the run is cancelled once
+            # no other request is attached to it.
+            profile_flights.leave(flight_key, flight)
+
+    return StreamingResponse(event_stream(),
+                             media_type="text/event-stream",
+                             headers={
+                                 "Cache-Control": "no-cache",
+                                 "X-Accel-Buffering": "no",
+                                 "X-Cache": cache_status
+                             })
+
+
+class UploadStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse of an endpoint that still reads the request body while
+    it streams. Starlette's own listens on `receive` for the client's
+    disconnect, which would swallow the body's chunks; the endpoint watches
+    for the disconnect itself once it has read the body.
+    """
 
-    # 4. Generate Future Scenarios & Career Recommendations (Concurrent)
+    async def __call__(self, scope: Scope, receive: Receive,
+                       send: Send) -> None:
+        await self.stream_response(send)
 
-    # Prepare detailed data for generation
-    analysis_summary = {
-        "job_context": job_context,
-        "tasks_analysis": task_automation_breakdown,
-        "skills_analysis": skill_automation_breakdown,
-        "total_automation_score": weighted_final_score
-    }
-    analysis_summary_json = json.dumps(analysis_summary, indent=2)
-
-    # Scenario Agent
-    agent_scenarios = create_agent(
-        llm,
-        response_format=ProviderStrategy(FutureScenarios),
-        tools=[{
-            "type": "web_search_preview"
-        }])
-
-    # Career Recommendation Agent (Initial - No Roadmap)
-    agent_careers_initial = create_agent(
-        llm,
-        response_format=ProviderStrategy(CareerRecommendationsInitial),
-        tools=[{
-            "type": "web_search_preview"
-        }])
-
-    # Launch scenarios and initial careers concurrently
-    scenarios_future = agent_scenarios.ainvoke(
-        {
-            "messages": [
-                SystemMessage(content=SCENARIO_GENERATION_SYSTEM_PROMPT),
-                HumanMessage(
-                    content=f"Full Job Analysis Data:\n{analysis_summary_json}"
-                )
-            ]
-        },
-        config={"run_name": "FutureScenariosAgent"})
-
-    careers_initial_future = agent_careers_initial.ainvoke(
-        {
-            "messages": [
-                SystemMessage(content=CAREER_RECOMMENDATIONS_SYSTEM_PROMPT),
-                HumanMessage(
-                    content=f"Full Job Analysis Data:\n{analysis_summary_json}"
-                )
-            ]
-        },
-        config={"run_name": "CareerRecommendationsAgent"})
-
-    result_scenarios, result_careers_initial = await asyncio.gather(
-        scenarios_future, careers_initial_future)
-
-    initial_recommendations: List[
-        CareerOptionInitial] = result_careers_initial[
-            "structured_response"].recommendations
 
-    return {
-        "task_automation_breakdown": task_automation_breakdown,
-        "total_task_automation": total_task_automation,
-        "skill_automation_breakdown": skill_automation_breakdown,
-        "total_skill_automation": total_skill_automation,
-        "weighted_final_score": weighted_final_score,
-        "future_scenarios": result_scenarios["structured_response"].scenarios,
-        "career_recommendations": initial_recommendations
-    }
+@app.post("/analyze/batch")
+async def analyze_batch(request: Request,
+                        scoring_mode: Literal["per_item",
+                                              "batched"] = "per_item",
+                        narratives: bool = False):
+    """
+    Bulk analysis of a JSONL or CSV body (chosen by Content-Type), one
+    profile per row with optional `id` and `department` columns. Rows
+    without an id are identified by a hash of the body up to them and their
+    position (see iter_upload_rows).
+
+    The body is read as it arrives: rows start while later ones are still
+    uploading. Answers with JSONL: one record per row in completion order,
+    then a `summary` line with counts and rows/sec. Blank lines are
+    keep-alives. Clients resume by resubmitting the rows whose id did not
+    come back ok.
+    """
+    fmt = "csv" if "csv" in request.headers.get("content-type", "") else "jsonl"
+    llm_scheduler.admit()
+    runner = BatchRunner(scoring_mode=scoring_mode,
+                         include_narratives=narratives)
+    queue: asyncio.Queue = asyncio.Queue()
+    body_read = asyncio.Event()
+
+    async def chunks():
+        async for chunk in request.stream():
+            yield chunk
+        body_read.set()
+
+    async def write(record: dict) -> None:
+        if workforce_store is not None:
+            workforce_store.add_record(record)
+        await queue.put(record)
+
+    async def produce() -> None:
+        try:
+            summary = await runner.run(iter_upload_rows(chunks(), fmt), write)
+            if workforce_store is not None:
+                await asyncio.to_thread(workforce_store.save)
+            await queue.put({"summary": summary})
+        except csv.Error as e:
+            await queue.put({
+                "error": {
+                    "status_code": 400,
+                    "detail": f"Malformed batch input: {e}"
+                }
+            })
+        except ClientDisconnect:
+            pass
+        finally:
+            await queue.put(None)
+
+    async def watch_disconnect(producer: asyncio.Task) -> None:
+        await body_read.wait()
+        while (await request.receive())["type"] != "http.disconnect":
+            pass
+        producer.cancel()
+
+    async def record_stream():
+        producer = asyncio.create_task(produce())
+        watcher = asyncio.create_task(watch_disconnect(producer))
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(),
+                                                  SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b"\n"
+                    continue
+                if item is None:
+                    break
+                yield dumps(item) + b"\n"
+        finally:
+            producer.cancel()
+            watcher.cancel()
+
+    return UploadStreamingResponse(record_stream(),
+                                   media_type="application/x-ndjson",
+                                   headers={"X-Accel-Buffering": "no"})
+
+
+def _require_workforce_store() -> WorkforceStore:
+    if workforce_store is None:
+        raise HTTPException(status_code=404,
+                            detail={
+                                "error_code": "ROLLUP_DISABLED",
+                                "message": "The workforce store is disabled."
+                            })
+    return workforce_store
+
+
+@app.post("/rollup/import")
+async def import_rollup_records(request: Request):
+    """
+    Adds batch output records (JSONL, as returned by /analyze/batch or
+    written by batch.py) to the workforce store.
+    """
+    store = _require_workforce_store()
+    body = (await request.body()).decode("utf-8")
+    counts = import_records(store, body.splitlines())
+    await asyncio.to_thread(store.save)
+    return {**counts, "employees": len(store)}
+
+
+@app.get("/rollup")
+async def get_rollup(request: Request,
+                     group_by: Literal["department",
+                                       "job_title"] = "department",
+                     department: Optional[str] = None,
+                     item_type: Literal["task", "skill"] = "task",
+                     top: int = Query(10, ge=1, le=100)):
+    """
+    Workforce rollup over all stored analyses: org-level exposure,
+    distributions and percentile bands per department or job title, and
+    the top at-risk tasks or skills.
+    """
+    store = _require_workforce_store()
+    # Picks up analyses another worker imported.
+    await asyncio.to_thread(store.refresh)
+    result = await asyncio.to_thread(rollup, store, group_by, department,
+                                     item_type, top)
+    return FastJSONResponse(
+        result, accept_encoding=request.headers.get("accept-encoding", ""))
 
 
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, log_level="debug", workers=3)
@@ -0,0 +1,298 @@
+import bisect
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+                   20, 30, 60, 120)
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"
+        ]
+        for key, value in sorted(self.values.items()):
+            lines.append(
+                f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+
+    def __init__(self,
+                 name: str,
+                 help: str,
+                 labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> (bucket counts, sum, count)
+        self.values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labels)
+        entry = self.values.setdefault(key,
+                                       [[0] * len(self.buckets), 0.0, 0])
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            entry[0][index] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} histogram"
+        ]
+        for key, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labels + ("le", ),
+                                        key + (str(bound), ))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels + ("le", ), key + ("+Inf", ))
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class CallbackMetric:
+    """
+    Gauge or counter whose values are read from a callback at scrape time,
+    for state that already lives elsewhere (cache stats, scheduler queue).
+    """
+
+    def __init__(self,
+                 name: str,
+                 help: str,
+                 labels: Tuple[str, ...],
+                 collect: Callable[[], Dict[LabelValues, float]],
+                 kind: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.collect = collect
+        self.kind = kind
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} {self.kind}"
+        ]
+        for key, value in sorted(self.collect().items()):
+            lines.append(
+                f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+
+REGISTRY: List[Any] = []
+
+
+def register(metric: Any) -> Any:
+    REGISTRY.append(metric)
+    return metric
+
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+STAGE_DURATION = register(
+    Histogram("analysis_stage_duration_seconds",
+              "Wall time of one pipeline stage span", ("stage", )))
+LLM_QUEUE_WAIT = register(
+    Histogram("llm_queue_wait_seconds",
+              "Time an LLM call waited for a scheduler slot", ("stage", )))
+LLM_CALLS = register(
+    Counter("llm_calls_total", "LLM calls by stage, model and outcome",
+            ("stage", "model", "outcome")))
+LLM_TOKENS = register(
+    Counter("llm_tokens_total", "Tokens reported by the provider",
+            ("stage", "kind")))
+LLM_RETRIES = register(
+    Counter("llm_retries_total", "Retried LLM calls", ("stage", )))
+SEMANTIC_CACHE_LOOKUPS = register(
+    Counter("semantic_cache_lookups_total",
+            "Semantic cache lookups by namespace and outcome",
+            ("namespace", "outcome")))
+TITLE_INDEX_LOOKUPS = register(
+    Counter("title_index_lookups_total",
+            "Job-title decomposition index lookups", ("outcome", )))
+RESEARCH_CORPUS_LOOKUPS = register(
+    Counter("research_corpus_lookups_total",
+            "Agent runs researching in the local corpus (hit) or with the "
+            "hosted web search (fallback)", ("agent", "outcome")))
+RESEARCH_CORPUS_SEARCHES = register(
+    Counter("research_corpus_searches_total",
+            "Searches of the local research corpus by the agents' tool",
+            ("outcome", )))
+LLM_HEDGES = register(
+    Counter("llm_hedges_total",
+            "Hedged LLM calls: duplicates fired and duplicates that won",
+            ("stage", "outcome")))
+ANALYSIS_DEGRADED = register(
+    Counter("analysis_degraded_total",
+            "Analyses answered without a stage that failed or ran out of time",
+            ("stage", )))
+LLM_CACHED_TOKEN_RATIO = register(
+    Histogram("llm_cached_token_ratio",
+              "Share of an analysis' input tokens served from the "
+              "provider's prompt cache",
+              buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)))
+SCORING_DRAFT_DELTA = register(
+    Histogram("scoring_draft_delta",
+              "Absolute difference between an item's final score and its "
+              "draft score (progressive scoring)", ("item_type", ),
+              buckets=(0.01, 0.025, 0.05, 0.1, 0.15, 0.2, 0.3, 0.5, 1.0)))
+SINGLEFLIGHT_CALLS = register(
+    Counter("singleflight_calls_total",
+            "Coalesced runs: leaders started a run, followers attached to "
+            "one in flight", ("scope", "role")))
+
+# Spans of the analysis running in the current context (None outside one).
+_current_trace: ContextVar[Optional[List[dict]]] = ContextVar(
+    "analysis_trace", default=None)
+
+
+def start_trace() -> List[dict]:
+    """
+    Starts collecting spans for the current analysis. Tasks created
+    afterwards inherit the trace through the context.
+    """
+    trace: List[dict] = []
+    _current_trace.set(trace)
+    return trace
+
+
+@contextmanager
+def span(stage: str, **attributes: Any) -> Iterator[dict]:
+    """
+    Times one stage. The yielded record can be enriched by the caller
+    (tokens, model, cache status, retries, queue wait) and ends up in the
+    stage histograms and, if a trace is active, in the request's timings.
+    """
+    record = {"stage": stage, **attributes}
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException:
+        record["error"] = True
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        record["duration_ms"] = round(duration * 1000, 3)
+        STAGE_DURATION.observe(duration, stage=stage)
+        if "model" in record:
+            LLM_CALLS.inc(stage=stage,
+                          model=record["model"],
+                          outcome="error" if record.get("error") else "ok")
+        for kind in ("input", "output", "cached"):
+            if record.get(f"{kind}_tokens"):
+                LLM_TOKENS.inc(record[f"{kind}_tokens"],
+                               stage=stage,
+                               kind=kind)
+        if record.get("retries"):
+            LLM_RETRIES.inc(record["retries"], stage=stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.append(record)
+
+
+def record_usage(record: dict, messages: List[Any]) -> None:
+    """
+    Adds the token usage and model reported on AI messages to a span record.
+    """
+    for message in messages:
+        usage = getattr(message, "usage_metadata", None)
+        if not usage:
+            continue
+        record["input_tokens"] = record.get("input_tokens",
+                                            0) + usage.get("input_tokens", 0)
+        record["output_tokens"] = record.get(
+            "output_tokens", 0) + usage.get("output_tokens", 0)
+        cached = (usage.get("input_token_details") or {}).get("cache_read", 0)
+        record["cached_tokens"] = record.get("cached_tokens", 0) + cached
+        model = (getattr(message, "response_metadata", None)
+                 or {}).get("model_name")
+        if model:
+            record["model"] = model
+
+
+def cached_token_ratio(records: List[dict]) -> Optional[float]:
+    """
+    Cached share of the input tokens reported on the given span records, or
+    None if they report no input tokens.
+    """
+    input_tokens = sum(record.get("input_tokens", 0) for record in records)
+    if not input_tokens:
+        return None
+    cached = sum(record.get("cached_tokens", 0) for record in records)
+    return round(cached / input_tokens, 4)
+
+
+def summarize_trace(trace: List[dict], total_seconds: float) -> dict:
+    """
+    The optional `timings` block of an analysis response.
+    """
+    stages: Dict[str, dict] = {}
+    for record in trace:
+        stage = stages.setdefault(record["stage"], {
+            "spans": 0,
+            "total_ms": 0.0,
+            "max_ms": 0.0,
+            "queue_wait_ms": 0.0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "cached_tokens": 0,
+            "retries": 0,
+            "cache_hits": 0
+        })
+        stage["spans"] += 1
+        stage["total_ms"] += record["duration_ms"]
+        stage["max_ms"] = max(stage["max_ms"], record["duration_ms"])
+        stage["queue_wait_ms"] += record.get("queue_wait_ms", 0.0)
+        for key in ("input_tokens", "output_tokens", "cached_tokens",
+                    "retries"):
+            stage[key] += record.get(key, 0)
+        stage["cache_hits"] += record.get("cache_hits",
+                                          record.get("cache") == "hit")
+    for stage in stages.values():
+        stage["total_ms"] = round(stage["total_ms"], 3)
+        stage["queue_wait_ms"] = round(stage["queue_wait_ms"], 3)
+        stage["cached_token_ratio"] = cached_token_ratio([stage])
+    return {
+        "total_ms": round(total_seconds * 1000, 3),
+        "cached_token_ratio": cached_token_ratio(trace),
+        "stages": stages,
+        "spans": trace
+    }
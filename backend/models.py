@@ -0,0 +1,141 @@
+from typing import List, Literal
+from pydantic import BaseModel, Field
+
+
+class UserProfile(BaseModel):
+    age: str
+    gender: str
+    job_title: str
+    job_description: str
+    daily_routine: str
+    location: str
+    education: str
+
+    model_config = {
+        "json_schema_extra": {
+            "examples": [{
+                "age":
+                "25 rokov",
+                "gender":
+                "muz",
+                "job_title":
+                "psycholog",
+                "job_description":
+                "Pomaham klientom s ich mentalnym stavom na zaklade medziludskej komunikacie.",
+                "daily_routine":
+                "Skoro rano pridem do prace, citam si diar, pride klient, s ktorym prekonzultujem ich problemy, zanalyzujem ich situaciu, pinpointujem nihc zivotne problemy a postupne casom sa snazim ezlepsit ich mentalny stav",
+                "location":
+                "kancelaria v Kosiciach",
+                "education":
+                "univerzita komenskeho v Bratislave, psychologia"
+            }]
+        }
+    }
+
+
+# Renamed models for clarity
+class Task(BaseModel):
+    task_name: str = Field(
+        description="Name of the specific task performed in the job")
+    time_share: float = Field(
+        description=
+        "Fraction of total work time spent on this task (must verify all tasks sum to 1.0)"
+    )
+
+
+class Skill(BaseModel):
+    skill_name: str = Field(
+        description="Name of the specific skill required for the job")
+    importance: float = Field(
+        description=
+        "Importance weight of this skill (must verify all skills sum to 1.0)")
+
+
+class AutomationScore(BaseModel):
+    score: float = Field(
+        description="Automation score 0.0-1.0 (1.0 being fully automatable)")
+
+
+class ItemAutomationScore(BaseModel):
+    name: str = Field(
+        description="Exact name of the task or skill, copied from the input")
+    score: float = Field(
+        description="Automation score 0.0-1.0 (1.0 being fully automatable)")
+
+
+class BatchAutomationScores(BaseModel):
+    scores: List[ItemAutomationScore] = Field(
+        description="One automation score per task or skill in the input")
+
+
+class TaskDecomposition(BaseModel):
+    tasks: List[Task] = Field(
+        description="List of decomposed tasks that make up the job profile",
+        min_length=3,
+        max_length=20)
+
+
+class SkillDecomposition(BaseModel):
+    skills: List[Skill] = Field(
+        description="List of decomposed skills that make up the job profile",
+        min_length=3,
+        max_length=15)
+
+
+class FutureScenario(BaseModel):
+    title: str = Field(description="Title of the scenario")
+    description: str = Field(
+        description="Description of how the job role evolves in this scenario")
+    likelihood: Literal["low", "medium", "high"] = Field(
+        description="Estimated likelihood: Low, Medium, High")
+
+
+class FutureScenarios(BaseModel):
+    scenarios: List[FutureScenario] = Field(
+        description="List of 1 to 5 different future scenarios",
+        min_length=1,
+        max_length=5)
+
+
+# --- New Models for Two-Step Process ---
+class CareerOptionInitial(BaseModel):
+    job_title: str = Field(
+        description="Title of the recommended alternative career")
+    reason: str = Field(description="Explanation of why this is a good fit")
+    transferable_skills: List[str] = Field(
+        description=
+        "List of skills the user already possesses that are relevant")
+    new_skills_needed: List[str] = Field(
+        description="List of new skills the user needs to acquire")
+    ease_of_transition: Literal["Low", "Medium", "High"] = Field(
+        description="Estimated difficulty of transitioning to this role")
+
+
+class CareerRecommendationsInitial(BaseModel):
+    recommendations: List[CareerOptionInitial] = Field(
+        description="List of 3 to 5 recommended career options",
+        min_length=3,
+        max_length=5)
+
+
+class OccupationResearch(BaseModel):
+    overview: str = Field(
+        description="What the occupation is, where and by whom it is practised")
+    typical_tasks: List[str] = Field(
+        description="Main tasks people in this occupation perform",
+        min_length=3,
+        max_length=20)
+    key_skills: List[str] = Field(
+        description="Hard and soft skills the occupation requires",
+        min_length=3,
+        max_length=15)
+    automation_outlook: str = Field(
+        description=
+        "Current evidence and trends on how AI and automation affect the occupation"
+    )
+    career_paths: str = Field(
+        description=
+        "Occupations people commonly move to from this one, and growing fields that value its skills"
+    )
+    sources: List[str] = Field(
+        description="URLs or names of the sources used", max_length=10)
@@ -0,0 +1,1307 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import (Any, AsyncIterator, Awaitable, Callable, List, Optional,
+                    Set, Union, Literal)
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from pydantic import ValidationError
+from langchain_core.messages import SystemMessage, HumanMessage, BaseMessage
+from prompts import (
+    TASKS_DECOMPOSITION_SYSTEM_PROMPT, SKILLS_DECOMPOSITION_SYSTEM_PROMPT,
+    TASKS_REPLACABILITY_SYSTEM_PROMPT, SKILLS_REPLACABILITY_SYSTEM_PROMPT,
+    TASKS_BATCH_REPLACABILITY_SYSTEM_PROMPT,
+    SKILLS_BATCH_REPLACABILITY_SYSTEM_PROMPT,
+    SCENARIO_GENERATION_SYSTEM_PROMPT, CAREER_RECOMMENDATIONS_SYSTEM_PROMPT,
+    TASKS_ADAPTATION_SYSTEM_PROMPT, SKILLS_ADAPTATION_SYSTEM_PROMPT)
+from models import (UserProfile, Task, Skill, FutureScenario,
+                    CareerOptionInitial)
+from clients import (ADAPTER_SCHEMAS, LLM_MODEL, SCORING_LOW_MODEL,
+                     SCORING_LOW_REASONING_EFFORT, SCORING_TIERS,
+                     aget_registry)
+from scheduler import (SchedulerOverloaded, create_scheduler_from_env,
+                       estimate_tokens)
+from singleflight import SingleFlight
+from resilience import LLMUnavailable, resilient_call, start_deadline
+from metrics import (ANALYSIS_DEGRADED, LLM_CACHED_TOKEN_RATIO,
+                     LLM_QUEUE_WAIT, RESEARCH_CORPUS_LOOKUPS,
+                     SCORING_DRAFT_DELTA, TITLE_INDEX_LOOKUPS,
+                     cached_token_ratio, record_usage, span, start_trace,
+                     summarize_trace)
+from cache import (create_item_score_cache_from_env, item_score_key,
+                   normalize_text)
+from title_index import TITLE_INDEX_MODE, load_title_index_from_env
+from research_corpus import get_research_corpus
+from semantic_cache import (SEMANTIC_CACHE_DECOMPOSITION_THRESHOLD,
+                            SEMANTIC_CACHE_ITEM_THRESHOLD,
+                            create_semantic_cache_from_env)
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "per_item": one scoring call per task/skill.
+# "batched": all tasks (and all skills) of a profile scored in chunked calls.
+# "compare": runs both, answers with per_item scores and reports agreement.
+# "progressive": a low-tier batched pass first streams draft scores, which
+# the per_item scores then replace as they land.
+ScoringMode = Literal["per_item", "batched", "compare", "progressive"]
+
+SCORING_MODE: ScoringMode = os.getenv("SCORING_MODE", "per_item")
+SCORING_BATCH_SIZE = int(os.getenv("SCORING_BATCH_SIZE", "20"))
+
+# "final": scenarios and careers are generated from the scored analysis.
+# "preliminary": they start right after decomposition, from tasks/skills and
+# their weights only, overlapping with scoring.
+NARRATIVE_START = os.getenv("NARRATIVE_START", "final")
+
+# Message layout of the scoring prompts (see build_scoring_prefix); part of
+# every scoring version, so changing it invalidates memoized scores.
+SCORING_PROMPT_LAYOUT = "prefix-v1"
+
+# "high": the scoring model at high reasoning effort. "low": the cheaper
+# SCORING_LOW_MODEL / SCORING_LOW_REASONING_EFFORT (see clients.py).
+ScoringTier = Literal["low", "high"]
+# Where the score of an item whose own scoring failed came from: the other
+# tier, or its draft score in progressive mode.
+ScoringFallback = Literal["low", "high", "draft"]
+
+# The lightest items of a list are scored on the low tier as long as their
+# weights times SCORING_TIER_UNCERTAINTY (the assumed worst-case error of a
+# low-tier score) add up to at most SCORING_TIER_TOLERANCE, which bounds the
+# resulting shift of the final score. A tolerance of 0 disables the low tier.
+SCORING_TIER_TOLERANCE = float(os.getenv("SCORING_TIER_TOLERANCE", "0.03"))
+SCORING_TIER_UNCERTAINTY = float(
+    os.getenv("SCORING_TIER_UNCERTAINTY", "0.2"))
+
+# Identifies everything besides the profile that shapes an analysis, so that
+# cached results are invalidated whenever a prompt or the model changes.
+PIPELINE_VERSION = hashlib.sha256("\n".join([
+    LLM_MODEL, TASKS_DECOMPOSITION_SYSTEM_PROMPT,
+    SKILLS_DECOMPOSITION_SYSTEM_PROMPT, TASKS_REPLACABILITY_SYSTEM_PROMPT,
+    SKILLS_REPLACABILITY_SYSTEM_PROMPT, SCORING_PROMPT_LAYOUT,
+    SCORING_LOW_MODEL, SCORING_LOW_REASONING_EFFORT,
+    str(SCORING_TIER_TOLERANCE), str(SCORING_TIER_UNCERTAINTY),
+    TASKS_BATCH_REPLACABILITY_SYSTEM_PROMPT,
+    SKILLS_BATCH_REPLACABILITY_SYSTEM_PROMPT,
+    SCENARIO_GENERATION_SYSTEM_PROMPT, CAREER_RECOMMENDATIONS_SYSTEM_PROMPT,
+    TASKS_ADAPTATION_SYSTEM_PROMPT, SKILLS_ADAPTATION_SYSTEM_PROMPT,
+    TITLE_INDEX_MODE
+]).encode("utf-8")).hexdigest()[:12]
+
+
+def _prompt_version(*parts: str) -> str:
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()[:12]
+
+
+# System prompt of every scoring path and item type.
+SCORING_SYSTEM_PROMPTS = {
+    ("per_item", "task"): TASKS_REPLACABILITY_SYSTEM_PROMPT,
+    ("per_item", "skill"): SKILLS_REPLACABILITY_SYSTEM_PROMPT,
+    ("batched", "task"): TASKS_BATCH_REPLACABILITY_SYSTEM_PROMPT,
+    ("batched", "skill"): SKILLS_BATCH_REPLACABILITY_SYSTEM_PROMPT,
+}
+
+# Versions of everything that shapes a single item score, per scoring path,
+# item type and tier.
+SCORING_PROMPT_VERSIONS = {
+    (path, item_type, tier):
+    _prompt_version(model, effort, SCORING_PROMPT_LAYOUT, system_prompt)
+    for (path, item_type), system_prompt in SCORING_SYSTEM_PROMPTS.items()
+    for tier, (model, effort) in SCORING_TIERS.items()
+}
+
+# Versions of each stage's own inputs, recorded with every stored analysis
+# so a re-score only recomputes the stages that changed (see history.py).
+DECOMPOSITION_VERSION = _prompt_version(LLM_MODEL,
+                                        TASKS_DECOMPOSITION_SYSTEM_PROMPT,
+                                        SKILLS_DECOMPOSITION_SYSTEM_PROMPT,
+                                        TASKS_ADAPTATION_SYSTEM_PROMPT,
+                                        SKILLS_ADAPTATION_SYSTEM_PROMPT,
+                                        TITLE_INDEX_MODE)
+NARRATIVES_VERSION = _prompt_version(LLM_MODEL,
+                                     SCENARIO_GENERATION_SYSTEM_PROMPT,
+                                     CAREER_RECOMMENDATIONS_SYSTEM_PROMPT,
+                                     NARRATIVE_START)
+
+# The stage whose output each stage consumes: when it is recomputed, so is
+# everything downstream of it.
+STAGE_INPUTS = {
+    "decomposition": None,
+    "scoring": "decomposition",
+    "narratives":
+    "scoring" if NARRATIVE_START == "final" else "decomposition",
+}
+
+
+def scoring_version(scoring_mode: ScoringMode) -> str:
+    paths = (["per_item", "batched"] if scoring_mode
+             in ("compare", "progressive") else [scoring_mode])
+    parts = [
+        version for (path, _, _), version in sorted(
+            SCORING_PROMPT_VERSIONS.items()) if path in paths
+    ]
+    if "batched" in paths:
+        parts.append(str(SCORING_BATCH_SIZE))
+    return _prompt_version(scoring_mode, str(SCORING_TIER_TOLERANCE),
+                           str(SCORING_TIER_UNCERTAINTY), *parts)
+
+
+def stage_versions(scoring_mode: ScoringMode,
+                   narratives: bool = True) -> dict:
+    """
+    Current version of every stage an analysis in `scoring_mode` runs.
+    """
+    versions = {
+        "decomposition": DECOMPOSITION_VERSION,
+        "scoring": scoring_version(scoring_mode)
+    }
+    if narratives:
+        versions["narratives"] = NARRATIVES_VERSION
+    return versions
+
+
+def stale_stages(versions: dict, current: dict) -> List[str]:
+    """
+    Stages of `current` whose recorded version differs, plus the stages
+    downstream of them, in pipeline order.
+    """
+    stale: List[str] = []
+    for stage, version in current.items():
+        if versions.get(stage) != version or STAGE_INPUTS[stage] in stale:
+            stale.append(stage)
+    return stale
+
+
+# Expected completion (incl. reasoning) tokens per call, used to charge the
+# tokens/min budget before the real usage is known.
+SCORING_OUTPUT_TOKEN_ESTIMATE = int(
+    os.getenv("SCORING_OUTPUT_TOKEN_ESTIMATE", "2000"))
+AGENT_OUTPUT_TOKEN_ESTIMATE = int(
+    os.getenv("AGENT_OUTPUT_TOKEN_ESTIMATE", "4000"))
+ADAPTER_OUTPUT_TOKEN_ESTIMATE = int(
+    os.getenv("ADAPTER_OUTPUT_TOKEN_ESTIMATE", "1500"))
+
+llm_scheduler = create_scheduler_from_env()
+item_flights = SingleFlight("item_score")
+item_score_cache = create_item_score_cache_from_env()
+title_index = load_title_index_from_env()
+research_corpus = get_research_corpus()
+semantic_cache = create_semantic_cache_from_env()
+
+# System prompt of the adapter for each indexed decomposition.
+ADAPTATION_PROMPTS = {
+    "tasks": TASKS_ADAPTATION_SYSTEM_PROMPT,
+    "skills": SKILLS_ADAPTATION_SYSTEM_PROMPT,
+}
+
+
+async def call_llm(runnable: Any, input: Any, run_name: str, priority: float,
+                   estimated_tokens: int, record: dict) -> Any:
+    """
+    Runs one model call through the global LLM scheduler, recording the time
+    spent waiting for a slot on the caller's span. Retries, hedging and
+    deadlines are applied per stage by resilient_call.
+    """
+
+    @asynccontextmanager
+    async def slot() -> AsyncIterator[None]:
+        queued_at = time.perf_counter()
+        async with llm_scheduler.slot(priority, estimated_tokens):
+            queue_wait = time.perf_counter() - queued_at
+            record["queue_wait_ms"] = round(queue_wait * 1000, 3)
+            LLM_QUEUE_WAIT.observe(queue_wait, stage=record["stage"])
+            yield
+
+    async def attempt() -> Any:
+        return await runnable.ainvoke(input, config={"run_name": run_name})
+
+    return await resilient_call(record["stage"], attempt, record, slot)
+
+
+async def invoke_scorer(path: str,
+                        messages: List[BaseMessage],
+                        run_name: str,
+                        priority: float,
+                        estimated_tokens: int,
+                        record: dict,
+                        tier: ScoringTier = "high") -> Any:
+    """
+    Calls a structured-output scorer of the given tier and returns the
+    parsed score object.
+    """
+    registry = await aget_registry()
+    scorers = registry.scorers if tier == "high" else registry.low_scorers
+    record["model"] = SCORING_TIERS[tier][0]
+    return await invoke_structured(scorers[path], messages, run_name,
+                                   priority, estimated_tokens, record)
+
+
+async def invoke_structured(runnable: Any, messages: List[BaseMessage],
+                            run_name: str, priority: float,
+                            estimated_tokens: int, record: dict) -> Any:
+    """
+    Calls a structured-output runnable (include_raw=True) and returns the
+    parsed object.
+    """
+    record.setdefault("model", LLM_MODEL)
+    output = await call_llm(runnable, messages, run_name, priority,
+                            estimated_tokens, record)
+    record_usage(record, [output["raw"]])
+    if output["parsed"] is None:
+        raise output["parsing_error"] or ValueError(
+            f"{run_name} returned no parsable output")
+    return output["parsed"]
+
+
+def get_item_name(item: Union[Task, Skill]) -> str:
+    return item.task_name if isinstance(item, Task) else item.skill_name
+
+
+def get_item_weight(item: Union[Task, Skill]) -> float:
+    return item.time_share if isinstance(item, Task) else item.importance
+
+
+def assign_scoring_tiers(
+        items: List[Union[Task, Skill]]) -> List[ScoringTier]:
+    """
+    Scoring tier of every item of one decomposition list: lightest first,
+    items go to the low tier while the weighted score of the list could
+    move by at most SCORING_TIER_TOLERANCE; the rest stay on the high tier.
+    """
+    tiers: List[ScoringTier] = ["high"] * len(items)
+    budget = SCORING_TIER_TOLERANCE
+    for i in sorted(range(len(items)),
+                    key=lambda i: get_item_weight(items[i])):
+        shift = get_item_weight(items[i]) * SCORING_TIER_UNCERTAINTY
+        if shift > budget:
+            break
+        budget -= shift
+        tiers[i] = "low"
+    return tiers
+
+
+def item_cache_key(item: Union[Task, Skill],
+                   item_type: str,
+                   job_title: Optional[str],
+                   scoring_path: str,
+                   tier: ScoringTier = "high") -> Optional[str]:
+    if item_score_cache is None or job_title is None:
+        return None
+    return item_score_key(
+        item_type, get_item_name(item), job_title,
+        SCORING_PROMPT_VERSIONS[(scoring_path, item_type, tier)])
+
+
+async def get_cached_item_score(key: Optional[str]) -> Optional[float]:
+    if key is None:
+        return None
+    entry = await item_score_cache.get(key)
+    return None if entry is None else entry["score"]
+
+
+async def store_item_score(key: Optional[str],
+                           score: float,
+                           item: Union[Task, Skill],
+                           job_title: str,
+                           scoring_path: str,
+                           tier: ScoringTier = "high") -> None:
+    if key is None:
+        return
+    model, reasoning_effort = SCORING_TIERS[tier]
+    await item_score_cache.set(
+        key, {
+            "score": score,
+            "provenance": {
+                "item_name": get_item_name(item),
+                "job_title": job_title,
+                "scoring_path": scoring_path,
+                "tier": tier,
+                "model": model,
+                "reasoning_effort": reasoning_effort,
+                "created_at": time.time()
+            }
+        })
+
+
+def _item_semantic_text(item: Union[Task, Skill], item_type: str,
+                        job_title: str) -> str:
+    return (f"{item_type}: {normalize_text(get_item_name(item))} | "
+            f"job title: {normalize_text(job_title)}")
+
+
+async def get_similar_item_scores(
+        items: List[Union[Task, Skill]],
+        item_type: str,
+        job_title: Optional[str],
+        scoring_path: str,
+        tier: ScoringTier = "high") -> List[Optional[float]]:
+    """
+    Scores of near-duplicate items (same rules as the item score cache:
+    only when a job title is given), None where there is no close match.
+    """
+    if semantic_cache is None or job_title is None:
+        return [None] * len(items)
+    return await semantic_cache.lookup(
+        f"{scoring_path}:{item_type}:{tier}",
+        [_item_semantic_text(item, item_type, job_title) for item in items],
+        SEMANTIC_CACHE_ITEM_THRESHOLD)
+
+
+async def prefetch_item_embeddings(items: List[Union[Task, Skill]],
+                                   item_type: str,
+                                   job_title: Optional[str]) -> None:
+    """
+    Embeds all items of a list in one request, so the per-item semantic
+    lookups that follow are served from the embedding memo.
+    """
+    if semantic_cache is None or job_title is None:
+        return
+    try:
+        await semantic_cache.embed([
+            _item_semantic_text(item, item_type, job_title) for item in items
+        ])
+    except Exception as e:
+        print(f"⚠️ Semantic cache prefetch failed: {e}")
+
+
+async def store_similar_item_scores(items: List[Union[Task, Skill]],
+                                    scores: List[float],
+                                    item_type: str,
+                                    job_title: Optional[str],
+                                    scoring_path: str,
+                                    tier: ScoringTier = "high") -> None:
+    if semantic_cache is None or job_title is None:
+        return
+    await semantic_cache.store(
+        f"{scoring_path}:{item_type}:{tier}",
+        [_item_semantic_text(item, item_type, job_title) for item in items],
+        scores)
+
+
+def build_scoring_prefix(system_prompt: str,
+                         job_context: str) -> List[BaseMessage]:
+    """
+    Stable head of a scoring prompt: the system prompt, then the job context.
+    It is byte-identical for every item of a profile, so the provider can
+    serve it from its prompt cache; only the trailing item message varies.
+    """
+    return [
+        SystemMessage(content=system_prompt),
+        HumanMessage(content=f"Job Context:\n{job_context}")
+    ]
+
+
+def build_scoring_messages(item: Union[Task, Skill], job_context: str,
+                           item_type: str) -> List[BaseMessage]:
+    """
+    Prompt of the per-item scorer, shared with the provider Batch API path.
+    All items of one type share the system prompt and job context, hence one
+    cached prefix per type.
+    """
+    if item_type == "task":
+        item_prompt = (
+            f"Task to Analyze:\nName: {item.task_name}\n"
+            f"Time Share: {item.time_share}\n\n"
+            "Judge the automation potential of this specific task by AI "
+            "in the future.")
+    else:  # skill
+        item_prompt = (
+            f"Skill to Analyze:\nName: {item.skill_name}\n"
+            f"Importance: {item.importance}\n\n"
+            "Judge the automation potential of this specific skill by AI "
+            "in the future.")
+
+    return [
+        *build_scoring_prefix(SCORING_SYSTEM_PROMPTS[("per_item", item_type)],
+                              job_context),
+        HumanMessage(content=item_prompt)
+    ]
+
+
+async def evaluate_automation_potential(
+        item: Union[Task, Skill],
+        job_context: str,
+        item_type: str,
+        priority: float,
+        job_title: Optional[str] = None,
+        tier: ScoringTier = "high") -> float:
+    """
+    Generic function to evaluate automation potential for either a Task or a Skill.
+
+    When `job_title` is given, scores are memoized across profiles by item
+    name and normalized job title. `tier` picks the scoring model and effort.
+    """
+    with span("scoring",
+              item_type=item_type,
+              item=get_item_name(item),
+              path="per_item",
+              tier=tier) as record:
+        return await _evaluate_item(item, job_context, item_type, priority,
+                                    job_title, tier, record)
+
+
+async def _evaluate_item(item: Union[Task, Skill], job_context: str,
+                         item_type: str, priority: float,
+                         job_title: Optional[str], tier: ScoringTier,
+                         record: dict) -> float:
+    cache_key = item_cache_key(item, item_type, job_title, "per_item", tier)
+    cached_score = await get_cached_item_score(cache_key)
+    record["cache"] = "off" if cache_key is None else "miss"
+    if cached_score is not None:
+        record["cache"] = "hit"
+        return cached_score
+    [similar_score] = await get_similar_item_scores([item], item_type,
+                                                    job_title, "per_item",
+                                                    tier)
+    if similar_score is not None:
+        record["cache"] = "semantic"
+        return similar_score
+
+    messages = build_scoring_messages(item, job_context, item_type)
+
+    async def score(_: EventEmitter) -> float:
+        analysis = await invoke_scorer(
+            "per_item", messages,
+            f"{item_type.capitalize()}AutomationEvaluator", priority,
+            estimate_tokens(*(message.content for message in messages),
+                            output_tokens=SCORING_OUTPUT_TOKEN_ESTIMATE),
+            record, tier)
+        await store_item_score(cache_key, analysis.score, item, job_title,
+                               "per_item", tier)
+        await store_similar_item_scores([item], [analysis.score], item_type,
+                                        job_title, "per_item", tier)
+        return analysis.score
+
+    # Concurrent analyses that need the same score share one call: the
+    # memoized key when there is one, else the exact prompt.
+    flight_key = cache_key or hashlib.sha256("\n".join(
+        [tier, *(message.content
+                 for message in messages)]).encode("utf-8")).hexdigest()
+    async with item_flights.attach(flight_key, score) as (flight, leader):
+        if not leader:
+            record["cache"] = "coalesced"
+        return await flight.result()
+
+
+async def evaluate_automation_batch(
+        all_items: List[Union[Task, Skill]],
+        job_context: str,
+        item_type: str,
+        priority: float,
+        job_title: Optional[str] = None,
+        tier: ScoringTier = "high") -> List[float]:
+    """
+    Scores a chunk of tasks or skills in a single structured LLM call.
+
+    Scores are matched back to the items by name; any item the model skipped
+    or renamed is re-scored with the per-item evaluator. Items with a
+    memoized score are left out of the call.
+    """
+    with span("scoring",
+              item_type=item_type,
+              items=len(all_items),
+              path="batched",
+              tier=tier) as record:
+        return await _evaluate_batch(all_items, job_context, item_type,
+                                     priority, job_title, tier, record)
+
+
+async def _evaluate_batch(all_items: List[Union[Task, Skill]],
+                          job_context: str, item_type: str, priority: float,
+                          job_title: Optional[str], tier: ScoringTier,
+                          record: dict) -> List[float]:
+    cache_keys = [
+        item_cache_key(item, item_type, job_title, "batched", tier)
+        for item in all_items
+    ]
+    final_scores = [await get_cached_item_score(key) for key in cache_keys]
+    pending = [i for i, score in enumerate(final_scores) if score is None]
+    record["cache_hits"] = len(all_items) - len(pending)
+    similar_scores = await get_similar_item_scores(
+        [all_items[i] for i in pending], item_type, job_title, "batched",
+        tier)
+    for i, score in zip(pending, similar_scores):
+        final_scores[i] = score
+    pending = [i for i, score in enumerate(final_scores) if score is None]
+    record["semantic_hits"] = len(all_items) - len(
+        pending) - record["cache_hits"]
+    if not pending:
+        return final_scores
+    items = [all_items[i] for i in pending]
+
+    if item_type == "task":
+        system_prompt = TASKS_BATCH_REPLACABILITY_SYSTEM_PROMPT
+        item_lines = "\n".join(
+            f"- Name: {item.task_name} | Time Share: {item.time_share}"
+            for item in items)
+        items_prompt = (
+            f"Tasks to Analyze:\n{item_lines}\n\n"
+            "Judge the automation potential of each of these tasks by AI "
+            "in the future.")
+    else:  # skill
+        system_prompt = SKILLS_BATCH_REPLACABILITY_SYSTEM_PROMPT
+        item_lines = "\n".join(
+            f"- Name: {item.skill_name} | Importance: {item.importance}"
+            for item in items)
+        items_prompt = (
+            f"Skills to Analyze:\n{item_lines}\n\n"
+            "Judge the automation potential of each of these skills by AI "
+            "in the future.")
+
+    messages = [
+        *build_scoring_prefix(system_prompt, job_context),
+        HumanMessage(content=items_prompt)
+    ]
+
+    analysis = await invoke_scorer(
+        "batched", messages,
+        f"{item_type.capitalize()}BatchAutomationEvaluator", priority,
+        estimate_tokens(*(message.content for message in messages),
+                        output_tokens=SCORING_OUTPUT_TOKEN_ESTIMATE), record,
+        tier)
+
+    scores_by_name = {
+        normalize_text(entry.name): entry.score
+        for entry in analysis.scores
+    }
+    scores = [
+        scores_by_name.get(normalize_text(get_item_name(item)))
+        for item in items
+    ]
+
+    missing = [i for i, score in enumerate(scores) if score is None]
+    if missing:
+        print(f"⚠️ Batch scoring skipped {len(missing)} {item_type}(s), "
+              "falling back to per-item scoring.")
+        fallback_scores = await asyncio.gather(*[
+            evaluate_automation_potential(items[i], job_context, item_type,
+                                          priority, job_title, tier)
+            for i in missing
+        ])
+        for i, score in zip(missing, fallback_scores):
+            scores[i] = score
+
+    for local_index, (i, score) in enumerate(zip(pending, scores)):
+        final_scores[i] = score
+        # Fallback scores were already memoized by the per-item evaluator.
+        if local_index not in missing:
+            await store_item_score(cache_keys[i], score, all_items[i],
+                                   job_title, "batched", tier)
+    await store_similar_item_scores(items, scores, item_type, job_title,
+                                    "batched", tier)
+
+    return final_scores
+
+
+INVALID_INPUT_ERROR = {
+    "error_code":
+    "INVALID_INPUT_CONTENT",
+    "message":
+    "Could not extract meaningful tasks or skills from the provided input. Please ensure the job description and routine are detailed and relevant."
+}
+
+# Receives (event name, JSON-serializable payload) for every pipeline stage.
+EventEmitter = Callable[[str, Any], Awaitable[None]]
+
+
+async def _discard_event(event: str, data: Any) -> None:
+    pass
+
+
+def build_job_context(profile: UserProfile) -> str:
+    return f"""Age: {profile.age}
+Gender: {profile.gender}
+Job Title: {profile.job_title}
+Job Description: {profile.job_description}
+Daily Routine: {profile.daily_routine}
+Location: {profile.location}
+Education: {profile.education}"""
+
+
+# Pipeline stage each agent's span is reported under.
+AGENT_STAGES = {
+    "tasks": "decomposition",
+    "skills": "decomposition",
+    "scenarios": "scenarios",
+    "careers": "careers",
+    "research": "research",
+}
+
+
+async def run_agent(name: str,
+                    system_prompt: str,
+                    user_content: str,
+                    run_name: str,
+                    priority: float,
+                    research_query: Optional[str] = None) -> dict:
+    """
+    Invokes one of the registry's agents through the global LLM scheduler.
+
+    With a `research_query` (the job title) that the local research corpus
+    covers, the agent searches the corpus instead of the hosted web search.
+    """
+    registry = await aget_registry()
+    agents = registry.agents
+    research = "hosted"
+    if research_query and name in registry.corpus_agents:
+        if research_corpus.covers(research_query):
+            agents = registry.corpus_agents
+            research = "local"
+        RESEARCH_CORPUS_LOOKUPS.inc(
+            agent=name, outcome="hit" if research == "local" else "fallback")
+    with span(AGENT_STAGES[name],
+              agent=name,
+              model=LLM_MODEL,
+              research=research) as record:
+        result = await call_llm(
+            agents[name], {
+                "messages": [
+                    SystemMessage(content=system_prompt),
+                    HumanMessage(content=user_content)
+                ]
+            }, run_name, priority,
+            estimate_tokens(system_prompt,
+                            user_content,
+                            output_tokens=AGENT_OUTPUT_TOKEN_ESTIMATE), record)
+        record_usage(record, result.get("messages", []))
+        return result
+
+
+def aggregate_scores(tasks: List[Task],
+                     task_scores: List[float],
+                     skills: List[Skill],
+                     skill_scores: List[float],
+                     task_tiers: Optional[List[ScoringTier]] = None,
+                     skill_tiers: Optional[List[ScoringTier]] = None) -> dict:
+    """
+    Combines per-item scores into the weighted breakdowns and the final score.
+    With tiers given, every breakdown entry also reports its scoring tier.
+    """
+    # Tasks
+    task_automation_breakdown = {}
+    total_task_automation = 0.0
+
+    for i, (task, score) in enumerate(zip(tasks, task_scores)):
+        weighted_val = task.time_share * score
+        task_automation_breakdown[task.task_name] = {
+            "score": score,
+            "weighted_score": weighted_val,
+            "time_share": task.time_share
+        }
+        if task_tiers is not None:
+            task_automation_breakdown[task.task_name]["tier"] = task_tiers[i]
+        total_task_automation += weighted_val
+
+    # Skills
+    skill_automation_breakdown = {}
+    total_skill_automation = 0.0
+
+    for i, (skill, score) in enumerate(zip(skills, skill_scores)):
+        weighted_val = skill.importance * score
+        skill_automation_breakdown[skill.skill_name] = {
+            "score": score,
+            "weighted_score": weighted_val,
+            "importance": skill.importance
+        }
+        if skill_tiers is not None:
+            skill_automation_breakdown[skill.skill_name]["tier"] = (
+                skill_tiers[i])
+        total_skill_automation += weighted_val
+
+    weighted_final_score = (total_task_automation *
+                            0.4) + (total_skill_automation * 0.6)
+
+    return {
+        "task_automation_breakdown": task_automation_breakdown,
+        "total_task_automation": total_task_automation,
+        "skill_automation_breakdown": skill_automation_breakdown,
+        "total_skill_automation": total_skill_automation,
+        "weighted_final_score": weighted_final_score
+    }
+
+
+def score_agreement(tasks: List[Task], per_item_tasks: List[float],
+                    batched_tasks: List[float], skills: List[Skill],
+                    per_item_skills: List[float],
+                    batched_skills: List[float]) -> dict:
+    """
+    Summarizes how closely batched scores track the per-item scores.
+    """
+    diffs = [
+        abs(a - b) for a, b in zip(per_item_tasks + per_item_skills,
+                                   batched_tasks + batched_skills)
+    ]
+    per_item_final = aggregate_scores(tasks, per_item_tasks, skills,
+                                      per_item_skills)["weighted_final_score"]
+    batched_final = aggregate_scores(tasks, batched_tasks, skills,
+                                     batched_skills)["weighted_final_score"]
+    return {
+        "mean_abs_diff": sum(diffs) / len(diffs) if diffs else 0.0,
+        "max_abs_diff": max(diffs, default=0.0),
+        "per_item_final_score": per_item_final,
+        "batched_final_score": batched_final,
+        "final_score_diff": batched_final - per_item_final
+    }
+
+
+def with_drafts(aggregate: dict, tasks: List[Task],
+                draft_tasks: Optional[List[float]], skills: List[Skill],
+                draft_skills: Optional[List[float]]) -> dict:
+    """
+    Copy of a progressive analysis' aggregate where every breakdown entry
+    carries its draft score and the final score's delta to it, plus the
+    draft final score. Lists whose draft pass failed are left as they are.
+    The deltas are recorded to tell when the refinement pass could go.
+    """
+    flagged = dict(aggregate)
+    for name, items, drafts, item_type in (
+        ("task_automation_breakdown", tasks, draft_tasks, "task"),
+        ("skill_automation_breakdown", skills, draft_skills, "skill")):
+        if drafts is None:
+            continue
+        breakdown = {
+            item_name: dict(entry)
+            for item_name, entry in aggregate[name].items()
+        }
+        for item, draft in zip(items, drafts):
+            entry = breakdown[get_item_name(item)]
+            entry["draft_score"] = draft
+            entry["draft_delta"] = entry["score"] - draft
+            SCORING_DRAFT_DELTA.observe(abs(entry["draft_delta"]),
+                                        item_type=item_type)
+        flagged[name] = breakdown
+    if draft_tasks is not None and draft_skills is not None:
+        draft_final = aggregate_scores(tasks, draft_tasks, skills,
+                                       draft_skills)["weighted_final_score"]
+        flagged["draft_weighted_final_score"] = draft_final
+        flagged["draft_delta"] = aggregate["weighted_final_score"] - draft_final
+    return flagged
+
+
+async def score_items(
+    items: List[Union[Task, Skill]],
+    item_type: str,
+    job_context: str,
+    scoring_mode: ScoringMode,
+    priority: float,
+    emit: EventEmitter = _discard_event,
+    job_title: Optional[str] = None,
+    drafts_ready: Optional[asyncio.Future] = None
+) -> tuple[List[float], Optional[List[float]], List[ScoringTier],
+           List[Optional[ScoringFallback]]]:
+    """
+    Scores one decomposition list (all tasks or all skills) with the
+    selected scoring mode.
+
+    Returns the scores, the scores to set against them (in "compare" mode
+    the batched scores, in "progressive" mode the drafts, None if the draft
+    pass failed), the scoring tier of every item (see assign_scoring_tiers)
+    and the fallback each item was scored with, if any. `job_title` enables
+    the cross-profile item score cache; `drafts_ready` is resolved with the
+    drafts once they are in.
+
+    An item (or batched chunk) whose scoring still fails after its retries
+    takes its draft score in "progressive" mode, else is scored on the other
+    tier; only if that fails too does the error propagate. "compare" mode
+    never falls back.
+    """
+    if scoring_mode == "compare":
+        # Agreement is only meaningful between freshly computed scores.
+        job_title = None
+    tiers = assign_scoring_tiers(items)
+    fallbacks: List[Optional[ScoringFallback]] = [None] * len(items)
+    drafts: Optional[List[float]] = None
+    drafts_done = asyncio.get_running_loop().create_future()
+    finals: Set[int] = set()
+
+    async def emit_score(index: int, score: float) -> None:
+        event = {
+            "item_type": item_type,
+            "index": index,
+            "name": get_item_name(items[index]),
+            "score": score,
+            "tier": tiers[index]
+        }
+        if fallbacks[index] is not None:
+            event["fallback"] = fallbacks[index]
+        if scoring_mode == "progressive":
+            finals.add(index)
+            event["status"] = "final"
+            if drafts is not None:
+                event["draft"] = drafts[index]
+                event["delta"] = score - drafts[index]
+        await emit("score", event)
+
+    async def score_drafts() -> Optional[List[float]]:
+        # One low-tier batched pass over all items, whatever their tier.
+        nonlocal drafts
+        try:
+            chunks = await asyncio.gather(*[
+                evaluate_automation_batch(
+                    items[start:start + SCORING_BATCH_SIZE], job_context,
+                    item_type, priority, job_title, "low")
+                for start in range(0, len(items), SCORING_BATCH_SIZE)
+            ])
+        except Exception as e:
+            print(f"⚠️ Draft scoring of {item_type}s failed, waiting for "
+                  f"the final scores. Error: {e}")
+        else:
+            drafts = [score for chunk in chunks for score in chunk]
+            for index, score in enumerate(drafts):
+                # A final score already sent is never overwritten.
+                if index not in finals:
+                    await emit(
+                        "score", {
+                            "item_type": item_type,
+                            "index": index,
+                            "name": get_item_name(items[index]),
+                            "score": score,
+                            "tier": "low",
+                            "status": "draft"
+                        })
+        if drafts_ready is not None and not drafts_ready.done():
+            drafts_ready.set_result(drafts)
+        drafts_done.set_result(None)
+        return drafts
+
+    async def score_item(index: int) -> float:
+        try:
+            score = await evaluate_automation_potential(
+                items[index], job_context, item_type, priority, job_title,
+                tiers[index])
+        except LLMUnavailable as e:
+            if scoring_mode == "compare":
+                raise
+            if scoring_mode == "progressive":
+                await drafts_done
+            if drafts is not None:
+                fallbacks[index] = "draft"
+                tiers[index] = "low"
+                score = drafts[index]
+            else:
+                fallback = other_tier(tiers[index])
+                score = await evaluate_automation_potential(
+                    items[index], job_context, item_type, priority,
+                    job_title, fallback)
+                fallbacks[index] = tiers[index] = fallback
+            print(f"⚠️ Scoring {item_type} {get_item_name(items[index])!r} "
+                  f"failed, using its {fallbacks[index]} score. Error: {e}")
+        await emit_score(index, score)
+        return score
+
+    async def score_chunk(indices: List[int], tier: ScoringTier,
+                          report: bool) -> List[float]:
+        chunk = [items[i] for i in indices]
+        try:
+            scores = await evaluate_automation_batch(chunk, job_context,
+                                                     item_type, priority,
+                                                     job_title, tier)
+        except LLMUnavailable as e:
+            if scoring_mode == "compare":
+                raise
+            fallback = other_tier(tier)
+            scores = await evaluate_automation_batch(chunk, job_context,
+                                                     item_type, priority,
+                                                     job_title, fallback)
+            for i in indices:
+                fallbacks[i] = tiers[i] = fallback
+            print(f"⚠️ Scoring a chunk of {len(chunk)} {item_type}s failed, "
+                  f"using {fallback} tier scores. Error: {e}")
+        if report:
+            for i, score in zip(indices, scores):
+                await emit_score(i, score)
+        return scores
+
+    async def score_per_item() -> List[float]:
+        await prefetch_item_embeddings(items, item_type, job_title)
+        # We gather scores directly instead of creating Analyzed objects
+        return list(await asyncio.gather(
+            *[score_item(i) for i in range(len(items))]))
+
+    async def score_batched(report: bool) -> List[float]:
+        # Every chunk is scored on one tier.
+        chunks = []
+        for tier in ("low", "high"):
+            indices = [i for i, t in enumerate(tiers) if t == tier]
+            chunks.extend((indices[start:start + SCORING_BATCH_SIZE], tier)
+                          for start in range(0, len(indices),
+                                             SCORING_BATCH_SIZE))
+        chunk_scores = await asyncio.gather(*[
+            score_chunk(indices, tier, report) for indices, tier in chunks
+        ])
+        scores = [0.0] * len(items)
+        for (indices, _), chunk in zip(chunks, chunk_scores):
+            for i, score in zip(indices, chunk):
+                scores[i] = score
+        return scores
+
+    if scoring_mode == "batched":
+        return await score_batched(report=True), None, tiers, fallbacks
+
+    if scoring_mode == "compare":
+        scores, batched_scores = await asyncio.gather(
+            score_per_item(), score_batched(report=False))
+        return scores, batched_scores, tiers, fallbacks
+
+    if scoring_mode == "progressive":
+        scores, draft_scores = await asyncio.gather(score_per_item(),
+                                                    score_drafts())
+        return scores, draft_scores, tiers, fallbacks
+
+    return await score_per_item(), None, tiers, fallbacks
+
+
+def other_tier(tier: ScoringTier) -> ScoringTier:
+    return "low" if tier == "high" else "high"
+
+
+def mark_fallbacks(aggregate: dict, tasks: List[Task],
+                   task_fallbacks: List[Optional[ScoringFallback]],
+                   skills: List[Skill],
+                   skill_fallbacks: List[Optional[ScoringFallback]]) -> bool:
+    """
+    Adds the fallback of every item scored with one to its breakdown entry.
+    Returns whether there was any, i.e. whether scoring is degraded.
+    """
+    degraded = False
+    for name, items, fallbacks in (
+        ("task_automation_breakdown", tasks, task_fallbacks),
+        ("skill_automation_breakdown", skills, skill_fallbacks)):
+        for item, fallback in zip(items, fallbacks):
+            if fallback is not None:
+                aggregate[name][get_item_name(item)]["fallback"] = fallback
+                degraded = True
+    if degraded:
+        ANALYSIS_DEGRADED.inc(stage="scoring")
+    return degraded
+
+
+async def gather_cancelling(*aws: Awaitable) -> list:
+    """
+    Like asyncio.gather, but cancels the remaining awaitables as soon as one
+    of them fails instead of leaving them running in the background.
+    """
+    futures = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*futures)
+    finally:
+        for future in futures:
+            if not future.done():
+                future.cancel()
+
+
+# Agent name / response field / event name, system prompt and run name of
+# the two decomposition agents.
+DECOMPOSITION_AGENTS = {
+    "task": ("tasks", TASKS_DECOMPOSITION_SYSTEM_PROMPT,
+             "TaskDecompositionAgent"),
+    "skill": ("skills", SKILLS_DECOMPOSITION_SYSTEM_PROMPT,
+              "SkillDecompositionAgent"),
+}
+
+
+def build_preliminary_summary(job_context: str, tasks: List[Task],
+                              skills: List[Skill]) -> dict:
+    """
+    Analysis data for the narrative agents before any score is known
+    (NARRATIVE_START=preliminary).
+    """
+    return {
+        "job_context": job_context,
+        "tasks": {task.task_name: task.time_share
+                  for task in tasks},
+        "skills": {skill.skill_name: skill.importance
+                   for skill in skills},
+        "automation_scores":
+        "pending - infer automation exposure from the tasks and skills"
+    }
+
+
+async def adapt_decomposition(name: str, entry: dict, job_context: str,
+                              priority: float) -> List[Union[Task, Skill]]:
+    """
+    Personalizes the canonical decomposition of an indexed job title for a
+    profile, without the researching agent (or returns it as is with
+    TITLE_INDEX_MODE=reuse).
+    """
+    schema = ADAPTER_SCHEMAS[name]
+    canonical = schema(**{name: entry[name]})
+    with span("decomposition", agent=name, index="hit") as record:
+        if TITLE_INDEX_MODE == "reuse":
+            return getattr(canonical, name)
+        system_prompt = ADAPTATION_PROMPTS[name]
+        user_prompt = (f"User Profile:\n{job_context}\n\n"
+                       f"Canonical Decomposition:\n"
+                       f"{canonical.model_dump_json()}")
+        registry = await aget_registry()
+        adapted = await invoke_structured(
+            registry.adapters[name], [
+                SystemMessage(content=system_prompt),
+                HumanMessage(content=user_prompt)
+            ], f"{schema.__name__}Adapter", priority,
+            estimate_tokens(system_prompt,
+                            user_prompt,
+                            output_tokens=ADAPTER_OUTPUT_TOKEN_ESTIMATE),
+            record)
+        return getattr(adapted, name)
+
+
+async def decompose(
+        item_type: str,
+        job_context: str,
+        priority: float,
+        job_title: Optional[str] = None) -> List[Union[Task, Skill]]:
+    """
+    Runs the task or skill decomposition agent for a job context.
+
+    When `job_title` is given, the decomposition of a near-duplicate job
+    context is reused (semantic cache), or else the canonical decomposition
+    of a matching job-title index entry is adapted; the agent only
+    researches misses (and hits whose adaptation failed).
+    """
+    name, system_prompt, run_name = DECOMPOSITION_AGENTS[item_type]
+    semantic_text = None
+    if semantic_cache is not None and job_title:
+        semantic_text = normalize_text(job_context)
+        [similar] = await semantic_cache.lookup(
+            name, [semantic_text], SEMANTIC_CACHE_DECOMPOSITION_THRESHOLD)
+        if similar is not None:
+            schema = ADAPTER_SCHEMAS[name]
+            with span("decomposition", agent=name, cache="semantic"):
+                return getattr(schema(**{name: similar}), name)
+
+    items = await _decompose(name, system_prompt, run_name, job_context,
+                             priority, job_title)
+    if semantic_text is not None:
+        await semantic_cache.store(name, [semantic_text],
+                                   [[item.model_dump() for item in items]])
+    return items
+
+
+async def _decompose(name: str, system_prompt: str, run_name: str,
+                     job_context: str, priority: float,
+                     job_title: Optional[str]) -> List[Union[Task, Skill]]:
+    entry = None
+    if title_index is not None and job_title:
+        entry = title_index.lookup(job_title)
+        TITLE_INDEX_LOOKUPS.inc(outcome="miss" if entry is None else "hit")
+    if entry is not None:
+        try:
+            return await adapt_decomposition(name, entry, job_context,
+                                             priority)
+        except Exception as e:
+            print(f"⚠️ Adapting the indexed {name} of {entry['title']!r} "
+                  f"failed, researching instead. Error: {e}")
+    try:
+        result = await run_agent(name, system_prompt,
+                                 f"User Profile:\n{job_context}", run_name,
+                                 priority, job_title)
+        return getattr(result["structured_response"], name)
+    except (LLMUnavailable, SchedulerOverloaded):
+        raise
+    except (ValidationError, Exception) as e:
+        print(f"⚠️ Input validation failed (likely invalid/short content). Error: {e}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=400, detail=INVALID_INPUT_ERROR)
+
+
+def build_analysis_summary(job_context: str, aggregate: dict) -> dict:
+    """
+    Detailed analysis data for the narrative agents once scores are in.
+    """
+    return {
+        "job_context": job_context,
+        "tasks_analysis": aggregate["task_automation_breakdown"],
+        "skills_analysis": aggregate["skill_automation_breakdown"],
+        "total_automation_score": aggregate["weighted_final_score"]
+    }
+
+
+# 4. Generate Future Scenarios & Career Recommendations (Concurrent)
+async def generate_narratives(
+    analysis_summary: dict,
+    priority: float,
+    emit: EventEmitter = _discard_event,
+    job_title: Optional[str] = None
+) -> tuple[List[FutureScenario], List[CareerOptionInitial], List[str]]:
+    """
+    Runs the scenario and career agents concurrently. An agent that fails
+    (after its retries) or runs out of time is skipped: its list comes back
+    empty and its name is added to the returned degraded stages. With the
+    `job_title`, the agents may research in the local corpus.
+    """
+    # Compact: indentation would only add prompt tokens.
+    analysis_summary_json = json.dumps(analysis_summary,
+                                       ensure_ascii=False,
+                                       separators=(",", ":"))
+    degraded: List[str] = []
+
+    async def generate_scenarios() -> List[FutureScenario]:
+        result_scenarios = await run_agent(
+            "scenarios", SCENARIO_GENERATION_SYSTEM_PROMPT,
+            f"Full Job Analysis Data:\n{analysis_summary_json}",
+            "FutureScenariosAgent", priority, job_title)
+        scenarios = result_scenarios["structured_response"].scenarios
+        await emit("scenarios", jsonable_encoder(scenarios))
+        return scenarios
+
+    async def generate_careers() -> List[CareerOptionInitial]:
+        result_careers_initial = await run_agent(
+            "careers", CAREER_RECOMMENDATIONS_SYSTEM_PROMPT,
+            f"Full Job Analysis Data:\n{analysis_summary_json}",
+            "CareerRecommendationsAgent", priority, job_title)
+        initial_recommendations: List[
+            CareerOptionInitial] = result_careers_initial[
+                "structured_response"].recommendations
+        await emit("careers", jsonable_encoder(initial_recommendations))
+        return initial_recommendations
+
+    async def skip_on_failure(
+            name: str, generate: Callable[[], Awaitable[list]]) -> list:
+        try:
+            return await generate()
+        except Exception as e:
+            print(f"⚠️ Answering without {name}. Error: {e}")
+            ANALYSIS_DEGRADED.inc(stage=name)
+            degraded.append(name)
+            await emit("degraded", {"stage": name})
+            return []
+
+    # Launch scenarios and initial careers concurrently
+    scenarios, careers = await asyncio.gather(
+        skip_on_failure("scenarios", generate_scenarios),
+        skip_on_failure("careers", generate_careers))
+    return scenarios, careers, degraded
+
+
+async def run_analysis(profile: UserProfile,
+                       emit: EventEmitter = _discard_event,
+                       scoring_mode: Optional[ScoringMode] = None,
+                       include_timings: bool = False) -> dict:
+    """
+    Runs the full analysis pipeline for a profile.
+
+    Every finished stage is reported through `emit` as soon as it is
+    available, so callers can stream partial results to the client.
+    `scoring_mode` overrides the SCORING_MODE setting for this run and
+    `include_timings` adds the per-stage spans as a `timings` block.
+
+    Stages only wait for their real dependencies: tasks are scored as soon
+    as the task decomposition is in, independently of the skills (and vice
+    versa), and with NARRATIVE_START=preliminary the scenario and career
+    agents start right after decomposition instead of after scoring.
+    """
+    scoring_mode = scoring_mode or SCORING_MODE
+    trace = start_trace()
+    start_deadline()
+    started_at = time.perf_counter()
+    job_context = build_job_context(profile)
+    # Earlier analyses win contended LLM slots, so in-flight profiles finish
+    # before new ones start.
+    priority = time.monotonic()
+    loop = asyncio.get_running_loop()
+    decomposed = {"task": loop.create_future(), "skill": loop.create_future()}
+    progressive = scoring_mode == "progressive"
+    drafts = {"task": loop.create_future(), "skill": loop.create_future()}
+
+    # 1. Decomposition Agents, each followed directly by its Automation
+    # Analysis (Parallel)
+    async def decompose_and_score(
+        item_type: str
+    ) -> tuple[List[Union[Task, Skill]], List[float], Optional[List[float]],
+               List[ScoringTier], List[Optional[ScoringFallback]]]:
+        items = await decompose(item_type, job_context, priority,
+                                profile.job_title)
+        await emit(DECOMPOSITION_AGENTS[item_type][0],
+                   jsonable_encoder(items))
+        decomposed[item_type].set_result(items)
+
+        # 2. Automation Analysis
+        scores, batched_scores, tiers, fallbacks = await score_items(
+            items, item_type, job_context, scoring_mode, priority, emit,
+            profile.job_title, drafts[item_type] if progressive else None)
+        return items, scores, batched_scores, tiers, fallbacks
+
+    async def emit_draft_aggregate() -> None:
+        # Always before the final aggregate: that waits for this branch.
+        tasks, skills, draft_tasks, draft_skills = await asyncio.gather(
+            decomposed["task"], decomposed["skill"], drafts["task"],
+            drafts["skill"])
+        if draft_tasks is not None and draft_skills is not None:
+            await emit(
+                "aggregate", {
+                    **aggregate_scores(tasks, draft_tasks, skills,
+                                       draft_skills), "status": "draft"
+                })
+
+    async def generate_preliminary_narratives():
+        tasks, skills = await asyncio.gather(decomposed["task"],
+                                             decomposed["skill"])
+        return await generate_narratives(
+            build_preliminary_summary(job_context, tasks, skills), priority,
+            emit, profile.job_title)
+
+    branches = [decompose_and_score("task"), decompose_and_score("skill")]
+    if NARRATIVE_START == "preliminary":
+        branches.append(generate_preliminary_narratives())
+    if progressive:
+        branches.append(emit_draft_aggregate())
+    results = await gather_cancelling(*branches)
+    (tasks, task_scores_list, batched_task_scores, task_tiers,
+     task_fallbacks), (skills, skill_scores_list, batched_skill_scores,
+                       skill_tiers, skill_fallbacks) = results[:2]
+
+    # 3. Calculate Results
+    with span("aggregation"):
+        aggregate = aggregate_scores(tasks, task_scores_list, skills,
+                                     skill_scores_list, task_tiers,
+                                     skill_tiers)
+    scoring_degraded = mark_fallbacks(aggregate, tasks, task_fallbacks,
+                                      skills, skill_fallbacks)
+    if scoring_degraded:
+        await emit("degraded", {"stage": "scoring"})
+    # The narrative agents get the plain aggregate, without the drafts.
+    reported = aggregate
+    if progressive:
+        # The second scores of each list are its drafts.
+        reported = with_drafts(aggregate, tasks, batched_task_scores, skills,
+                               batched_skill_scores)
+        await emit("aggregate", {**reported, "status": "final"})
+    else:
+        await emit("aggregate", aggregate)
+
+    if NARRATIVE_START == "preliminary":
+        future_scenarios, career_recommendations, degraded = results[2]
+    else:
+        future_scenarios, career_recommendations, degraded = (
+            await generate_narratives(
+                build_analysis_summary(job_context, aggregate), priority,
+                emit, profile.job_title))
+
+    result = {
+        **reported, "future_scenarios": future_scenarios,
+        "career_recommendations": career_recommendations,
+        "versions": stage_versions(scoring_mode)
+    }
+    if scoring_degraded:
+        degraded = ["scoring", *degraded]
+    if degraded:
+        result["degraded"] = degraded
+    if scoring_mode == "compare":
+        agreement = score_agreement(tasks, task_scores_list,
+                                    batched_task_scores, skills,
+                                    skill_scores_list, batched_skill_scores)
+        print(f"📊 Scoring agreement (batched vs per-item): {agreement}")
+        result["scoring_agreement"] = agreement
+    ratio = cached_token_ratio(trace)
+    if ratio is not None:
+        LLM_CACHED_TOKEN_RATIO.observe(ratio)
+    if include_timings:
+        result["timings"] = summarize_trace(trace,
+                                            time.perf_counter() - started_at)
+    return result
+
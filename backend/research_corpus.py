@@ -0,0 +1,404 @@
+"""
+Local research corpus: researched notes on the most common occupations with
+a BM25 index, searched by the agents through a tool instead of the hosted
+web search.
+
+The agents research locally when the corpus covers the job title of the
+analysis (a title or alias match, or good enough term recall in the best
+matching occupation) and fall back to the hosted web search otherwise.
+
+Refresh it with the most common professions (runs the researching agent
+with the hosted web search once per title), and try a query:
+
+    poetry run python research_corpus.py refresh --top 100
+    poetry run python research_corpus.py refresh --older-than 90
+    poetry run python research_corpus.py search "nurse automation outlook"
+"""
+import argparse
+import asyncio
+import difflib
+import functools
+import hashlib
+import json
+import math
+import os
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Set, Tuple
+import numpy as np
+from clients import LLM_MODEL
+from metrics import RESEARCH_CORPUS_SEARCHES
+from prompts import OCCUPATION_RESEARCH_SYSTEM_PROMPT
+from title_index import (PROFESSIONS_PATH, TITLE_INDEX_MATCH_CUTOFF,
+                         normalize_title, read_professions)
+
+# JSON file of the corpus and its index; "none" disables local research.
+RESEARCH_CORPUS_PATH = os.getenv("RESEARCH_CORPUS_PATH",
+                                 "research_corpus.json")
+# Minimum share (0-1, weighted by term rarity) of a job title's terms found
+# in the best matching occupation for the corpus to cover it.
+RESEARCH_CORPUS_MIN_RECALL = float(
+    os.getenv("RESEARCH_CORPUS_MIN_RECALL", "0.6"))
+# Documents returned per search of the agents' tool.
+RESEARCH_CORPUS_TOP_K = int(os.getenv("RESEARCH_CORPUS_TOP_K", "5"))
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+STOPWORDS = frozenset(
+    "a an and are as at be by for from in is it of on or that the this to "
+    "with without".split())
+
+# Notes researched with another prompt or model are not used.
+RESEARCH_CORPUS_VERSION = hashlib.sha256("\n".join([
+    LLM_MODEL, OCCUPATION_RESEARCH_SYSTEM_PROMPT
+]).encode("utf-8")).hexdigest()[:12]
+
+
+def tokenize(text: str) -> List[str]:
+    return [
+        token for token in normalize_title(text).split()
+        if len(token) > 1 and token not in STOPWORDS
+    ]
+
+
+def section_texts(research: dict) -> Dict[str, str]:
+    """
+    One document per section of an occupation's research notes.
+    """
+    return {
+        "Overview": research["overview"],
+        "Typical tasks": "\n".join(f"- {task}"
+                                   for task in research["typical_tasks"]),
+        "Key skills": "\n".join(f"- {skill}"
+                                for skill in research["key_skills"]),
+        "AI and automation outlook": research["automation_outlook"],
+        "Career paths": research["career_paths"],
+    }
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed set of documents. The postings (term -> [doc,
+    term frequency] pairs) and document lengths are what is stored on disk;
+    the per-posting weights are computed once at load.
+    """
+
+    def __init__(self, postings: Dict[str, List[List[int]]],
+                 lengths: List[int]):
+        self.postings = postings
+        self.lengths = lengths
+        doc_lengths = np.asarray(lengths, dtype=np.float32)
+        average = float(doc_lengths.mean()) if lengths else 0.0
+        self._weights: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for term, entries in postings.items():
+            docs = np.array([doc for doc, _ in entries], dtype=np.int32)
+            frequencies = np.array([tf for _, tf in entries],
+                                   dtype=np.float32)
+            norm = BM25_K1 * (1 - BM25_B +
+                              BM25_B * doc_lengths[docs] / average)
+            self._weights[term] = (docs, self.idf(term) * frequencies *
+                                   (BM25_K1 + 1) / (frequencies + norm))
+
+    @classmethod
+    def build(cls, documents: List[str]) -> "BM25Index":
+        postings: Dict[str, List[List[int]]] = {}
+        lengths = []
+        for doc, text in enumerate(documents):
+            counts = Counter(tokenize(text))
+            lengths.append(sum(counts.values()))
+            for term, frequency in counts.items():
+                postings.setdefault(term, []).append([doc, frequency])
+        return cls(postings, lengths)
+
+    def idf(self, term: str) -> float:
+        matching = len(self.postings.get(term, ()))
+        return math.log(1 + (len(self.lengths) - matching + 0.5) /
+                        (matching + 0.5))
+
+    def scores(self, terms: List[str]) -> np.ndarray:
+        scores = np.zeros(len(self.lengths), dtype=np.float32)
+        for term in terms:
+            if term in self._weights:
+                docs, weights = self._weights[term]
+                scores[docs] += weights
+        return scores
+
+    def to_json(self) -> dict:
+        return {"postings": self.postings, "lengths": self.lengths}
+
+
+class ResearchCorpus:
+    """
+    Research notes keyed by normalized occupation title, each reachable
+    through its aliases, split into one indexed document per section.
+    """
+
+    def __init__(self, version: str = RESEARCH_CORPUS_VERSION):
+        self.version = version
+        self.occupations: Dict[str, dict] = {}
+        # Normalized alias -> occupation key.
+        self._aliases: Dict[str, str] = {}
+        # (occupation key, section) of every indexed document.
+        self.documents: List[Tuple[str, str]] = []
+        self.index: Optional[BM25Index] = None
+        self._terms: Dict[str, Set[str]] = {}
+        self._coverage: Dict[str, bool] = {}
+
+    def __len__(self) -> int:
+        return len(self.occupations)
+
+    @classmethod
+    def load(cls, path: str) -> "ResearchCorpus":
+        corpus = cls()
+        if not os.path.exists(path):
+            return corpus
+        with open(path, encoding="utf-8") as file:
+            data = json.load(file)
+        if data.get("version") != corpus.version:
+            print(f"⚠️ Research corpus {path} was built for version "
+                  f"{data.get('version')}, ignoring it.")
+            return corpus
+        for occupation in data["occupations"].values():
+            corpus.add(occupation["title"], occupation["aliases"],
+                       occupation["research"], occupation["created_at"])
+        corpus.build_index(data.get("index"))
+        return corpus
+
+    def save(self, path: str) -> None:
+        if self.index is None:
+            self.build_index()
+        with open(path + ".tmp", "w", encoding="utf-8") as file:
+            json.dump(
+                {
+                    "version": self.version,
+                    "occupations": self.occupations,
+                    "index": self.index.to_json()
+                },
+                file,
+                ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+
+    def add(self,
+            title: str,
+            aliases: List[str],
+            research: dict,
+            created_at: Optional[float] = None) -> None:
+        key = normalize_title(title)
+        self.occupations[key] = {
+            "title": title,
+            "aliases": aliases,
+            "research": research,
+            "created_at": created_at or time.time()
+        }
+        for alias in [title, *aliases]:
+            self._aliases[normalize_title(alias)] = key
+        self.index = None
+
+    def document_text(self, doc: int) -> str:
+        key, section = self.documents[doc]
+        occupation = self.occupations[key]
+        names = ", ".join([occupation["title"], *occupation["aliases"]])
+        return (f"{names}. {section}:\n"
+                f"{section_texts(occupation['research'])[section]}")
+
+    def build_index(self, stored: Optional[dict] = None) -> None:
+        """
+        Indexes every section of every occupation, reusing the `stored`
+        index when it covers exactly these documents.
+        """
+        self.documents = [(key, section)
+                          for key, occupation in self.occupations.items()
+                          for section in section_texts(occupation["research"])]
+        texts = [self.document_text(doc) for doc in range(len(self.documents))]
+        if stored is not None and len(stored["lengths"]) == len(texts):
+            self.index = BM25Index(stored["postings"], stored["lengths"])
+        else:
+            self.index = BM25Index.build(texts)
+        self._terms = {}
+        for (key, _), text in zip(self.documents, texts):
+            self._terms.setdefault(key, set()).update(tokenize(text))
+        self._coverage.clear()
+
+    def search(self, query: str, k: int = RESEARCH_CORPUS_TOP_K) -> List[dict]:
+        """
+        The `k` best matching documents, best first.
+        """
+        if self.index is None or not self.documents:
+            return []
+        scores = self.index.scores(tokenize(query))
+        best = np.argsort(-scores, kind="stable")[:k]
+        return [{
+            "title": self.occupations[self.documents[doc][0]]["title"],
+            "section": self.documents[doc][1],
+            "text": self.document_text(doc),
+            "score": float(scores[doc])
+        } for doc in best if scores[doc] > 0]
+
+    def recall(self, query: str) -> float:
+        """
+        Share of the query's terms, weighted by their rarity in the corpus,
+        found in the occupation of the best matching document.
+        """
+        terms = set(tokenize(query))
+        hits = self.search(query, k=1)
+        if not terms or not hits:
+            return 0.0
+        found = self._terms[normalize_title(hits[0]["title"])]
+        weights = {term: self.index.idf(term) for term in terms}
+        return (sum(weight for term, weight in weights.items()
+                    if term in found) / sum(weights.values()))
+
+    def covers(self, query: str) -> bool:
+        """
+        Whether the corpus can stand in for a web search about `query` (a
+        job title): it matches an occupation's title or alias, exactly or
+        fuzzily, or enough of its terms are found in one occupation.
+        """
+        normalized = normalize_title(query)
+        if normalized in self._aliases:
+            return True
+        if normalized not in self._coverage:
+            if len(self._coverage) >= 10000:
+                self._coverage.clear()
+            self._coverage[normalized] = bool(
+                difflib.get_close_matches(normalized,
+                                          list(self._aliases),
+                                          n=1,
+                                          cutoff=TITLE_INDEX_MATCH_CUTOFF)
+            ) or self.recall(query) >= RESEARCH_CORPUS_MIN_RECALL
+        return self._coverage[normalized]
+
+
+@functools.lru_cache(maxsize=1)
+def get_research_corpus() -> Optional[ResearchCorpus]:
+    """
+    The corpus of this process, shared by the pipeline and the registry's
+    tool (None when local research is disabled).
+    """
+    if RESEARCH_CORPUS_PATH == "none":
+        return None
+    return ResearchCorpus.load(RESEARCH_CORPUS_PATH)
+
+
+def format_hits(hits: List[dict]) -> str:
+    if not hits:
+        return "No matching occupation notes in the research corpus."
+    return "\n\n".join(hit["text"] for hit in hits)
+
+
+def create_corpus_tool(corpus: ResearchCorpus) -> Any:
+    """
+    Search tool over the corpus with the interface of any agent tool, for
+    the agents that research locally.
+    """
+    from langchain_core.tools import StructuredTool
+
+    async def search_occupation_corpus(query: str) -> str:
+        hits = corpus.search(query)
+        RESEARCH_CORPUS_SEARCHES.inc(outcome="hit" if hits else "empty")
+        return format_hits(hits)
+
+    return StructuredTool.from_function(
+        coroutine=search_occupation_corpus,
+        name="search_occupation_corpus",
+        description=(
+            "Searches researched reference notes on occupations: overview, "
+            "typical tasks, key skills, AI and automation outlook and "
+            "career paths. Query with a job title and the topic you need, "
+            "e.g. 'accountant automation outlook'."))
+
+
+async def refresh(professions: List[List[str]], path: str, force: bool,
+                  older_than_days: Optional[float],
+                  concurrency: int) -> ResearchCorpus:
+    """
+    Researches every profession missing from the corpus (all of them with
+    `force`, or also those researched more than `older_than_days` ago) and
+    saves after each one.
+    """
+    from clients import close_registry, get_registry
+    from pipeline import run_agent
+
+    corpus = ResearchCorpus.load(path)
+    get_registry()
+    semaphore = asyncio.Semaphore(concurrency)
+    cutoff = (time.time() - older_than_days * 86400
+              if older_than_days is not None else None)
+
+    def outdated(title: str) -> bool:
+        occupation = corpus.occupations.get(normalize_title(title))
+        return (force or occupation is None or
+                (cutoff is not None and occupation["created_at"] < cutoff))
+
+    async def research(title: str, aliases: List[str]) -> None:
+        async with semaphore:
+            try:
+                result = await run_agent(
+                    "research", OCCUPATION_RESEARCH_SYSTEM_PROMPT,
+                    f"Job Title: {title}\nAlso known as: "
+                    f"{', '.join(aliases)}", "OccupationResearchAgent",
+                    time.monotonic())
+            except Exception as e:
+                print(f"⚠️ Research of {title!r} failed. Error: {e}")
+                return
+        corpus.add(title, aliases,
+                   result["structured_response"].model_dump())
+        corpus.save(path)
+        print(f"✅ {title}")
+
+    try:
+        await asyncio.gather(*[
+            research(title, aliases) for title, *aliases in professions
+            if outdated(title)
+        ])
+    finally:
+        await close_registry()
+    return corpus
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--path", default=RESEARCH_CORPUS_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    refresh_parser = commands.add_parser(
+        "refresh", help="research missing or outdated professions")
+    refresh_parser.add_argument("--titles",
+                                default=PROFESSIONS_PATH,
+                                help="professions file (title | alias | ...)")
+    refresh_parser.add_argument("--top",
+                                type=int,
+                                help="only the first N titles")
+    refresh_parser.add_argument("--force",
+                                action="store_true",
+                                help="re-research every title")
+    refresh_parser.add_argument(
+        "--older-than",
+        type=float,
+        metavar="DAYS",
+        help="also re-research titles researched more than DAYS ago")
+    refresh_parser.add_argument("--concurrency", type=int, default=8)
+    search_parser = commands.add_parser("search", help="query the corpus")
+    search_parser.add_argument("query")
+    search_parser.add_argument("-k", type=int, default=RESEARCH_CORPUS_TOP_K)
+    args = parser.parse_args()
+
+    if args.command == "refresh":
+        professions = read_professions(args.titles)[:args.top]
+        corpus = asyncio.run(
+            refresh(professions, args.path, args.force, args.older_than,
+                    args.concurrency))
+        print(f"Research corpus {args.path}: {len(corpus)} professions, "
+              f"{len(corpus.documents)} documents "
+              f"(version {corpus.version})")
+        return
+
+    corpus = ResearchCorpus.load(args.path)
+    for hit in corpus.search(args.query, args.k):
+        print(f"[{hit['score']:.2f}] {hit['title']} / {hit['section']}")
+    print(f"Covered: {corpus.covers(args.query)} "
+          f"(recall {corpus.recall(args.query):.2f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from contextlib import AsyncExitStack, asynccontextmanager
+from contextvars import ContextVar
+from typing import (Any, AsyncContextManager, AsyncIterator, Awaitable,
+                    Callable, Deque, Dict, Optional, Tuple, TypeVar)
+import httpx
+from fastapi import HTTPException
+from metrics import LLM_HEDGES
+
+T = TypeVar("T")
+# Holds a slot for one model call, e.g. of the LLM scheduler.
+Slot = Callable[[], AsyncContextManager[Any]]
+
+# Deadline of one call (retries and hedges included) per pipeline stage.
+STAGE_DEADLINE_SECONDS = {
+    "decomposition":
+    float(os.getenv("DECOMPOSITION_DEADLINE_SECONDS", "120")),
+    "scoring": float(os.getenv("SCORING_DEADLINE_SECONDS", "60")),
+    "scenarios": float(os.getenv("SCENARIOS_DEADLINE_SECONDS", "90")),
+    "careers": float(os.getenv("CAREERS_DEADLINE_SECONDS", "90")),
+}
+# Budget of a whole analysis; calls never run past it.
+ANALYSIS_DEADLINE_SECONDS = float(
+    os.getenv("ANALYSIS_DEADLINE_SECONDS", "240"))
+
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.5"))
+LLM_RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", "8"))
+
+# Stages whose calls get a duplicate once they run longer than the
+# LLM_HEDGE_QUANTILE of their recent latencies (empty to disable).
+LLM_HEDGE_STAGES = {
+    stage.strip()
+    for stage in os.getenv("LLM_HEDGE_STAGES", "scoring").split(",")
+    if stage.strip()
+}
+LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))
+# Latencies a stage needs before its calls are hedged.
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+
+_transient_errors: Optional[Tuple[type, ...]] = None
+
+
+class TransientLLMError(Exception):
+    """
+    Base for errors of in-house model clients (and test doubles) that are
+    worth another attempt, like the provider's connection and 5xx errors.
+    """
+
+
+def transient_errors() -> Tuple[type, ...]:
+    """
+    Provider errors worth another attempt: connection problems and
+    timeouts, rate limits and 5xx responses. Resolved on first use, so that
+    importing this module does not import the openai SDK.
+    """
+    global _transient_errors
+    if _transient_errors is None:
+        import openai
+        _transient_errors = (httpx.TransportError, openai.APIConnectionError,
+                             openai.RateLimitError,
+                             openai.InternalServerError, TransientLLMError)
+    return _transient_errors
+
+
+class LLMUnavailable(HTTPException):
+    """
+    A call still failed after its retries, or ran out of time. Answered
+    with 503 so clients know to retry later.
+    """
+
+    def __init__(self, stage: str, reason: str):
+        super().__init__(
+            status_code=503,
+            headers={"Retry-After": "30"},
+            detail={
+                "error_code":
+                "AI_UNAVAILABLE",
+                "message":
+                "Our AI provider is not responding right now. Please try again in a moment."
+            })
+        self.stage = stage
+        self.reason = reason
+
+    def __str__(self) -> str:
+        return f"{self.stage} call failed: {self.reason}"
+
+
+class LatencyTracker:
+    """
+    Recent successful call latencies per stage, for the hedging delay.
+    """
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._latencies: Dict[str, Deque[float]] = {}
+
+    def observe(self, stage: str, seconds: float) -> None:
+        self._latencies.setdefault(stage,
+                                   deque(maxlen=self.window)).append(seconds)
+
+    def quantile(self, stage: str, q: float) -> Optional[float]:
+        latencies = self._latencies.get(stage)
+        if not latencies or len(latencies) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+latency_tracker = LatencyTracker()
+
+# Monotonic time by which the analysis in the current context must be done.
+_analysis_deadline: ContextVar[Optional[float]] = ContextVar(
+    "analysis_deadline", default=None)
+
+
+def start_deadline(seconds: float = ANALYSIS_DEADLINE_SECONDS) -> float:
+    """
+    Starts the time budget of the current analysis. Tasks created
+    afterwards inherit it through the context.
+    """
+    deadline = time.monotonic() + seconds
+    _analysis_deadline.set(deadline)
+    return deadline
+
+
+def _stage_seconds(stage: str) -> float:
+    return STAGE_DEADLINE_SECONDS.get(stage,
+                                      max(STAGE_DEADLINE_SECONDS.values()))
+
+
+def _capped(deadline: float) -> float:
+    analysis_deadline = _analysis_deadline.get()
+    if analysis_deadline is not None:
+        deadline = min(deadline, analysis_deadline)
+    return deadline
+
+
+@asynccontextmanager
+async def _no_slot() -> AsyncIterator[None]:
+    yield
+
+
+async def _in_slot(slot: Slot, attempt: Callable[[], Awaitable[T]]) -> T:
+    async with slot():
+        return await attempt()
+
+
+async def _hedged(stage: str, attempt: Callable[[], Awaitable[T]],
+                  slot: Slot, record: dict) -> T:
+    # The caller already holds the first attempt's slot, so the delay only
+    # counts the time the call has been running.
+    delay = (latency_tracker.quantile(stage, LLM_HEDGE_QUANTILE)
+             if stage in LLM_HEDGE_STAGES else None)
+    if delay is None:
+        return await attempt()
+    first = asyncio.ensure_future(attempt())
+    pending = {first}
+    try:
+        done, pending = await asyncio.wait(pending, timeout=delay)
+        if done:
+            return first.result()
+        record["hedged"] = True
+        LLM_HEDGES.inc(stage=stage, outcome="fired")
+        hedge = asyncio.ensure_future(_in_slot(slot, attempt))
+        pending.add(hedge)
+        # The first success wins; an error only counts once both failed.
+        while True:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is hedge:
+                        LLM_HEDGES.inc(stage=stage, outcome="won")
+                    return task.result()
+            if not pending:
+                return next(iter(done)).result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def resilient_call(stage: str,
+                         attempt: Callable[[], Awaitable[T]],
+                         record: dict,
+                         slot: Slot = _no_slot) -> T:
+    """
+    Runs `attempt` (one model call) in a `slot` within the stage's deadline
+    and the analysis budget, retrying transient errors with jittered
+    exponential backoff and hedging slow calls of the LLM_HEDGE_STAGES.
+    Raises LLMUnavailable once the retries or the time are used up; other
+    errors propagate unchanged.
+
+    Waiting for a slot only counts against the analysis budget: the stage
+    deadline, the hedging delay and the observed latencies leave it out,
+    so a long queue neither times calls out nor fires hedges.
+    """
+    stage_deadline: Optional[float] = None
+    retries = 0
+    while True:
+        async with AsyncExitStack() as held:
+            queued_at = time.monotonic()
+            analysis_deadline = _analysis_deadline.get()
+            try:
+                await asyncio.wait_for(
+                    held.enter_async_context(slot()),
+                    None if analysis_deadline is None else max(
+                        0, analysis_deadline - queued_at))
+            except asyncio.TimeoutError:
+                raise LLMUnavailable(stage, "deadline exceeded") from None
+            if stage_deadline is None:
+                stage_deadline = time.monotonic() + _stage_seconds(stage)
+            else:
+                stage_deadline += time.monotonic() - queued_at
+            remaining = _capped(stage_deadline) - time.monotonic()
+            if remaining <= 0:
+                raise LLMUnavailable(stage, "deadline exceeded")
+            started_at = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(
+                    _hedged(stage, attempt, slot, record), remaining)
+            except asyncio.TimeoutError:
+                raise LLMUnavailable(stage, "deadline exceeded") from None
+            except transient_errors() as e:
+                error = e
+            else:
+                latency_tracker.observe(stage,
+                                        time.perf_counter() - started_at)
+                return result
+        # Full jitter keeps retries of concurrent calls from lining up.
+        delay = random.uniform(
+            0, min(LLM_RETRY_MAX_SECONDS, LLM_RETRY_BASE_SECONDS * 2**retries))
+        if (retries >= LLM_MAX_RETRIES
+                or time.monotonic() + delay >= _capped(stage_deadline)):
+            raise LLMUnavailable(stage, str(error)) from error
+        retries += 1
+        record["retries"] = retries
+        print(f"⚠️ {stage} call failed, retry {retries}/"
+              f"{LLM_MAX_RETRIES} in {delay:.1f}s. Error: {error}")
+        await asyncio.sleep(delay)
@@ -0,0 +1,552 @@
+"""
+Workforce rollups over many stored analyses (the enterprise dashboard).
+
+Analyses are kept column-wise in NumPy arrays: one row per employee
+(job title, department, final and partial scores) and one row per scored
+task/skill (employee, item, score, weight). Titles, departments and item
+names are dictionary-encoded, so every rollup is a handful of vectorized
+group-bys (bincount, lexsort) instead of a walk over result JSON.
+
+    poetry run python rollup.py import results.jsonl
+    poetry run python rollup.py report --group-by department --top 10
+"""
+import argparse
+import contextlib
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import (Any, Callable, Dict, Iterable, Iterator, List, Optional,
+                    Tuple)
+import numpy as np
+from cache import normalize_text
+
+WORKFORCE_STORE_PATH = os.getenv("WORKFORCE_STORE_PATH", "workforce.npz")
+# Employees at or above this final score count as high risk.
+ROLLUP_HIGH_RISK_THRESHOLD = float(
+    os.getenv("ROLLUP_HIGH_RISK_THRESHOLD", "0.6"))
+# Edges of the score distribution reported per rollup.
+ROLLUP_BANDS = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+ROLLUP_PERCENTILES = (10, 25, 50, 75, 90)
+
+UNASSIGNED = "(unassigned)"
+ITEM_TYPES = ("task", "skill")
+# Rollup grouping -> employee column holding its codes.
+GROUP_COLUMNS = {"department": "department", "job_title": "title"}
+
+EMPLOYEE_COLUMNS = {
+    "title": np.int32,
+    "department": np.int32,
+    "final": np.float32,
+    "task_total": np.float32,
+    "skill_total": np.float32,
+}
+# One item table per item type; exposure = weight x score.
+ITEM_COLUMNS = {
+    "employee": np.int32,
+    "name": np.int32,
+    "score": np.float32,
+    "weight": np.float32,
+    "exposure": np.float32,
+}
+# Fields of an /analyze payload the store reads.
+RESULT_FIELDS = ("weighted_final_score", "total_task_automation",
+                 "total_skill_automation", "task_automation_breakdown",
+                 "skill_automation_breakdown")
+
+
+class _Dictionary:
+    """
+    Dictionary encoding of a string column: normalized value -> code, with
+    the first spelling seen kept for display.
+    """
+
+    def __init__(self, values: Iterable[str] = ()):
+        self.values: List[str] = []
+        self._codes: Dict[str, int] = {}
+        for value in values:
+            self.code(value)
+
+    def code(self, value: str) -> int:
+        key = normalize_text(value)
+        code = self._codes.get(key)
+        if code is None:
+            code = self._codes[key] = len(self.values)
+            self.values.append(value.strip())
+        return code
+
+    def find(self, value: str) -> Optional[int]:
+        return self._codes.get(normalize_text(value))
+
+
+class WorkforceStore:
+    """
+    Append-mostly columnar store of analysis results. Re-adding an employee
+    id replaces its earlier analysis. Appends are buffered in lists and
+    turned into arrays on the next query.
+
+    Several processes may share one file: saving and reloading happen under
+    a file lock, and both first merge what other processes saved with the
+    adds of this one that are not saved yet.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.titles = _Dictionary()
+        self.departments = _Dictionary()
+        self.items = _Dictionary()
+        self.employee_ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._employees = {name: np.empty(0, dtype) for name, dtype in
+                           EMPLOYEE_COLUMNS.items()}
+        self._items = {
+            item_type: {
+                name: np.empty(0, dtype)
+                for name, dtype in ITEM_COLUMNS.items()
+            }
+            for item_type in ITEM_TYPES
+        }
+        self._replaced = np.zeros(0, dtype=bool)
+        self._pending_employees: List[tuple] = []
+        self._pending_items: Dict[str, List[tuple]] = {
+            item_type: []
+            for item_type in ITEM_TYPES
+        }
+        self._pending_replaced: List[int] = []
+        # Adds since the last save, replayed on top of a reloaded file.
+        self._unsaved: List[tuple] = []
+        self._lock = threading.Lock()
+        # (inode, mtime) of the file as last loaded or saved.
+        self._loaded_stat: Optional[Tuple[int, int]] = None
+        # Bumped on every change; rollups are memoized per version.
+        self.version = 0
+        self._memo: Dict[tuple, dict] = {}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, employee_id: str, job_title: str,
+            department: Optional[str], result: dict) -> None:
+        """
+        Adds one /analyze payload (only its score breakdowns are kept).
+        """
+        result = {name: result[name] for name in RESULT_FIELDS}
+        with self._lock:
+            self._unsaved.append(
+                (employee_id, job_title, department, result))
+            self._add(employee_id, job_title, department, result)
+
+    def _add(self, employee_id: str, job_title: str,
+             department: Optional[str], result: dict) -> None:
+        self.version += 1
+        row = len(self.employee_ids)
+        previous = self._rows.get(employee_id)
+        if previous is not None:
+            self._pending_replaced.append(previous)
+        self._rows[employee_id] = row
+        self.employee_ids.append(employee_id)
+        self._pending_employees.append(
+            (self.titles.code(job_title),
+             self.departments.code(department or UNASSIGNED),
+             result["weighted_final_score"],
+             result["total_task_automation"],
+             result["total_skill_automation"]))
+        for item_type, breakdown, weight in (
+            ("task", result["task_automation_breakdown"], "time_share"),
+            ("skill", result["skill_automation_breakdown"], "importance")):
+            pending = self._pending_items[item_type]
+            for name, entry in breakdown.items():
+                pending.append((row, self.items.code(name), entry["score"],
+                                entry[weight],
+                                entry["score"] * entry[weight]))
+
+    def add_record(self, record: dict) -> bool:
+        """
+        Adds a batch output record (id, job_title, department, result).
+        Returns False for failed rows, which are skipped.
+        """
+        if record.get("status") != "ok" or not record.get("result"):
+            return False
+        self.add(str(record["id"]), record.get("job_title") or "",
+                 record.get("department"), record["result"])
+        return True
+
+    def _flush(self) -> None:
+        if self._pending_employees:
+            columns = list(zip(*self._pending_employees))
+            for (name, dtype), values in zip(EMPLOYEE_COLUMNS.items(),
+                                             columns):
+                self._employees[name] = np.concatenate(
+                    [self._employees[name],
+                     np.asarray(values, dtype=dtype)])
+            self._replaced = np.concatenate([
+                self._replaced,
+                np.zeros(len(self._pending_employees), dtype=bool)
+            ])
+            self._pending_employees = []
+        for item_type, pending in self._pending_items.items():
+            if not pending:
+                continue
+            items = self._items[item_type]
+            for (name, dtype), values in zip(ITEM_COLUMNS.items(),
+                                             zip(*pending)):
+                items[name] = np.concatenate(
+                    [items[name], np.asarray(values, dtype=dtype)])
+            self._pending_items[item_type] = []
+        if self._pending_replaced:
+            self._replaced[self._pending_replaced] = True
+            self._pending_replaced = []
+
+    def columns(
+        self
+    ) -> Tuple[Dict[str, np.ndarray], Dict[str, Dict[str, np.ndarray]],
+               np.ndarray]:
+        """
+        (employee columns, item columns per item type, mask of the current
+        employee rows).
+        """
+        with self._lock:
+            self._flush()
+            return self._employees, self._items, ~self._replaced
+
+    def memoized(self, key: tuple, compute: Callable[[], dict]) -> dict:
+        """
+        Result of `compute` for `key`, computed once per store version.
+        """
+        version = self.version
+        if self._memo and next(iter(self._memo))[0] != version:
+            self._memo = {}
+        if (version, *key) not in self._memo:
+            self._memo[(version, *key)] = compute()
+        return self._memo[(version, *key)]
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    @contextlib.contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        with open(self.path + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def save(self) -> None:
+        """
+        Merges the file (if another process saved since it was loaded) with
+        the unsaved adds and writes the result back, atomically.
+        """
+        with self._file_lock():
+            stat = self._stat()
+            with self._lock:
+                if stat is not None and stat != self._loaded_stat:
+                    self._reload()
+                self._flush()
+                saved = len(self._unsaved)
+                arrays = {
+                    **{f"employee_{name}": values
+                       for name, values in self._employees.items()},
+                    **{
+                        f"{item_type}_{name}": values
+                        for item_type, columns in self._items.items()
+                        for name, values in columns.items()
+                    },
+                    "replaced": self._replaced,
+                    "employee_ids": np.asarray(self.employee_ids, dtype=str),
+                    "titles": np.asarray(self.titles.values, dtype=str),
+                    "departments": np.asarray(self.departments.values,
+                                              dtype=str),
+                    "items": np.asarray(self.items.values, dtype=str),
+                }
+            directory = os.path.dirname(os.path.abspath(self.path))
+            with tempfile.NamedTemporaryFile(dir=directory,
+                                             suffix=".npz",
+                                             delete=False) as file:
+                np.savez(file, **arrays)
+            os.replace(file.name, self.path)
+            with self._lock:
+                # Adds made while writing stay unsaved.
+                del self._unsaved[:saved]
+                self._loaded_stat = self._stat()
+
+    def _reload(self) -> None:
+        """
+        Loads the file and replays the unsaved adds on top of it.
+        """
+        with np.load(self.path) as data:
+            self.titles = _Dictionary(data["titles"].tolist())
+            self.departments = _Dictionary(data["departments"].tolist())
+            self.items = _Dictionary(data["items"].tolist())
+            self.employee_ids = data["employee_ids"].tolist()
+            self._employees = {
+                name: data[f"employee_{name}"]
+                for name in EMPLOYEE_COLUMNS
+            }
+            self._items = {
+                item_type: {
+                    name: data[f"{item_type}_{name}"]
+                    for name in ITEM_COLUMNS
+                }
+                for item_type in ITEM_TYPES
+            }
+            self._replaced = data["replaced"]
+        self._rows = {
+            employee_id: row
+            for row, employee_id in enumerate(self.employee_ids)
+            if not self._replaced[row]
+        }
+        self._pending_employees = []
+        self._pending_items = {item_type: [] for item_type in ITEM_TYPES}
+        self._pending_replaced = []
+        self.version += 1
+        for add in self._unsaved:
+            self._add(*add)
+
+    def refresh(self) -> None:
+        """
+        Reloads the file if another process saved a newer version, keeping
+        the adds of this process that are not saved yet.
+        """
+        if self.path is None or self._stat() in (None, self._loaded_stat):
+            return
+        with self._file_lock():
+            stat = self._stat()
+            with self._lock:
+                self._reload()
+                self._loaded_stat = stat
+
+
+def _group_percentiles(codes: np.ndarray, values: np.ndarray,
+                       groups: int) -> np.ndarray:
+    """
+    (groups x ROLLUP_PERCENTILES) matrix of per-group percentiles with
+    linear interpolation, from one sort; NaN for empty groups. Values must
+    lie in [0, 1].
+    """
+    counts = np.bincount(codes, minlength=groups)
+    # Sorting code * 2 + value orders by group, then value, in one pass.
+    keys = np.sort(codes * 2.0 + values)
+    ordered = keys - 2.0 * np.floor(keys / 2.0)
+    starts = np.cumsum(counts) - counts
+    positions = np.outer(np.maximum(counts - 1, 0),
+                         np.asarray(ROLLUP_PERCENTILES) / 100)
+    lower = np.floor(positions).astype(np.int64)
+    upper = np.ceil(positions).astype(np.int64)
+    result = np.full(positions.shape, np.nan)
+    present = counts > 0
+    low_values = ordered[np.minimum(starts[:, None] + lower,
+                                    len(ordered) - 1)]
+    high_values = ordered[np.minimum(starts[:, None] + upper,
+                                     len(ordered) - 1)]
+    interpolated = low_values + (high_values - low_values) * (positions -
+                                                              lower)
+    result[present] = interpolated[present]
+    return result
+
+
+BAND_NAMES = [
+    f"{low:.1f}-{high:.1f}" for low, high in zip(ROLLUP_BANDS, ROLLUP_BANDS[1:])
+]
+
+
+def _bands(scores: np.ndarray) -> np.ndarray:
+    """
+    Index of each score's ROLLUP_BANDS interval (the top edge included).
+    """
+    return np.searchsorted(np.asarray(ROLLUP_BANDS[1:-1]),
+                           scores,
+                           side="right")
+
+
+def _round(value: Any) -> Optional[float]:
+    return None if np.isnan(value) else round(float(value), 4)
+
+
+def rollup(store: WorkforceStore,
+           group_by: str = "department",
+           department: Optional[str] = None,
+           item_type: str = "task",
+           top: int = 10) -> dict:
+    """
+    Org-level exposure, per-group (department or job title) distributions
+    and percentile bands, and the `top` items with the most exposure:
+    the sum over employees of weight (time share or importance) x score,
+    i.e. the FTE-equivalents of work at risk for tasks. Memoized until the
+    store changes.
+    """
+    return store.memoized(
+        (group_by, department, item_type, top),
+        lambda: _rollup(store, group_by, department, item_type, top))
+
+
+def _rollup(store: WorkforceStore, group_by: str, department: Optional[str],
+            item_type: str, top: int) -> dict:
+    employees, items, mask = store.columns()
+    if department is not None:
+        code = store.departments.find(department)
+        mask = mask & (employees["department"] == (-1 if code is None else
+                                                   code))
+    scores = employees["final"][mask]
+    if not len(scores):
+        return {"employees": 0, "groups": [], "top_items": []}
+
+    high_risk = scores >= ROLLUP_HIGH_RISK_THRESHOLD
+    bands = _bands(scores)
+    percentiles = np.percentile(scores, ROLLUP_PERCENTILES)
+    org = {
+        "employees": int(len(scores)),
+        "mean_exposure": _round(scores.mean()),
+        "mean_task_exposure": _round(employees["task_total"][mask].mean()),
+        "mean_skill_exposure": _round(employees["skill_total"][mask].mean()),
+        "high_risk_share": _round(high_risk.mean()),
+        "percentiles": {
+            f"p{p}": _round(value)
+            for p, value in zip(ROLLUP_PERCENTILES, percentiles)
+        },
+        "distribution": dict(
+            zip(BAND_NAMES,
+                np.bincount(bands, minlength=len(BAND_NAMES)).tolist()))
+    }
+
+    # Group-by: one bincount per statistic over the dictionary codes.
+    labels = (store.departments
+              if group_by == "department" else store.titles)
+    codes = employees[GROUP_COLUMNS[group_by]][mask]
+    groups = len(labels.values)
+    counts = np.bincount(codes, minlength=groups)
+    sums = np.bincount(codes, weights=scores, minlength=groups)
+    high = np.bincount(codes, weights=high_risk, minlength=groups)
+    group_percentiles = _group_percentiles(codes, scores, groups)
+    # (group, band) counts from one bincount over the combined index.
+    group_bands = np.bincount(codes * len(BAND_NAMES) + bands,
+                              minlength=groups * len(BAND_NAMES)).reshape(
+                                  groups, len(BAND_NAMES))
+    present = np.flatnonzero(counts)
+    present = present[np.argsort(-sums[present] / counts[present],
+                                 kind="stable")]
+    group_rows = [{
+        group_by: labels.values[code],
+        "employees": int(counts[code]),
+        "mean_exposure": _round(sums[code] / counts[code]),
+        "high_risk_share": _round(high[code] / counts[code]),
+        "percentiles": {
+            f"p{p}": _round(value)
+            for p, value in zip(ROLLUP_PERCENTILES, group_percentiles[code])
+        },
+        "distribution": dict(zip(BAND_NAMES, group_bands[code].tolist()))
+    } for code in present]
+
+    # Items of the selected employees only.
+    items = items[item_type]
+    names, item_scores, item_exposure = (items["name"], items["score"],
+                                         items["exposure"])
+    if not mask.all():
+        selected = mask[items["employee"]]
+        names, item_scores, item_exposure = (names[selected],
+                                             item_scores[selected],
+                                             item_exposure[selected])
+    names_total = len(store.items.values)
+    exposure = np.bincount(names, weights=item_exposure,
+                           minlength=names_total)
+    item_counts = np.bincount(names, minlength=names_total)
+    score_sums = np.bincount(names, weights=item_scores, minlength=names_total)
+    ranked = np.flatnonzero(item_counts)
+    if len(ranked) > top:
+        ranked = ranked[np.argpartition(-exposure[ranked], top - 1)[:top]]
+    ranked = ranked[np.argsort(-exposure[ranked], kind="stable")]
+    top_items = [{
+        "name": store.items.values[code],
+        "employees": int(item_counts[code]),
+        "mean_score": _round(score_sums[code] / item_counts[code]),
+        "exposure": _round(exposure[code])
+    } for code in ranked]
+
+    return {
+        **org, "group_by": group_by,
+        "groups": group_rows,
+        "item_type": item_type,
+        "top_items": top_items
+    }
+
+
+def import_records(store: WorkforceStore, lines: Iterable[str]) -> dict:
+    """
+    Adds the records of a batch output (JSONL) to the store.
+    """
+    counts = {"imported": 0, "skipped": 0}
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            counts["skipped"] += 1
+            continue
+        if not isinstance(record, dict):
+            counts["skipped"] += 1
+            continue
+        if "summary" in record:
+            continue
+        counts["imported" if store.add_record(record) else "skipped"] += 1
+    return counts
+
+
+def create_workforce_store_from_env() -> Optional[WorkforceStore]:
+    """
+    The store at WORKFORCE_STORE_PATH, loaded if the file exists. Returns
+    None when WORKFORCE_STORE_PATH is "none".
+    """
+    if WORKFORCE_STORE_PATH == "none":
+        return None
+    store = WorkforceStore(WORKFORCE_STORE_PATH)
+    store.refresh()
+    return store
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--store", default=WORKFORCE_STORE_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_parser = commands.add_parser(
+        "import", help="add batch.py output files to the store")
+    import_parser.add_argument("inputs", nargs="+")
+    report_parser = commands.add_parser("report", help="print a rollup")
+    report_parser.add_argument("--group-by",
+                               choices=["department", "job_title"],
+                               default="department")
+    report_parser.add_argument("--department")
+    report_parser.add_argument("--item-type",
+                               choices=ITEM_TYPES,
+                               default="task")
+    report_parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    store = WorkforceStore(args.store)
+    store.refresh()
+    if args.command == "import":
+        for path in args.inputs:
+            with open(path, encoding="utf-8") as file:
+                counts = import_records(store, file)
+            print(f"{path}: {counts['imported']} imported, "
+                  f"{counts['skipped']} skipped")
+        store.save()
+        print(f"Saved {len(store)} employees to {args.store}")
+        return
+
+    started_at = time.perf_counter()
+    report = rollup(store, args.group_by, args.department, args.item_type,
+                    args.top)
+    report["elapsed_ms"] = round((time.perf_counter() - started_at) * 1000,
+                                 3)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, List, Optional
+from shared_state import SHARED_STATE_BACKEND, get_shared_client
+
+
+class SchedulerOverloaded(Exception):
+    """
+    Raised when a new analysis cannot be admitted; callers should answer
+    429 with the suggested Retry-After.
+    """
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"LLM scheduler overloaded, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Classic token bucket refilled continuously at `rate_per_minute`.
+    A rate of 0 disables the limit.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: Optional[float] = None):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = burst if burst is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity,
+            self.tokens + (now - self.updated_at) * self.rate_per_second)
+        self.updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """
+        Seconds until `amount` tokens are available (0 if available now).
+        """
+        if self.rate_per_second <= 0:
+            return 0.0
+        self._refill()
+        # Requests larger than the bucket are let through once it is full.
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate_per_second
+
+    def consume(self, amount: float) -> None:
+        if self.rate_per_second > 0:
+            self.tokens -= min(amount, self.capacity)
+
+
+class SharedRateLimiter:
+    """
+    Requests/min and tokens/min budgets shared by all workers, counted in
+    fixed one-minute windows on a Redis-compatible client (redis-py or the
+    shared state socket client). A reservation that would exceed a budget
+    is rolled back and the caller waits for the next window.
+    """
+
+    def __init__(self,
+                 client: Any,
+                 requests_per_minute: float = 0,
+                 tokens_per_minute: float = 0,
+                 prefix: str = "willaireplaceyou:rate:"):
+        self.client = client
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.prefix = prefix
+
+    async def reserve(self, tokens: float) -> float:
+        """
+        Charges one request and `tokens` to the current window. Returns 0
+        if they fit, else the seconds until the next window (nothing is
+        charged then).
+        """
+        now = time.time()
+        window = int(now // 60)
+        charged = []
+        for name, limit, amount in (("requests", self.requests_per_minute,
+                                     1), ("tokens", self.tokens_per_minute,
+                                          math.ceil(tokens))):
+            if limit <= 0 or amount <= 0:
+                continue
+            key = f"{self.prefix}{name}:{window}"
+            total = await self.client.incrby(key, amount)
+            if total == amount:
+                await self.client.expire(key, 120)
+            # Requests larger than the budget go through in an empty window.
+            if total > limit and total != amount:
+                for charged_key, charged_amount in charged + [(key, amount)]:
+                    await self.client.incrby(charged_key, -charged_amount)
+                return (window + 1) * 60 - now
+            charged.append((key, amount))
+        return 0.0
+
+
+class LLMScheduler:
+    """
+    Process-wide admission control for outbound LLM calls.
+
+    Calls wait in a priority queue until a concurrency slot is free and the
+    requests/min and tokens/min buckets allow them. Lower priority values go
+    first; the pipeline uses the start time of its analysis, so calls of
+    profiles already in flight overtake the first calls of new profiles.
+
+    With a `shared_limiter` the budgets are also enforced across workers:
+    the head of the queue reserves its share there before it is let
+    through, one reservation at a time.
+    """
+
+    def __init__(self,
+                 max_concurrency: int,
+                 requests_per_minute: float = 0,
+                 tokens_per_minute: float = 0,
+                 max_queued: int = 0,
+                 shared_limiter: Optional[SharedRateLimiter] = None):
+        self.max_concurrency = max_concurrency
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_queued = max_queued
+        self.shared_limiter = shared_limiter
+        self.active = 0
+        self._waiters: List[list] = []
+        self._sequence = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._reserving: Optional[asyncio.Task] = None
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for entry in self._waiters if not entry[3].done())
+
+    def retry_after(self) -> float:
+        """
+        Rough number of seconds until the current backlog has drained.
+        """
+        rate = self.request_bucket.rate_per_second
+        if rate <= 0:
+            return 5.0
+        return max(1.0, round(self.queued / rate, 1))
+
+    def admit(self) -> None:
+        """
+        Called before starting a new analysis. Sheds load once the backlog of
+        waiting calls exceeds `max_queued`; calls of analyses already running
+        are never rejected.
+        """
+        if self.max_queued and self.queued >= self.max_queued:
+            raise SchedulerOverloaded(self.retry_after())
+
+    def _dispatch(self) -> None:
+        self._timer = None
+        while self._waiters and self.active < self.max_concurrency:
+            if self._reserving is not None:
+                return
+            priority, _, tokens, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            wait = max(self.request_bucket.wait_time(1),
+                       self.token_bucket.wait_time(tokens))
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(
+                    wait, self._dispatch)
+                return
+            if self.shared_limiter is not None:
+                self._reserving = asyncio.ensure_future(self._reserve(tokens))
+                return
+            self._grant(tokens)
+
+    def _grant(self, tokens: float) -> None:
+        """
+        Lets the first waiter that is still waiting through.
+        """
+        while self._waiters:
+            future = heapq.heappop(self._waiters)[3]
+            if future.done():
+                continue
+            self.request_bucket.consume(1)
+            self.token_bucket.consume(tokens)
+            self.active += 1
+            future.set_result(None)
+            return
+
+    async def _reserve(self, tokens: float) -> None:
+        try:
+            wait = await self.shared_limiter.reserve(tokens)
+        except Exception as e:
+            # Local buckets still apply; the store must not stall all calls.
+            print(f"⚠️ Shared rate limit check failed: {e}")
+            wait = 0.0
+        self._reserving = None
+        if wait > 0:
+            self._timer = asyncio.get_running_loop().call_later(
+                wait, self._dispatch)
+            return
+        self._grant(tokens)
+        if self._timer is None:
+            self._dispatch()
+
+    def _release(self) -> None:
+        self.active -= 1
+        if self._timer is None:
+            self._dispatch()
+
+    async def acquire(self, priority: float, tokens: float = 0) -> None:
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters,
+                       [priority, next(self._sequence), tokens, future])
+        if self._timer is None:
+            self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was granted just before we got cancelled.
+                self._release()
+            else:
+                future.cancel()
+            raise
+
+    @asynccontextmanager
+    async def slot(self, priority: float, tokens: float = 0):
+        await self.acquire(priority, tokens)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def snapshot(self) -> dict:
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "max_concurrency": self.max_concurrency
+        }
+
+
+def estimate_tokens(*texts: str, output_tokens: int = 0) -> int:
+    """
+    Cheap token estimate (~4 characters per token) used for the tokens/min
+    budget before the real usage is known.
+    """
+    return sum(len(text) for text in texts) // 4 + output_tokens
+
+
+def create_scheduler_from_env() -> LLMScheduler:
+    requests_per_minute = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+    tokens_per_minute = float(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+    # "shared": the budgets hold for all workers together (needs a
+    # SHARED_STATE_BACKEND); "local": each worker gets the full budget.
+    rate_limit_scope = os.getenv(
+        "LLM_RATE_LIMIT_SCOPE",
+        "shared" if SHARED_STATE_BACKEND != "none" else "local")
+    shared_limiter = None
+    if rate_limit_scope == "shared" and (requests_per_minute
+                                         or tokens_per_minute):
+        shared_limiter = SharedRateLimiter(get_shared_client(),
+                                           requests_per_minute,
+                                           tokens_per_minute)
+    return LLMScheduler(
+        max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "64")),
+        requests_per_minute=requests_per_minute,
+        tokens_per_minute=tokens_per_minute,
+        max_queued=int(os.getenv("LLM_MAX_QUEUED", "1000")),
+        shared_limiter=shared_limiter)
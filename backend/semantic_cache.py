@@ -0,0 +1,196 @@
+import os
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Protocol, Tuple
+import numpy as np
+from clients import aget_registry
+from metrics import SEMANTIC_CACHE_LOOKUPS, span
+
+# Minimum cosine similarity for reusing a near-duplicate's entry.
+SEMANTIC_CACHE_RESULT_THRESHOLD = float(
+    os.getenv("SEMANTIC_CACHE_RESULT_THRESHOLD", "0.97"))
+SEMANTIC_CACHE_DECOMPOSITION_THRESHOLD = float(
+    os.getenv("SEMANTIC_CACHE_DECOMPOSITION_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_ITEM_THRESHOLD = float(
+    os.getenv("SEMANTIC_CACHE_ITEM_THRESHOLD", "0.92"))
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class VectorIndex(Protocol):
+    """
+    Nearest-neighbour index over unit vectors. `search` returns, for every
+    query row, the best cosine similarity and that entry's payload.
+    """
+
+    def add(self, vectors: np.ndarray, payloads: List[Any]) -> None:
+        ...
+
+    def search(self,
+               queries: np.ndarray) -> Tuple[np.ndarray, List[Optional[Any]]]:
+        ...
+
+
+class NumpyVectorIndex:
+    """
+    Brute-force index: one float32 matrix, searched with a single
+    matrix product per lookup. Once `max_entries` is reached the oldest
+    entries are overwritten.
+    """
+
+    def __init__(self, max_entries: int = 50000):
+        self.max_entries = max_entries
+        self._vectors: Optional[np.ndarray] = None
+        self._payloads: List[Any] = []
+        self._next = 0
+
+    def __len__(self) -> int:
+        return len(self._payloads)
+
+    def add(self, vectors: np.ndarray, payloads: List[Any]) -> None:
+        vectors = _normalize_rows(np.asarray(vectors, dtype=np.float32))
+        if self._vectors is None:
+            self._vectors = np.empty((min(1024, self.max_entries),
+                                      vectors.shape[1]),
+                                     dtype=np.float32)
+        for vector, payload in zip(vectors, payloads):
+            capacity = len(self._vectors)
+            if self._next >= capacity and capacity < self.max_entries:
+                grown = np.empty(
+                    (min(capacity * 2, self.max_entries), vectors.shape[1]),
+                    dtype=np.float32)
+                grown[:capacity] = self._vectors
+                self._vectors = grown
+            index = self._next % self.max_entries
+            self._vectors[index] = vector
+            if index < len(self._payloads):
+                self._payloads[index] = payload
+            else:
+                self._payloads.append(payload)
+            self._next = index + 1
+
+    def search(self,
+               queries: np.ndarray) -> Tuple[np.ndarray, List[Optional[Any]]]:
+        queries = _normalize_rows(np.asarray(queries, dtype=np.float32))
+        if not self._payloads:
+            return (np.zeros(len(queries), dtype=np.float32),
+                    [None] * len(queries))
+        # (queries x entries) cosine similarities in one product.
+        similarities = queries @ self._vectors[:len(self._payloads)].T
+        best = similarities.argmax(axis=1)
+        return similarities[np.arange(len(queries)), best], [
+            self._payloads[i] for i in best
+        ]
+
+
+INDEX_BACKENDS = {"numpy": NumpyVectorIndex}
+
+
+class SemanticCache:
+    """
+    Near-duplicate lookup on top of the exact caches: texts are embedded
+    and matched against earlier entries of the same namespace by cosine
+    similarity. Entries live in this worker's memory only.
+    """
+
+    def __init__(self,
+                 index_backend: str = "numpy",
+                 max_entries: int = 50000,
+                 embedding_memo: int = 4096):
+        self.index_backend = INDEX_BACKENDS[index_backend]
+        self.max_entries = max_entries
+        self.embedding_memo = embedding_memo
+        self._indexes: Dict[str, VectorIndex] = {}
+        # Recent text -> vector, so storing right after a lookup does not
+        # embed the same text twice.
+        self._embeddings: "OrderedDict[str, np.ndarray]" = OrderedDict()
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        embedded = {
+            text: self._embeddings[text]
+            for text in texts if text in self._embeddings
+        }
+        missing = list(dict.fromkeys(text for text in texts
+                                     if text not in embedded))
+        if missing:
+            with span("embedding", texts=len(missing)):
+                registry = await aget_registry()
+                vectors = await registry.embeddings.aembed_documents(missing)
+            for text, vector in zip(missing, vectors):
+                embedded[text] = np.asarray(vector, dtype=np.float32)
+        for text in texts:
+            self._embeddings[text] = embedded[text]
+            self._embeddings.move_to_end(text)
+        while len(self._embeddings) > self.embedding_memo:
+            self._embeddings.popitem(last=False)
+        return np.stack([embedded[text] for text in texts])
+
+    async def lookup(self, namespace: str, texts: List[str],
+                     threshold: float) -> List[Optional[Any]]:
+        """
+        Payload of the most similar earlier entry for every text, or None
+        where nothing reaches `threshold`.
+        """
+        index = self._indexes.get(namespace)
+        if index is None or not texts:
+            SEMANTIC_CACHE_LOOKUPS.inc(len(texts),
+                                       namespace=namespace,
+                                       outcome="miss")
+            return [None] * len(texts)
+        try:
+            vectors = await self.embed(texts)
+        except Exception as e:
+            print(f"⚠️ Semantic cache lookup failed: {e}")
+            SEMANTIC_CACHE_LOOKUPS.inc(len(texts),
+                                       namespace=namespace,
+                                       outcome="error")
+            return [None] * len(texts)
+        similarities, payloads = index.search(vectors)
+        results = [
+            payload if similarity >= threshold else None
+            for similarity, payload in zip(similarities, payloads)
+        ]
+        hits = sum(result is not None for result in results)
+        SEMANTIC_CACHE_LOOKUPS.inc(hits, namespace=namespace, outcome="hit")
+        SEMANTIC_CACHE_LOOKUPS.inc(len(texts) - hits,
+                                   namespace=namespace,
+                                   outcome="miss")
+        return results
+
+    async def store(self, namespace: str, texts: List[str],
+                    payloads: List[Any]) -> None:
+        if not texts:
+            return
+        index = self._indexes.get(namespace)
+        if index is None:
+            index = self._indexes[namespace] = self.index_backend(
+                self.max_entries)
+        try:
+            vectors = await self.embed(texts)
+        except Exception as e:
+            print(f"⚠️ Semantic cache write failed: {e}")
+            return
+        # Skip texts that are already in the index.
+        similarities, _ = index.search(vectors)
+        new = similarities < 0.9999
+        if new.any():
+            index.add(vectors[new], [
+                payload for payload, is_new in zip(payloads, new) if is_new
+            ])
+
+    def snapshot(self) -> dict:
+        return {
+            namespace: len(index)
+            for namespace, index in self._indexes.items()
+        }
+
+
+def create_semantic_cache_from_env() -> Optional[SemanticCache]:
+    backend = os.getenv("SEMANTIC_CACHE_BACKEND", "none")
+    if backend == "none":
+        return None
+    return SemanticCache(
+        index_backend=backend,
+        max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "50000")))
@@ -0,0 +1,95 @@
+import gzip
+import os
+from typing import Any, Mapping, Optional
+import orjson
+from pydantic import BaseModel
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+# "on": compress JSON responses for clients that accept it; "off": never.
+RESPONSE_COMPRESSION = os.getenv("RESPONSE_COMPRESSION", "on")
+# Smaller bodies are sent as is; compressing them gains next to nothing.
+RESPONSE_COMPRESSION_MIN_BYTES = int(
+    os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(value: Any) -> bytes:
+    """
+    Compact JSON (UTF-8, no indentation) of plain data and Pydantic models.
+    """
+    return orjson.dumps(value, default=_default)
+
+
+def to_jsonable(value: Any) -> Any:
+    """
+    Plain JSON types for an analysis payload; a faster stand-in for
+    jsonable_encoder on dicts, lists and Pydantic models.
+    """
+    return orjson.loads(dumps(value))
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Best content encoding we support that the Accept-Encoding header
+    allows: brotli (when installed), then gzip, else None.
+    """
+    weights = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        if weights.get(encoding, weights.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class FastJSONResponse(Response):
+    """
+    JSON response encoded with orjson. Given the request's Accept-Encoding,
+    bodies of at least RESPONSE_COMPRESSION_MIN_BYTES are compressed with
+    the best encoding the client accepts.
+    """
+    media_type = "application/json"
+
+    def __init__(self,
+                 content: Any,
+                 status_code: int = 200,
+                 headers: Optional[Mapping[str, str]] = None,
+                 accept_encoding: Optional[str] = None,
+                 **kwargs: Any):
+        body = dumps(content)
+        headers = dict(headers or {})
+        if RESPONSE_COMPRESSION == "on" and accept_encoding is not None:
+            headers["Vary"] = "Accept-Encoding"
+            encoding = negotiate_encoding(accept_encoding)
+            if encoding and len(body) >= RESPONSE_COMPRESSION_MIN_BYTES:
+                body = compress(body, encoding)
+                headers["Content-Encoding"] = encoding
+        super().__init__(body, status_code, headers, **kwargs)
@@ -0,0 +1,148 @@
+"""
+Pre-forking launcher for the API.
+
+`uvicorn --workers N` spawns every worker as a fresh interpreter that
+imports FastAPI, the model SDKs and NumPy on its own. This launcher imports
+those libraries once in a parent process and forks the workers from it, so
+workers (including those restarted after a crash) start with them already
+in memory and only import the app itself:
+
+    poetry run python serve.py --host 0.0.0.0 --port 8000 --workers 8
+
+The parent never imports the app: the app's modules open SQLite files,
+sockets and caches at import, which must not be shared between workers.
+"""
+import argparse
+import importlib
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+from typing import Dict
+
+# Libraries imported before forking. Only third-party code without open
+# connections or threads at import time belongs here.
+PRELOAD_MODULES = (
+    "fastapi",
+    "fastapi.openapi.models",
+    "pydantic",
+    "httpx",
+    "numpy",
+    "openai",
+    "langchain_core.messages",
+    "langchain_openai",
+    "langchain.agents",
+    "langchain.agents.structured_output",
+    "uvicorn",
+)
+
+SERVE_WORKERS = int(os.getenv("SERVE_WORKERS", "8"))
+# A worker that exits sooner than this after its start is restarted only
+# after a pause, so a worker that cannot start does not fork in a loop.
+SERVE_MIN_WORKER_LIFETIME_SECONDS = 5.0
+
+
+def preload() -> float:
+    started_at = time.perf_counter()
+    for name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            print(f"⚠️ Not preloading {name}. Error: {e}")
+    return time.perf_counter() - started_at
+
+
+def bind(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock: socket.socket, args: argparse.Namespace) -> None:
+    import uvicorn
+
+    # The parent's handlers forward signals to the workers; uvicorn
+    # installs its own for a graceful shutdown.
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    config = uvicorn.Config("main:app",
+                            log_level=args.log_level,
+                            backlog=args.backlog)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def spawn(sock: socket.socket, args: argparse.Namespace) -> int:
+    # Unflushed output would otherwise be written again by the worker.
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(sock, args)
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=SERVE_WORKERS)
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    seconds = preload()
+    print(f"📚 Preloaded {len(PRELOAD_MODULES)} modules in {seconds:.2f} s")
+    sock = bind(args.host, args.port, args.backlog)
+    print(f"🚀 Forking {args.workers} workers on {args.host}:{args.port}")
+
+    # Worker pid -> start time.
+    workers: Dict[int, float] = {}
+    stopping = False
+
+    def stop(signum: int, _: object) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(args.workers):
+        workers[spawn(sock, args)] = time.monotonic()
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started_at = workers.pop(pid, None)
+        if stopping or started_at is None:
+            continue
+        print(f"⚠️ Worker {pid} exited with code "
+              f"{os.waitstatus_to_exitcode(status)}, restarting it.")
+        if time.monotonic() - started_at < SERVE_MIN_WORKER_LIFETIME_SECONDS:
+            time.sleep(1)
+        if not stopping:
+            workers[spawn(sock, args)] = time.monotonic()
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
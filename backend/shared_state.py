@@ -0,0 +1,330 @@
+"""
+State shared by all uvicorn workers of a host: caches, job records and
+rate-limit counters.
+
+`SHARED_STATE_BACKEND=socket` runs a tiny key/value server on a local Unix
+socket that speaks the subset of the Redis protocol (RESP) those users
+need: PING, GET, SET [EX], DEL, INCRBY and EXPIRE. The first worker that
+cannot connect starts it; it can also be run on its own:
+
+    poetry run python shared_state.py --socket /tmp/willaireplaceyou.sock
+
+`SHARED_STATE_BACKEND=redis` sends the same commands to REDIS_URL instead.
+"""
+import argparse
+import asyncio
+import fcntl
+import os
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# "none" (every worker keeps its own state), "socket" or "redis".
+SHARED_STATE_BACKEND = os.getenv("SHARED_STATE_BACKEND", "none")
+SHARED_STATE_SOCKET = os.getenv("SHARED_STATE_SOCKET",
+                                "/tmp/willaireplaceyou.sock")
+# Start the socket server from a worker when none is listening.
+SHARED_STATE_AUTOSTART = os.getenv("SHARED_STATE_AUTOSTART", "on")
+SHARED_STATE_MAX_KEYS = int(os.getenv("SHARED_STATE_MAX_KEYS", "200000"))
+SHARED_STATE_POOL_SIZE = int(os.getenv("SHARED_STATE_POOL_SIZE", "8"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+
+class SharedStateError(Exception):
+    """
+    Error reply of the shared state server.
+    """
+
+
+def _encode_command(args: Tuple[Any, ...]) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode("utf-8")
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+def _encode_reply(value: Any) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, SharedStateError):
+        return b"-ERR %s\r\n" % str(value).encode("utf-8")
+    if isinstance(value, bool):
+        return b":%d\r\n" % int(value)
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, str):
+        return b"+%s\r\n" % value.encode("utf-8")
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+async def _read_reply(reader: asyncio.StreamReader) -> Any:
+    line = await reader.readuntil(b"\r\n")
+    kind, payload = line[:1], line[1:-2]
+    if kind == b"+":
+        return payload.decode("utf-8")
+    if kind == b"-":
+        raise SharedStateError(payload.decode("utf-8"))
+    if kind == b":":
+        return int(payload)
+    if kind == b"$":
+        length = int(payload)
+        if length < 0:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if kind == b"*":
+        return [await _read_reply(reader) for _ in range(int(payload))]
+    raise SharedStateError(f"unexpected reply {line!r}")
+
+
+async def _read_command(reader: asyncio.StreamReader) -> List[bytes]:
+    header = await reader.readuntil(b"\r\n")
+    if header[:1] != b"*":
+        # Inline command (e.g. typed into nc).
+        return header.split()
+    args = []
+    for _ in range(int(header[1:-2])):
+        length = int((await reader.readuntil(b"\r\n"))[1:-2])
+        args.append((await reader.readexactly(length + 2))[:-2])
+    return args
+
+
+class SharedStateServer:
+    """
+    Single-threaded in-memory store behind the Unix socket. Keys expire
+    lazily on access and in a periodic sweep; beyond `max_keys` the oldest
+    keys are evicted.
+    """
+
+    def __init__(self, max_keys: int = SHARED_STATE_MAX_KEYS):
+        self.max_keys = max_keys
+        self._values: Dict[bytes, bytes] = {}
+        self._expires: Dict[bytes, float] = {}
+
+    def _alive(self, key: bytes) -> bool:
+        expires_at = self._expires.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._values.pop(key, None)
+            del self._expires[key]
+        return key in self._values
+
+    def _store(self, key: bytes, value: bytes) -> None:
+        self._values.pop(key, None)
+        self._values[key] = value
+        while len(self._values) > self.max_keys:
+            oldest = next(iter(self._values))
+            del self._values[oldest]
+            self._expires.pop(oldest, None)
+
+    def execute(self, args: List[bytes]) -> Any:
+        if not args:
+            return SharedStateError("empty command")
+        name = args[0].upper()
+        try:
+            if name == b"PING":
+                return "PONG"
+            if name == b"GET":
+                return self._values[args[1]] if self._alive(args[1]) else None
+            if name == b"SET":
+                self._store(args[1], args[2])
+                self._expires.pop(args[1], None)
+                if len(args) >= 5 and args[3].upper() == b"EX":
+                    self._expires[args[1]] = time.monotonic() + int(args[4])
+                return "OK"
+            if name == b"DEL":
+                deleted = 0
+                for key in args[1:]:
+                    if self._alive(key):
+                        del self._values[key]
+                        self._expires.pop(key, None)
+                        deleted += 1
+                return deleted
+            if name in (b"INCRBY", b"DECRBY", b"INCR", b"DECR"):
+                amount = int(args[2]) if len(args) > 2 else 1
+                if name.startswith(b"DECR"):
+                    amount = -amount
+                current = int(self._values[args[1]]) if self._alive(
+                    args[1]) else 0
+                value = current + amount
+                self._values[args[1]] = str(value).encode("ascii")
+                return value
+            if name == b"EXPIRE":
+                if not self._alive(args[1]):
+                    return 0
+                self._expires[args[1]] = time.monotonic() + int(args[2])
+                return 1
+            if name == b"DBSIZE":
+                return len(self._values)
+        except (IndexError, ValueError) as e:
+            return SharedStateError(f"bad arguments for {name.decode()}: {e}")
+        return SharedStateError(f"unknown command {name.decode()}")
+
+    def purge_expired(self) -> None:
+        now = time.monotonic()
+        for key in [key for key, at in self._expires.items() if at <= now]:
+            self._values.pop(key, None)
+            del self._expires[key]
+
+    async def handle(self, reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                command = await _read_command(reader)
+                writer.write(_encode_reply(self.execute(command)))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, path: str) -> None:
+        if os.path.exists(path):
+            os.unlink(path)
+        server = await asyncio.start_unix_server(self.handle, path)
+        os.chmod(path, 0o600)
+        print(f"🗄️ Shared state server listening on {path}")
+        async with server:
+            while True:
+                await asyncio.sleep(10)
+                self.purge_expired()
+
+
+def _start_server(path: str) -> None:
+    """
+    Starts the socket server as a detached process that outlives the
+    worker, logging to `<path>.log`. Concurrent starts are harmless: only
+    the process holding the lock file serves, the others exit.
+    """
+    with open(f"{path}.log", "ab") as log:
+        subprocess.Popen(
+            [sys.executable, "-u",
+             os.path.abspath(__file__), "--socket", path],
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            start_new_session=True)
+
+
+class SharedStateClient:
+    """
+    Async client of the socket server with the redis-py method names the
+    caches and the rate limiter use, so either can be plugged in.
+    Connections are pooled; one that failed mid-command is dropped.
+    """
+
+    def __init__(self,
+                 path: str = SHARED_STATE_SOCKET,
+                 pool_size: int = SHARED_STATE_POOL_SIZE,
+                 autostart: bool = SHARED_STATE_AUTOSTART == "on"):
+        self.path = path
+        self.pool_size = pool_size
+        self.autostart = autostart
+        self._idle: List[Tuple[asyncio.StreamReader,
+                               asyncio.StreamWriter]] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def _connect(
+            self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        try:
+            return await asyncio.open_unix_connection(self.path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            if not self.autostart:
+                raise
+        _start_server(self.path)
+        deadline = time.monotonic() + 5
+        while True:
+            await asyncio.sleep(0.05)
+            try:
+                return await asyncio.open_unix_connection(self.path)
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() >= deadline:
+                    raise
+
+    async def execute(self, *args: Any) -> Any:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.pool_size)
+        async with self._slots:
+            reader, writer = (self._idle.pop()
+                              if self._idle else await self._connect())
+            try:
+                writer.write(_encode_command(args))
+                await writer.drain()
+                reply = await _read_reply(reader)
+            except SharedStateError:
+                self._idle.append((reader, writer))
+                raise
+            except BaseException:
+                writer.close()
+                raise
+            self._idle.append((reader, writer))
+            return reply
+
+    async def ping(self) -> bool:
+        return await self.execute("PING") == "PONG"
+
+    async def get(self, key: str) -> Optional[str]:
+        value = await self.execute("GET", key)
+        return value.decode("utf-8") if value is not None else None
+
+    async def set(self, key: str, value: str, ex: Optional[int] = None) -> bool:
+        if ex is None:
+            return await self.execute("SET", key, value) == "OK"
+        return await self.execute("SET", key, value, "EX", ex) == "OK"
+
+    async def delete(self, *keys: str) -> int:
+        return await self.execute("DEL", *keys)
+
+    async def incrby(self, key: str, amount: int = 1) -> int:
+        return await self.execute("INCRBY", key, amount)
+
+    async def expire(self, key: str, seconds: int) -> bool:
+        return bool(await self.execute("EXPIRE", key, seconds))
+
+
+_clients: Dict[str, Any] = {}
+
+
+def get_shared_client(backend: str = SHARED_STATE_BACKEND) -> Any:
+    """
+    This process' client of the given shared state backend ("socket" or
+    "redis"), created on first use.
+    """
+    if backend not in _clients:
+        if backend == "socket":
+            _clients[backend] = SharedStateClient()
+        elif backend == "redis":
+            try:
+                import redis.asyncio as redis_asyncio
+            except ImportError as e:
+                raise RuntimeError(
+                    "The redis backend requires the `redis` package "
+                    "(pip install redis).") from e
+            _clients[backend] = redis_asyncio.from_url(REDIS_URL,
+                                                       decode_responses=True)
+        else:
+            raise ValueError(f"Unknown shared state backend: {backend}")
+    return _clients[backend]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--socket", default=SHARED_STATE_SOCKET)
+    parser.add_argument("--max-keys", type=int, default=SHARED_STATE_MAX_KEYS)
+    args = parser.parse_args()
+
+    lock = open(args.socket + ".lock", "w")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        print(f"Shared state server already running on {args.socket}")
+        return
+    try:
+        asyncio.run(SharedStateServer(args.max_keys).serve(args.socket))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
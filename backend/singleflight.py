@@ -0,0 +1,128 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import (Any, AsyncIterator, Awaitable, Callable, Dict, Generic,
+                    List, Optional, Set, Tuple, TypeVar)
+from metrics import SINGLEFLIGHT_CALLS
+
+T = TypeVar("T")
+
+Emitter = Callable[[str, Any], Awaitable[None]]
+
+
+class Flight(Generic[T]):
+    """
+    One in-flight run shared by everyone who joined it. Events the run
+    emits are recorded, so late joiners see the whole sequence.
+    """
+
+    def __init__(self, run: Callable[[Emitter], Awaitable[T]]):
+        self.events: List[Tuple[str, Any]] = []
+        self.attached = 0
+        self._subscribers: Set[asyncio.Queue] = set()
+        self.task: asyncio.Task = asyncio.ensure_future(run(self.publish))
+        self.task.add_done_callback(self._finish)
+
+    async def publish(self, event: str, data: Any) -> None:
+        self.events.append((event, data))
+        for queue in self._subscribers:
+            queue.put_nowait((event, data))
+
+    def _finish(self, _: asyncio.Task) -> None:
+        for queue in self._subscribers:
+            queue.put_nowait(None)
+
+    def subscribe(self) -> asyncio.Queue:
+        """
+        Queue of the run's events so far and to come, then None once the
+        run has finished.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        for event in self.events:
+            queue.put_nowait(event)
+        if self.task.done():
+            queue.put_nowait(None)
+        else:
+            self._subscribers.add(queue)
+        return queue
+
+    async def forward(self, emit: Emitter) -> None:
+        """
+        Passes every event of the run on to `emit` until it has finished.
+        """
+        queue = self.subscribe()
+        while (event := await queue.get()) is not None:
+            await emit(*event)
+
+    async def result(self) -> T:
+        # Shielded: a caller that goes away must not cancel the others' run.
+        return await asyncio.shield(self.task)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent runs with the same key: the first caller starts
+    the run, callers arriving while it is in flight attach to it and get
+    its result (or exception) and events. Once every caller has left, an
+    unfinished run is cancelled. Per process, like the scheduler.
+    """
+
+    def __init__(self, scope: str):
+        self.scope = scope
+        self._flights: Dict[str, Flight] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def join(self,
+             key: str,
+             run: Callable[[Emitter], Awaitable[T]],
+             admit: Optional[Callable[[], None]] = None
+             ) -> Tuple[Flight[T], bool]:
+        """
+        Attaches to the run in flight under `key`, or starts `run` (after
+        `admit`, which may raise to refuse it). Returns the flight and
+        whether this caller started it; callers must `leave` it.
+        """
+        flight = self._flights.get(key)
+        leader = flight is None
+        if leader:
+            if admit is not None:
+                admit()
+            flight = self._flights[key] = Flight(run)
+            flight.task.add_done_callback(
+                lambda _: self._forget(key, flight))
+        flight.attached += 1
+        SINGLEFLIGHT_CALLS.inc(scope=self.scope,
+                               role="leader" if leader else "follower")
+        return flight, leader
+
+    def leave(self, key: str, flight: Flight) -> None:
+        flight.attached -= 1
+        if flight.attached == 0 and not flight.task.done():
+            self._forget(key, flight)
+            flight.task.cancel()
+
+    def _forget(self, key: str, flight: Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    @asynccontextmanager
+    async def attach(
+        self,
+        key: str,
+        run: Callable[[Emitter], Awaitable[T]],
+        admit: Optional[Callable[[], None]] = None
+    ) -> AsyncIterator[Tuple[Flight[T], bool]]:
+        flight, leader = self.join(key, run, admit)
+        try:
+            yield flight, leader
+        finally:
+            self.leave(key, flight)
+
+    async def do(self, key: str, run: Callable[[Emitter],
+                                               Awaitable[T]]) -> T:
+        """
+        Result of the run under `key`, started if none is in flight.
+        """
+        async with self.attach(key, run) as (flight, _):
+            return await flight.result()
@@ -0,0 +1,55 @@
+"""
+Shared setup of the test suite: every test runs the real pipeline against
+the offline fake backend (LLM_BACKEND=fake), with the analysis history, the
+workforce store and shared state off. Backend modules read their settings
+at import, so they are fixed here before any of them is imported.
+"""
+import os
+
+os.environ.update(LLM_BACKEND="fake",
+                  ANALYSIS_HISTORY_PATH="none",
+                  WORKFORCE_STORE_PATH="none",
+                  SHARED_STATE_BACKEND="none",
+                  RESULT_CACHE_BACKEND="memory",
+                  ITEM_CACHE_BACKEND="none",
+                  SEMANTIC_CACHE_BACKEND="none",
+                  JOB_STORE_BACKEND="memory",
+                  SCORING_MODE="per_item",
+                  NARRATIVE_START="final",
+                  FAKE_LLM_AGENT_LATENCY_MS="5",
+                  FAKE_LLM_SCORE_LATENCY_MS="2",
+                  FAKE_LLM_LOW_SCORE_LATENCY_MS="1",
+                  FAKE_LLM_ERROR_RATE="0")
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+import main  # noqa: E402
+from jobs import create_jobs_from_env  # noqa: E402
+
+
+@pytest.fixture
+def profile(request: pytest.FixtureRequest) -> dict:
+    """
+    A profile no other test analyses, so result cache entries never leak
+    from one test into another.
+    """
+    return {
+        "age": "35",
+        "gender": "f",
+        "job_title": "Accountant",
+        "job_description":
+        f"Prepares reports for clients ({request.node.name}).",
+        "daily_routine": "Emails, spreadsheets",
+        "location": "Office",
+        "education": "MSc"
+    }
+
+
+@pytest.fixture
+def client(monkeypatch: pytest.MonkeyPatch):
+    # Every TestClient runs the app on a loop of its own, and the job queue
+    # is bound to the loop of the first one that used it.
+    monkeypatch.setattr(main, "analysis_jobs",
+                        create_jobs_from_env(main.run_analysis_job))
+    with TestClient(main.app) as client:
+        yield client
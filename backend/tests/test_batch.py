@@ -0,0 +1,135 @@
+import argparse
+import asyncio
+import json
+import main
+from batch import run_file
+
+
+def records(text: str) -> list:
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def test_failed_rows_are_reported_and_do_not_stop_the_batch(client, profile):
+    rows = [
+        json.dumps({
+            **profile, "id": "a"
+        }), "{not json",
+        json.dumps({
+            "id": "c",
+            "job_title": "Nurse"
+        }),
+        json.dumps({
+            **profile, "id": "d",
+            "job_title": "Nurse"
+        })
+    ]
+    response = client.post("/analyze/batch", content="\n".join(rows))
+    assert response.status_code == 200
+    *rows, summary = records(response.text)
+    statuses = {row["id"]: row["status"] for row in rows}
+    assert statuses.pop("a") == statuses.pop("d") == "ok"
+    assert sorted(statuses.values()) == ["error", "error"]
+    errors = sorted(row["error"]["status_code"] for row in rows
+                    if row["status"] == "error")
+    assert errors == [400, 422]
+    assert summary["summary"]["succeeded"] == 2
+    assert summary["summary"]["failed"] == 2
+
+
+def test_rows_without_ids_get_ids_scoped_to_the_upload(client, profile):
+    body = "\n".join(json.dumps(profile) for _ in range(2))
+    first = records(client.post("/analyze/batch", content=body).text)[:-1]
+    again = records(client.post("/analyze/batch", content=body).text)[:-1]
+    other = records(
+        client.post("/analyze/batch", content="\n" + body).text)[:-1]
+    ids = sorted(row["id"] for row in first)
+    assert ids == sorted(row["id"] for row in again)
+    assert ids[0].endswith("-1") and ids[1].endswith("-2")
+    assert not set(ids) & {row["id"] for row in other}
+
+
+def test_rows_start_before_the_upload_ends(profile):
+    rows = [json.dumps({**profile, "id": str(n)}) + "\n" for n in (1, 2)]
+    first_record = asyncio.Event()
+    body = []
+
+    async def receive() -> dict:
+        if rows:
+            if len(rows) == 1:
+                # The second row is only sent once the first came back.
+                await asyncio.wait_for(first_record.wait(), 30)
+            row = rows.pop(0)
+            return {
+                "type": "http.request",
+                "body": row.encode(),
+                "more_body": bool(rows)
+            }
+        await asyncio.Event().wait()
+
+    async def send(message: dict) -> None:
+        if message["type"] == "http.response.body":
+            body.append(message.get("body", b""))
+            if b'"id"' in message.get("body", b""):
+                first_record.set()
+
+    scope = {
+        "type": "http",
+        "asgi": {
+            "version": "3.0",
+            "spec_version": "2.3"
+        },
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/analyze/batch",
+        "raw_path": b"/analyze/batch",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"content-type", b"application/x-ndjson")],
+        "client": ("testclient", 50000),
+        "server": ("testserver", 80)
+    }
+    asyncio.run(main.app(scope, receive, send))
+    *rows, summary = records(b"".join(body).decode())
+    assert [row["id"] for row in rows] == ["1", "2"]
+    assert summary["summary"]["succeeded"] == 2
+
+
+def run_batch(input_path, output_path, resume: bool) -> dict:
+    args = argparse.Namespace(input=str(input_path),
+                              output=str(output_path),
+                              format=None,
+                              resume=resume,
+                              concurrency=2,
+                              scoring_mode="per_item",
+                              narratives=False,
+                              offload=None,
+                              offload_dir=None,
+                              poll_seconds=0,
+                              progress_every=100)
+    return asyncio.run(run_file(args))
+
+
+def test_resume_only_reruns_rows_that_did_not_succeed(tmp_path, profile):
+    input_path = tmp_path / "profiles.jsonl"
+    output_path = tmp_path / "results.jsonl"
+    input_path.write_text("\n".join(
+        json.dumps({
+            **profile, "job_title": title
+        }) for title in ("Accountant", "Nurse", "Teacher")) + "\n")
+
+    summary = run_batch(input_path, output_path, resume=False)
+    assert summary["succeeded"] == 3
+    [done, *_] = records(output_path.read_text())
+
+    # A crash after the first row, halfway through writing the second.
+    output_path.write_text(json.dumps(done) + "\n" + '{"id": "cut')
+    summary = run_batch(input_path, output_path, resume=True)
+    assert (summary["skipped"], summary["succeeded"]) == (1, 2)
+    rows = [
+        json.loads(line)
+        for line in output_path.read_text().splitlines()
+        if line.strip() and not line.startswith('{"id": "cut')
+    ]
+    assert sorted(row["id"] for row in rows) == sorted(
+        f"{done['id'].rsplit('-', 1)[0]}-{n}" for n in (1, 2, 3))
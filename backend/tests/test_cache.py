@@ -0,0 +1,71 @@
+import asyncio
+from cache import MemoryCache, fingerprint
+from main import profile_fingerprint
+from models import UserProfile
+
+
+def test_fingerprint_ignores_case_and_whitespace():
+    assert fingerprint({"a": "Senior  Accountant ", "b": "x"}, "v1") == \
+        fingerprint({"b": "X", "a": "senior accountant"}, "v1")
+    assert fingerprint({"a": "accountant"}, "v1") != fingerprint(
+        {"a": "accountant"}, "v2")
+
+
+def test_profile_key_covers_scoring_mode_and_relevant_fields(profile):
+    key = profile_fingerprint(UserProfile(**profile), "per_item")
+    assert key != profile_fingerprint(UserProfile(**profile), "progressive")
+    assert key != profile_fingerprint(
+        UserProfile(**{
+            **profile, "job_title": "Nurse"
+        }), "per_item")
+
+
+def test_analyze_misses_then_hits(client, profile):
+    first = client.post("/analyze", json=profile)
+    assert first.headers["x-cache"] == "MISS"
+    second = client.post("/analyze", json=profile)
+    assert second.headers["x-cache"] == "HIT"
+    assert second.json() == first.json()
+    # Another scoring mode is another entry.
+    other = client.post("/analyze?scoring_mode=batched", json=profile)
+    assert other.headers["x-cache"] == "MISS"
+
+
+def test_bypass_header_skips_the_lookup_and_refreshes_the_entry(
+        client, profile):
+    client.post("/analyze", json=profile)
+    before = client.get("/cache/stats").json()["results"]["bypasses"]
+    bypassed = client.post("/analyze",
+                           json=profile,
+                           headers={"X-Cache-Bypass": "1"})
+    assert bypassed.headers["x-cache"] == "BYPASS"
+    assert client.get("/cache/stats").json()["results"]["bypasses"] == \
+        before + 1
+    again = client.post("/analyze",
+                        json=profile,
+                        headers={"X-Cache-Bypass": "false"})
+    assert again.headers["x-cache"] == "HIT"
+    assert again.json() == bypassed.json()
+
+
+def test_timings_are_not_cached(client, profile):
+    timed = client.post("/analyze?timings=true", json=profile)
+    assert "timings" in timed.json()
+    cached = client.post("/analyze", json=profile)
+    assert cached.headers["x-cache"] == "HIT"
+    assert "timings" not in cached.json()
+
+
+def test_memory_cache_evicts_least_recently_used():
+
+    async def run():
+        cache = MemoryCache(max_entries=2)
+        await cache.set("a", "1", 60)
+        await cache.set("b", "2", 60)
+        await cache.get("a")
+        await cache.set("c", "3", 60)
+        kept = [await cache.get(key) for key in ("a", "b", "c")]
+        await cache.set("expired", "4", -1)
+        return kept, await cache.get("expired")
+
+    assert asyncio.run(run()) == (["1", None, "3"], None)
@@ -0,0 +1,132 @@
+import asyncio
+import time
+import history
+from history import (AnalysisHistory, create_history_from_env, plan_rescore,
+                     rescore)
+from models import UserProfile
+from pipeline import run_analysis, stage_versions
+
+
+def stored(path, profile: dict) -> AnalysisHistory:
+    analysis_history = AnalysisHistory(str(path / "history.sqlite3"))
+    user = UserProfile(**profile)
+
+    async def analyze():
+        await analysis_history.record(user, "per_item", await
+                                      run_analysis(user))
+
+    asyncio.run(analyze())
+    return analysis_history
+
+
+async def first_entry(analysis_history: AnalysisHistory) -> dict:
+    async for entry in analysis_history.entries():
+        return entry
+
+
+def test_history_is_off_by_default():
+    assert history.ANALYSIS_HISTORY_PATH == "none"
+    assert create_history_from_env() is None
+
+
+def test_plan_rescore_includes_downstream_stages():
+    current = stage_versions("per_item")
+    analysis = {"versions": current, "future_scenarios": []}
+    assert plan_rescore(analysis, "per_item") == []
+    scoring = {**analysis, "versions": {**current, "scoring": "old"}}
+    assert plan_rescore(scoring, "per_item") == ["scoring", "narratives"]
+    decomposition = {
+        **analysis, "versions": {
+            **current, "decomposition": "old"
+        }
+    }
+    assert plan_rescore(decomposition, "per_item") == [
+        "decomposition", "scoring", "narratives"
+    ]
+    # Batch rows stored without narratives stay without them.
+    batch_row = {"versions": stage_versions("per_item", narratives=False)}
+    batch_row["versions"]["scoring"] = "old"
+    assert plan_rescore(batch_row, "per_item") == ["scoring"]
+
+
+def test_plan_rescore_redoes_degraded_stages():
+    current = stage_versions("per_item", narratives=True)
+    result = {
+        "versions": current,
+        "future_scenarios": [],
+        "degraded": ["careers"]
+    }
+    assert plan_rescore(result, "per_item") == ["narratives"]
+    result["degraded"] = ["scoring"]
+    assert plan_rescore(result, "per_item") == ["scoring", "narratives"]
+
+
+def test_rescore_recomputes_only_the_stale_stages(tmp_path, profile,
+                                                  monkeypatch):
+    analysis_history = stored(tmp_path, profile)
+    assert asyncio.run(rescore(analysis_history))["current"] == 1
+    before = asyncio.run(first_entry(analysis_history))
+
+    current = history.stage_versions
+    monkeypatch.setattr(
+        history, "stage_versions", lambda mode, narratives=True: {
+            **current(mode, narratives), "scoring": "changed"
+        })
+
+    async def no_decomposition(*args, **kwargs):
+        raise AssertionError("the decomposition is not stale")
+
+    monkeypatch.setattr(history, "decompose", no_decomposition)
+    summary = asyncio.run(rescore(analysis_history))
+    assert (summary["stale"], summary["rescored"]) == (1, 1)
+    assert summary["recomputed"] == {"scoring": 1, "narratives": 1}
+    assert summary["reused"] == {"decomposition": 1}
+
+    after = asyncio.run(first_entry(analysis_history))
+    assert after["result"]["versions"]["scoring"] == "changed"
+    assert list(after["result"]["task_automation_breakdown"]) == list(
+        before["result"]["task_automation_breakdown"])
+    assert after["result"]["future_scenarios"]
+    # Re-scoring does not extend the entry's retention.
+    assert after["updated_at"] == before["updated_at"]
+    assert asyncio.run(rescore(analysis_history))["current"] == 1
+
+
+def test_history_prunes_expired_and_surplus_entries(tmp_path, profile):
+    analysis_history = AnalysisHistory(str(tmp_path / "history.sqlite3"),
+                                       ttl=3600,
+                                       max_rows=2)
+    result = {"weighted_final_score": 0.5}
+
+    async def record():
+        for n, age in enumerate([7200, 30, 20, 10]):
+            await analysis_history.record(
+                UserProfile(**{
+                    **profile, "age": str(n)
+                }), "per_item", result, recorded_at=time.time() - age)
+        # Compare runs are diagnostics and never stored.
+        await analysis_history.record(UserProfile(**profile), "compare",
+                                      result)
+        analysis_history.prune()
+        return sorted([
+            entry["profile"]["age"]
+            async for entry in analysis_history.entries()
+        ])
+
+    assert asyncio.run(record()) == ["2", "3"]
+
+
+def test_rewritten_entries_keep_their_place(tmp_path, profile):
+    analysis_history = AnalysisHistory(str(tmp_path / "history.sqlite3"))
+    first, second = (UserProfile(**{**profile, "age": age})
+                     for age in ("1", "2"))
+
+    async def run():
+        await analysis_history.record(first, "per_item", {"score": 1})
+        await analysis_history.record(second, "per_item", {"score": 1})
+        # A re-score writes the first entry back while entries() pages on.
+        await analysis_history.record(first, "per_item", {"score": 2})
+        return [(entry["profile"]["age"], entry["result"]["score"])
+                async for entry in analysis_history.entries(page_size=1)]
+
+    assert asyncio.run(run()) == [("1", 2), ("2", 1)]
@@ -0,0 +1,56 @@
+import asyncio
+import sqlite3
+import time
+import cache
+from cache import SQLiteCache, item_score_key
+
+
+def test_item_score_key_is_scoped_to_the_prompt_version():
+    key = item_score_key("task", "Client  communication", "Accountant", "v1")
+    assert key == item_score_key("task", "client communication",
+                                 "ACCOUNTANT", "v1")
+    assert key != item_score_key("skill", "Client communication",
+                                 "Accountant", "v1")
+    assert key != item_score_key("task", "Client communication",
+                                 "Accountant", "v2")
+
+
+def test_sqlite_cache_deletes_expired_and_oldest_entries(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite3"), max_entries=100)
+
+    async def run():
+        for i in range(10):
+            await cache.set(f"expired{i}", "x", -1)
+        for i in range(300):
+            await cache.set(f"key{i}", str(i), 60 + i)
+        return await cache.get("key0"), await cache.get("key299")
+
+    assert asyncio.run(run()) == (None, "299")
+    assert len(cache) == 100
+
+
+def test_sqlite_cache_evicts_the_least_recently_used(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "SQLITE_CACHE_TOUCH_SECONDS", 0)
+    sqlite_cache = SQLiteCache(str(tmp_path / "cache.sqlite3"),
+                               max_entries=3)
+
+    async def run():
+        for key in ("a", "b", "c"):
+            await sqlite_cache.set(key, key, 60)
+        await sqlite_cache.get("a")
+        await sqlite_cache.set("d", "d", 60)
+        return [await sqlite_cache.get(key) for key in ("a", "b", "c", "d")]
+
+    assert asyncio.run(run()) == ["a", None, "c", "d"]
+
+
+def test_sqlite_cache_upgrades_a_file_without_last_use(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE cache (key TEXT PRIMARY KEY, "
+                 "value TEXT NOT NULL, expires_at REAL NOT NULL)")
+    conn.execute("INSERT INTO cache VALUES ('a', 'x', ?)",
+                 (time.time() + 60, ))
+    conn.commit()
+    conn.close()
+    assert asyncio.run(SQLiteCache(path).get("a")) == "x"
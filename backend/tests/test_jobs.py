@@ -0,0 +1,84 @@
+import asyncio
+import json
+import time
+from cache import MemoryCache
+from jobs import AnalysisJobs
+from models import UserProfile
+from pipeline import run_analysis
+from serialization import to_jsonable
+
+
+class RecordingStore(MemoryCache):
+    """
+    Job store keeping every version of every job record it was given.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.saved = []
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        self.saved.append(json.loads(value))
+        await super().set(key, value, ttl)
+
+
+def test_progressive_job_counts_every_item_once(profile):
+    store = RecordingStore()
+
+    async def analyze(request: dict, emit) -> dict:
+        return to_jsonable(await run_analysis(
+            UserProfile(**request["profile"]), emit, "progressive"))
+
+    async def run() -> dict:
+        jobs = AnalysisJobs(analyze, store, workers=1)
+        jobs.start()
+        try:
+            job = await jobs.submit({"profile": profile})
+            deadline = time.monotonic() + 30
+            while (job := await jobs.get(job["job_id"]))["status"] in (
+                    "queued", "running"):
+                assert time.monotonic() < deadline
+                await asyncio.sleep(0.01)
+            return job
+        finally:
+            await jobs.stop()
+
+    job = asyncio.run(run())
+    assert job["status"] == "succeeded"
+    progress = job["progress"]
+    assert progress["items_total"] == progress["tasks"] + progress["skills"]
+    assert progress["items_scored"] == progress["items_total"]
+    assert progress["weighted_final_score"] == job["result"][
+        "weighted_final_score"]
+
+    stages = []
+    for saved in store.saved:
+        total = saved["progress"]["items_total"]
+        assert total is None or saved["progress"]["items_scored"] <= total
+        if not stages or stages[-1] != saved["stage"]:
+            stages.append(saved["stage"])
+    assert stages == [
+        "queued", "decomposition", "scoring", "narratives", "done"
+    ]
+    # The draft aggregate does not end the scoring stage.
+    narratives = next(saved for saved in store.saved
+                      if saved["stage"] == "narratives")
+    assert narratives["progress"]["items_scored"] == progress["items_total"]
+
+
+def test_job_endpoint_reports_progress_and_result(client, profile):
+    submitted = client.post("/analyze/jobs?scoring_mode=progressive",
+                            json=profile)
+    assert submitted.status_code == 202
+    deadline = time.monotonic() + 30
+    while True:
+        job = client.get(submitted.json()["status_url"]).json()
+        if job["status"] not in ("queued", "running"):
+            break
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+    assert job["status"] == "succeeded"
+    assert job["progress"]["items_scored"] == job["progress"]["items_total"]
+    assert job["progress"]["scenarios_ready"]
+    assert job["progress"]["careers_ready"]
+    assert client.get("/analyze/jobs/unknown").status_code == 404
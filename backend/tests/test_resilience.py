@@ -0,0 +1,46 @@
+import asyncio
+from contextlib import asynccontextmanager
+import pytest
+import resilience
+from resilience import LatencyTracker, LLMUnavailable, resilient_call
+
+
+@asynccontextmanager
+async def queued_slot():
+    # A slot granted only after a long queue.
+    await asyncio.sleep(0.3)
+    yield
+
+
+@pytest.fixture
+def tracker(monkeypatch: pytest.MonkeyPatch) -> LatencyTracker:
+    monkeypatch.setattr(resilience, "latency_tracker", LatencyTracker())
+    monkeypatch.setitem(resilience.STAGE_DEADLINE_SECONDS, "scoring", 0.2)
+    for _ in range(resilience.LLM_HEDGE_MIN_SAMPLES):
+        resilience.latency_tracker.observe("scoring", 0.05)
+    return resilience.latency_tracker
+
+
+def test_queue_wait_neither_times_out_nor_hedges_a_call(tracker):
+    calls = []
+
+    async def attempt() -> str:
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "ok"
+
+    record: dict = {}
+    assert asyncio.run(
+        resilient_call("scoring", attempt, record, queued_slot)) == "ok"
+    assert len(calls) == 1 and "hedged" not in record
+    assert tracker.quantile("scoring", 1.0) < 0.2
+
+
+def test_slow_calls_still_time_out(tracker):
+
+    async def attempt() -> str:
+        await asyncio.sleep(1)
+        return "late"
+
+    with pytest.raises(LLMUnavailable):
+        asyncio.run(resilient_call("scoring", attempt, {}, queued_slot))
@@ -0,0 +1,140 @@
+import json
+import multiprocessing
+import pytest
+from rollup import WorkforceStore, import_records, rollup
+
+
+def result(final: float, tasks: dict, skills: dict) -> dict:
+    return {
+        "weighted_final_score": final,
+        "total_task_automation": final,
+        "total_skill_automation": final,
+        "task_automation_breakdown": {
+            name: {
+                "score": score,
+                "time_share": share
+            }
+            for name, (score, share) in tasks.items()
+        },
+        "skill_automation_breakdown": {
+            name: {
+                "score": score,
+                "importance": importance
+            }
+            for name, (score, importance) in skills.items()
+        }
+    }
+
+
+@pytest.fixture
+def store() -> WorkforceStore:
+    store = WorkforceStore()
+    store.add("1", "Accountant", "Finance",
+              result(0.8, {"Reporting": (0.9, 0.5), "Audits": (0.5, 0.5)},
+                     {"Excel": (0.7, 1.0)}))
+    store.add("2", "accountant ", "Finance",
+              result(0.4, {"Reporting": (0.7, 1.0)}, {"Excel": (0.5, 1.0)}))
+    store.add("3", "Nurse", None,
+              result(0.2, {"Patient care": (0.1, 1.0)},
+                     {"Empathy": (0.1, 1.0)}))
+    return store
+
+
+def test_rollup_totals(store):
+    report = rollup(store)
+    assert report["employees"] == 3
+    assert report["mean_exposure"] == pytest.approx((0.8 + 0.4 + 0.2) / 3,
+                                                    abs=1e-4)
+    assert report["high_risk_share"] == pytest.approx(1 / 3, abs=1e-4)
+    assert sum(report["distribution"].values()) == 3
+    groups = {
+        group["department"]: group["employees"]
+        for group in report["groups"]
+    }
+    assert groups == {"Finance": 2, "(unassigned)": 1}
+    [top, *_] = report["top_items"]
+    assert top["name"] == "Reporting"
+    assert top["employees"] == 2
+    assert top["exposure"] == pytest.approx(0.9 * 0.5 + 0.7 * 1.0, abs=1e-4)
+
+
+def test_rollup_by_job_title_and_department_filter(store):
+    titles = rollup(store, group_by="job_title")["groups"]
+    assert {group["job_title"]: group["employees"]
+            for group in titles} == {"Accountant": 2, "Nurse": 1}
+    finance = rollup(store, department="finance", item_type="skill")
+    assert finance["employees"] == 2
+    assert [item["name"] for item in finance["top_items"]] == ["Excel"]
+
+
+def test_readding_an_employee_replaces_the_analysis(store):
+    store.add("3", "Nurse", "Care", result(0.6, {}, {}))
+    report = rollup(store)
+    assert report["employees"] == 3
+    assert {group["department"]
+            for group in report["groups"]} == {"Finance", "Care"}
+
+
+def test_import_skips_failed_rows_and_summaries():
+    store = WorkforceStore()
+    lines = [
+        json.dumps({
+            "id": "a",
+            "job_title": "Nurse",
+            "status": "ok",
+            "result": result(0.3, {}, {})
+        }),
+        json.dumps({
+            "id": "b",
+            "status": "error"
+        }), "{cut", "42", "[]",
+        json.dumps({"summary": {}})
+    ]
+    assert import_records(store, lines) == {"imported": 1, "skipped": 4}
+    assert len(store) == 1
+
+
+def add_and_save(path: str, worker: int, employees: int) -> None:
+    store = WorkforceStore(path)
+    store.refresh()
+    for n in range(employees):
+        store.add(f"{worker}-{n}", "Accountant", f"Team {worker}",
+                  result(0.5, {"Reporting": (0.5, 1.0)}, {}))
+        if n % 5 == 4:
+            store.save()
+    store.save()
+
+
+def test_concurrent_saves_keep_every_process_analyses(tmp_path):
+    path = str(tmp_path / "workforce.npz")
+    context = multiprocessing.get_context("fork")
+    workers = [
+        context.Process(target=add_and_save, args=(path, worker, 20))
+        for worker in range(4)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+    assert [worker.exitcode for worker in workers] == [0] * 4
+
+    store = WorkforceStore(path)
+    store.refresh()
+    report = rollup(store)
+    assert report["employees"] == 80
+    assert {group["department"]: group["employees"]
+            for group in report["groups"]} == {
+                f"Team {worker}": 20
+                for worker in range(4)
+            }
+
+
+def test_refresh_keeps_unsaved_adds(tmp_path):
+    path = str(tmp_path / "workforce.npz")
+    mine = WorkforceStore(path)
+    mine.add("mine", "Nurse", None, result(0.2, {}, {}))
+    add_and_save(path, 0, 3)
+    mine.refresh()
+    assert len(mine) == 4
+    mine.save()
+    assert len(mine) == 4
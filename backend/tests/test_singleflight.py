@@ -0,0 +1,118 @@
+import asyncio
+import httpx
+import pytest
+import main
+from singleflight import SingleFlight
+
+
+def test_concurrent_requests_share_one_run(profile):
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport,
+                                     base_url="http://test",
+                                     timeout=60) as client:
+            return await asyncio.gather(
+                *[client.post("/analyze", json=profile) for _ in range(3)])
+
+    responses = asyncio.run(run())
+    assert sorted(r.headers["x-cache"] for r in responses) == [
+        "COALESCED", "COALESCED", "MISS"
+    ]
+    assert len({r.json()["weighted_final_score"] for r in responses}) == 1
+    assert len(main.profile_flights) == 0
+
+
+def test_late_joiners_see_every_event_and_the_result():
+
+    async def run():
+        flights = SingleFlight("test")
+        release = asyncio.Event()
+        runs = 0
+
+        async def work(emit):
+            nonlocal runs
+            runs += 1
+            await emit("first", 1)
+            await release.wait()
+            await emit("second", 2)
+            return "done"
+
+        async def call():
+            async with flights.attach("key", work) as (flight, leader):
+                events = []
+
+                async def collect(*event):
+                    events.append(event)
+
+                await flight.forward(collect)
+                return leader, events, await flight.result()
+
+        first = asyncio.create_task(call())
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(call())
+        await asyncio.sleep(0.01)
+        release.set()
+        return runs, await first, await second
+
+    runs, first, second = asyncio.run(run())
+    assert runs == 1
+    events = [("first", 1), ("second", 2)]
+    assert first == (True, events, "done")
+    assert second == (False, events, "done")
+
+
+def test_a_failure_reaches_every_caller():
+
+    async def run():
+        flights = SingleFlight("test")
+
+        async def work(emit):
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        return await asyncio.gather(flights.do("key", work),
+                                    flights.do("key", work),
+                                    return_exceptions=True)
+
+    assert [type(e) for e in asyncio.run(run())] == [ValueError, ValueError]
+
+
+def test_run_is_cancelled_once_the_last_caller_leaves():
+
+    async def run():
+        flights = SingleFlight("test")
+
+        async def work(emit):
+            await asyncio.Event().wait()
+
+        flight, leader = flights.join("key", work)
+        same, follower = flights.join("key", work)
+        assert same is flight and leader and not follower
+        flights.leave("key", flight)
+        await asyncio.sleep(0)
+        assert not flight.task.done()
+        flights.leave("key", flight)
+        with pytest.raises(asyncio.CancelledError):
+            await flight.task
+        return len(flights)
+
+    assert asyncio.run(run()) == 0
+
+
+def test_a_caller_going_away_does_not_cancel_the_others():
+
+    async def run():
+        flights = SingleFlight("test")
+
+        async def work(emit):
+            await asyncio.sleep(0.05)
+            return "done"
+
+        first = asyncio.create_task(flights.do("key", work))
+        second = asyncio.create_task(flights.do("key", work))
+        await asyncio.sleep(0.01)
+        second.cancel()
+        return await first
+
+    assert asyncio.run(run()) == "done"
@@ -0,0 +1,33 @@
+import asyncio
+import threading
+import clients
+
+
+def test_early_callers_await_one_build_without_blocking(monkeypatch):
+    monkeypatch.setattr(clients, "_registry", None)
+    monkeypatch.setattr(clients, "_registry_build", None)
+    release = threading.Event()
+    builds = []
+
+    def build():
+        builds.append(threading.current_thread())
+        release.wait(5)
+        clients._registry = registry = object()
+        return registry
+
+    monkeypatch.setattr(clients, "get_registry", build)
+
+    async def run():
+        callers = [
+            asyncio.create_task(clients.aget_registry()) for _ in range(3)
+        ]
+        # The loop keeps running while the registry is being built.
+        await asyncio.sleep(0.05)
+        assert not any(caller.done() for caller in callers)
+        release.set()
+        return await asyncio.gather(*callers)
+
+    first, second, third = asyncio.run(run())
+    assert first is second is third is clients._registry
+    assert len(builds) == 1
+    assert builds[0] is not threading.main_thread()
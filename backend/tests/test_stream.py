@@ -0,0 +1,56 @@
+import json
+from typing import List, Tuple
+
+
+def sse_events(text: str) -> List[Tuple[str, object]]:
+    events = []
+    for block in text.split("\n\n"):
+        lines = dict(
+            line.split(": ", 1) for line in block.splitlines()
+            if not line.startswith(":"))
+        if "event" in lines:
+            events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_stream_events_arrive_in_pipeline_order(client, profile):
+    response = client.post("/analyze/stream", json=profile)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.headers["x-cache"] == "MISS"
+
+    events = sse_events(response.text)
+    names = [name for name, _ in events]
+    data = dict(events)
+    scores = [i for i, name in enumerate(names) if name == "score"]
+    assert len(scores) == len(data["tasks"]) + len(data["skills"])
+    assert max(names.index("tasks"), names.index("skills")) < scores[0]
+    assert scores[-1] < names.index("aggregate")
+    assert names.index("aggregate") < names.index("scenarios")
+    assert names.index("aggregate") < names.index("careers")
+    assert names[-1] == "result"
+    assert data["result"]["weighted_final_score"] == data["aggregate"][
+        "weighted_final_score"]
+
+
+def test_stream_serves_a_cached_result_as_one_event(client, profile):
+    first = client.post("/analyze", json=profile)
+    response = client.post("/analyze/stream", json=profile)
+    assert response.headers["x-cache"] == "HIT"
+    [(name, result)] = sse_events(response.text)
+    assert name == "result"
+    assert result == first.json()
+
+
+def test_stream_reports_a_failure_as_an_error_event(client, profile,
+                                                    monkeypatch):
+    import pipeline
+
+    async def fail(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(pipeline, "decompose", fail)
+    response = client.post("/analyze/stream", json=profile)
+    name, detail = sse_events(response.text)[-1]
+    assert name == "error"
+    assert detail["status_code"] == 500
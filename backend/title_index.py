@@ -0,0 +1,223 @@
+"""
+Index of canonical task and skill decompositions per job title.
+
+Warm it up with the most common professions (runs the researching
+decomposition agents once per title):
+
+    poetry run python title_index.py --top 100
+    poetry run python title_index.py --titles my_titles.txt --force
+"""
+import argparse
+import asyncio
+import difflib
+import hashlib
+import json
+import os
+import re
+import time
+import unicodedata
+from typing import Dict, List, Optional
+from clients import LLM_MODEL
+from prompts import (TASKS_DECOMPOSITION_SYSTEM_PROMPT,
+                     SKILLS_DECOMPOSITION_SYSTEM_PROMPT)
+
+TITLE_INDEX_PATH = os.getenv("TITLE_INDEX_PATH", "title_index.json")
+# "adapt": an indexed decomposition is personalized by a cheap structured
+# call without web search; "reuse": it is used as is; "off": always research.
+TITLE_INDEX_MODE = os.getenv("TITLE_INDEX_MODE", "adapt")
+# Minimum similarity (0-1) for a fuzzy title match.
+TITLE_INDEX_MATCH_CUTOFF = float(
+    os.getenv("TITLE_INDEX_MATCH_CUTOFF", "0.85"))
+PROFESSIONS_PATH = os.path.join(os.path.dirname(__file__),
+                                "professions.txt")
+
+# Entries researched with other prompts or another model are not reused.
+TITLE_INDEX_VERSION = hashlib.sha256("\n".join([
+    LLM_MODEL, TASKS_DECOMPOSITION_SYSTEM_PROMPT,
+    SKILLS_DECOMPOSITION_SYSTEM_PROMPT
+]).encode("utf-8")).hexdigest()[:12]
+
+
+def normalize_title(title: str) -> str:
+    """
+    Case-, accent- and punctuation-insensitive form of a job title, so that
+    "Psychológ", "psycholog" and "PSYCHOLOG." compare equal.
+    """
+    decomposed = unicodedata.normalize("NFKD", title)
+    stripped = "".join(char for char in decomposed
+                       if not unicodedata.combining(char))
+    return " ".join(re.sub(r"[^\w]+", " ", stripped.casefold()).split())
+
+
+class TitleIndex:
+    """
+    Canonical decompositions keyed by normalized job title, each reachable
+    through its aliases (title variants and translations). Lookups match
+    aliases exactly first, then fuzzily.
+    """
+
+    def __init__(self, version: str = TITLE_INDEX_VERSION):
+        self.version = version
+        self.entries: Dict[str, dict] = {}
+        # Normalized alias -> entry key.
+        self._aliases: Dict[str, str] = {}
+        self._matches: Dict[str, Optional[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @classmethod
+    def load(cls, path: str) -> "TitleIndex":
+        index = cls()
+        if not os.path.exists(path):
+            return index
+        with open(path, encoding="utf-8") as file:
+            data = json.load(file)
+        if data.get("version") != index.version:
+            print(f"⚠️ Title index {path} was built for pipeline version "
+                  f"{data.get('version')}, ignoring it.")
+            return index
+        for entry in data["entries"].values():
+            index.add(entry["title"], entry["aliases"], entry["tasks"],
+                      entry["skills"], entry["created_at"])
+        return index
+
+    def save(self, path: str) -> None:
+        with open(path + ".tmp", "w", encoding="utf-8") as file:
+            json.dump({
+                "version": self.version,
+                "entries": self.entries
+            },
+                      file,
+                      ensure_ascii=False,
+                      indent=2)
+        os.replace(path + ".tmp", path)
+
+    def add(self,
+            title: str,
+            aliases: List[str],
+            tasks: List[dict],
+            skills: List[dict],
+            created_at: Optional[float] = None) -> None:
+        key = normalize_title(title)
+        self.entries[key] = {
+            "title": title,
+            "aliases": aliases,
+            "tasks": tasks,
+            "skills": skills,
+            "created_at": created_at or time.time()
+        }
+        for alias in [title, *aliases]:
+            self._aliases[normalize_title(alias)] = key
+        self._matches.clear()
+
+    def _match(self, title: str) -> Optional[str]:
+        query = normalize_title(title)
+        if query in self._aliases:
+            return self._aliases[query]
+        if query not in self._matches:
+            if len(self._matches) >= 10000:
+                self._matches.clear()
+            close = difflib.get_close_matches(query,
+                                              list(self._aliases),
+                                              n=1,
+                                              cutoff=TITLE_INDEX_MATCH_CUTOFF)
+            self._matches[query] = self._aliases[close[0]] if close else None
+        return self._matches[query]
+
+    def lookup(self, title: str) -> Optional[dict]:
+        key = self._match(title)
+        return None if key is None else self.entries[key]
+
+
+def load_title_index_from_env() -> Optional[TitleIndex]:
+    if TITLE_INDEX_MODE == "off":
+        return None
+    return TitleIndex.load(TITLE_INDEX_PATH)
+
+
+def read_professions(path: str) -> List[List[str]]:
+    """
+    One profession per line, most common first: the canonical title,
+    then its aliases, separated by "|". Lines starting with # are comments.
+    """
+    professions = []
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                professions.append(
+                    [name.strip() for name in line.split("|") if name.strip()])
+    return professions
+
+
+async def warm_up(professions: List[List[str]], path: str, force: bool,
+                  concurrency: int) -> TitleIndex:
+    """
+    Researches a generic decomposition for every profession missing from
+    the index (or all of them with `force`) and saves after each one.
+    """
+    from models import UserProfile
+    from clients import close_registry, get_registry
+    from pipeline import build_job_context, decompose
+
+    index = TitleIndex.load(path)
+    get_registry()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def research(title: str, aliases: List[str]) -> None:
+        job_context = build_job_context(
+            UserProfile(age="",
+                        gender="",
+                        job_title=title,
+                        job_description=f"Typical responsibilities of a {title}",
+                        daily_routine="A typical working day in this role",
+                        location="",
+                        education=""))
+        async with semaphore:
+            try:
+                # No job title: always research, never adapt from the index.
+                tasks, skills = await asyncio.gather(
+                    decompose("task", job_context, time.monotonic()),
+                    decompose("skill", job_context, time.monotonic()))
+            except Exception as e:
+                print(f"⚠️ Warm-up of {title!r} failed. Error: {e}")
+                return
+        index.add(title, aliases, [task.model_dump() for task in tasks],
+                  [skill.model_dump() for skill in skills])
+        index.save(path)
+        print(f"✅ {title}: {len(tasks)} tasks, {len(skills)} skills")
+
+    try:
+        await asyncio.gather(*[
+            research(title, aliases) for title, *aliases in professions
+            if force or normalize_title(title) not in index.entries
+        ])
+    finally:
+        await close_registry()
+    return index
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--titles",
+                        default=PROFESSIONS_PATH,
+                        help="professions file (title | alias | ...)")
+    parser.add_argument("--top", type=int, help="only the first N titles")
+    parser.add_argument("--output", default=TITLE_INDEX_PATH)
+    parser.add_argument("--force",
+                        action="store_true",
+                        help="re-research titles already in the index")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    professions = read_professions(args.titles)[:args.top]
+    index = asyncio.run(
+        warm_up(professions, args.output, args.force, args.concurrency))
+    print(f"Title index {args.output}: {len(index)} professions "
+          f"(version {index.version})")
+
+
+if __name__ == "__main__":
+    main()